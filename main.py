@@ -1,10 +1,31 @@
 #!/usr/bin/env python
 
+# Time to first frame is measured from here
+import time
+launch_time = time.perf_counter()
+
+import argparse
+import os
+import sys
+import logging
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+# pygame.pkgdata falls back to plain file access when pkg_resources can't be imported, and importing
+# pkg_resources takes longer than everything else before the first frame. With MINESWEEPER_FAST_START=1
+# it is hidden while pygame is imported only, later imports of pkg_resources are not affected.
+if os.environ.get("MINESWEEPER_FAST_START", "") not in ("", "0") and "pkg_resources" not in sys.modules:
+    sys.modules["pkg_resources"] = None
+    try:
+        import pygame
+    finally:
+        del sys.modules["pkg_resources"]
+
 import pygame
 from src.Board import Board
-import logging
+from src.EventLog import start_file_logging
 from src.gamemode import gamemode as gm
-from src.Draw import Draw, WHITE
+from src.Draw import Draw
 
 # MineSweeper Game
 
@@ -19,97 +40,191 @@ from src.Draw import Draw, WHITE
 # 9. Allow the user to flag squares they think are bombs
 # 10. If the user flags all the bombs, they win
 
-# Initialize the logger
-logging.basicConfig(filename="log.txt", level=logging.DEBUG, format="%(asctime)s:%(levelname)s:%(message)s")
-
-# Initialize the board
-board = Board()
-logging.info("[+] Board initialized")
-
-# Initialize the game engine
-pygame.init()
+parser = argparse.ArgumentParser(description="MineSweeper")
+parser.add_argument("--debug", action="store_true", help="log every move to log.txt")
+parser.add_argument("--timer-fps", type=float, default=10, help="how many times per second the running timer is redrawn")
+parser.add_argument("--profile", action="store_true", help="time generation, moves and drawing, also enabled by MINESWEEPER_PROFILE=1")
+parser.add_argument("--profile-output", default="profile.json", help="JSON file the timings are written to on exit")
+parser.add_argument("--cprofile", metavar="FILE", help="capture a cProfile of the main loop to FILE, read it with python -m pstats")
+parser.add_argument("--measure-startup", action="store_true", help="print the time to the first frame and quit")
+args = parser.parse_args()
+
+# Initialize the logger, records are written by a background thread
+log_listener = start_file_logging("log.txt", logging.DEBUG if args.debug else logging.INFO)
+
+# Instrumentation replaces the timed methods, without it nothing is touched
+profiler = None
+if args.profile or os.environ.get("MINESWEEPER_PROFILE", "") not in ("", "0"):
+    from src.profiling import Profiler, instrument
+    profiler = Profiler()
+    instrument(profiler)
+    logging.info("[+] Profiling enabled")
+
+# Initialize only the parts of pygame the game uses
+pygame.display.init()
+pygame.font.init()
 logging.info("[+] Pygame initialized")
 
 settings = {
     'mode': 'Beginner',
-    'deterministic': False
+    'deterministic': False,
+    'autoplay': False,
+    'hints': False
 }
 
-board.new_board(gm[settings['mode']]["grid"], gm[settings['mode']]["bombs"])
+# Until the first frame is up the board is an empty one of the right size
+board = Board()
+board.blank_board(gm[settings['mode']]["grid"], gm[settings['mode']]["bombs"])
 
 # Set the height and width of the screen
 screen = pygame.display.set_mode(gm[settings['mode']]["size"])
 logging.info("[+] Screen initialized")
 
 # Set the title of the window
-pygame.display.set_caption("Minesweeper - " + settings['mode'] + " " + str(board.flags) + "/" + str(board.bombs))
- 
-# Useful variables
-size = gm[settings['mode']]["size"]
-grid_size = gm[settings['mode']]["grid_size"]
-grid_start_location = (100 + (size[0] - grid_size[0]) // 2, (size[1] - grid_size[1]) // 2)
-grid_end_location = (grid_start_location[0] + grid_size[0], grid_start_location[1] + grid_size[1])
+caption = None
+
+# Zoom factor of one mouse wheel step and pixels moved by one arrow key press
+ZOOM_STEP = 1.25
+PAN_STEP = 100
 
 def change_mode(new_mode):
     """
     Changes the mode of the game
     """
     settings["mode"] = new_mode
-    pygame.display.set_mode(gm[new_mode]["size"])
-    board.new_board(gm[new_mode]["grid"], gm[new_mode]["bombs"], settings["deterministic"])
-
-    global size, grid_size, grid_start_location, grid_end_location  
-    size = gm[new_mode]["size"]
-    grid_size = gm[new_mode]["grid_size"]
-    grid_start_location = (100 + (size[0] - grid_size[0]) // 2, (size[1] - grid_size[1]) // 2)
-    grid_end_location = (grid_start_location[0] + grid_size[0], grid_start_location[1] + grid_size[1])
+    global screen
+    screen = pygame.display.set_mode(gm[new_mode]["size"])
+    pool.new_board(board, gm[new_mode]["grid"], gm[new_mode]["bombs"], settings["deterministic"])
 
-    logging.info("Mode changed to " + new_mode)
+    logging.info("Mode changed to %s", new_mode)
 
-def get_grid_pos(pos):
+def set_autoplay(on):
     """
-    Returns the grid position of a mouse click
+    Turns autoplay on or off, the auto player only exists (and follows the board's moves) while it plays
     """
-    grid = board.grid
-
-    start_x = grid_start_location[0]
-    end_x = grid_end_location[0]
-    len_x = (end_x - start_x) // grid[0]
+    global autoplayer
+    settings["autoplay"] = on
+    logging.info("[.] Autoplay changed to: %s", on)
+    if on:
+        autoplayer = AutoPlayer(board)
+    else:
+        logging.info("[.] Autoplay metrics: %s", autoplayer.metrics())
+        autoplayer.close()
+        autoplayer = None
+
+def set_caption():
+    """
+    Sets the window title, only when its text changed
+    """
+    global caption
+    text = "Minesweeper - " + settings['mode'] + " " + str(board.flags) + "/" + str(board.bombs)
+    if text != caption:
+        caption = text
+        pygame.display.set_caption(caption)
 
-    start_y = grid_start_location[1]
-    end_y = grid_end_location[1]
-    len_y = (end_y - start_y) // grid[1]
+def loop_metrics():
+    """
+    Returns the frames rendered and CPU time used since the game started
+    """
+    seconds = time.perf_counter() - start_time
+    cpu_seconds = time.process_time() - start_cpu
+    return {
+        "frames": frames,
+        "seconds": seconds,
+        "frames_per_second": frames / seconds if seconds else 0.0,
+        "cpu_seconds": cpu_seconds,
+        "cpu_percent": 100 * cpu_seconds / seconds if seconds else 0.0,
+    }
 
-    if pos[0] < start_x or pos[0] > end_x or pos[1] < start_y or pos[1] > end_y:
-        return None
-    
-    x = (pos[0] - start_x) // len_x
-    y = (pos[1] - start_y) // len_y
+def get_grid_pos(pos):
+    """
+    Returns the grid position of a mouse click, through the same view the grid is drawn with
+    """
+    return draw.to_grid(pos)
+
+# Show the first frame before creating the board and starting anything else
+draw = Draw()
+set_caption()
+pygame.display.update(draw.draw(screen, board, settings))
+startup_seconds = time.perf_counter() - launch_time
+logging.info("[+] First frame after %.1f ms", startup_seconds * 1000)
+if args.measure_startup:
+    print("time_to_first_frame: " + str(startup_seconds))
+    pygame.quit()
+    log_listener.stop()
+    sys.exit()
+
+from src.AutoPlayer import AutoPlayer
+from src.BoardPool import BoardPool
+from src.Replay import Replay
 
-    if x >= grid[0] or y >= grid[1]:
-        return None
+board.new_board(gm[settings['mode']]["grid"], gm[settings['mode']]["bombs"])
+logging.info("[+] Board initialized")
 
-    return (x, y)
+# Deterministic boards of every mode are searched for in the background so they are ready when asked for
+pool = BoardPool()
 
 # Loop until the user clicks the close button.
 done = False
 clock = pygame.time.Clock()
-
-current_time = 0
+# Created by set_autoplay when A is pressed
+autoplayer = None
+
+# Seconds between timer redraws while a game is running. The loop times itself with perf_counter,
+# pygame.time.get_ticks() only counts once SDL's timer is started, which pygame.init() is no longer there to do.
+timer_interval = 1 / args.timer_fps
+
+frames = 0
+start_time = time.perf_counter()
+start_cpu = time.process_time()
+last_frame = 0
+redraw = True
+exposed = False
+
+loop_profile = None
+if args.cprofile:
+    import cProfile
+    loop_profile = cProfile.Profile()
+    loop_profile.enable()
 
 # -------- Main Program Loop -----------
 while not done:
+    # --- Wait for something to happen
+    # Autoplay runs every frame, a running game wakes up to redraw the timer, otherwise sleep until an event
+    running = board.playing and not (board.game_over or board.won)
+    if settings["autoplay"] or redraw:
+        events = pygame.event.get()
+    else:
+        timeout = max(1, int(1000 * (timer_interval - (time.perf_counter() - last_frame)))) if running else 0
+        events = [pygame.event.wait(timeout)] + pygame.event.get()
+    if running and time.perf_counter() - last_frame >= timer_interval:
+        redraw = True
+
     # --- Main event loop
-    for event in pygame.event.get(): # User did something
+    for event in events: # User did something
         if event.type == pygame.QUIT: # If user clicked close
             done = True # Flag that we are done so we exit this loop
 
+        # The window lost what was shown, push the whole screen surface again
+        if event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+            redraw = True
+            exposed = True
+
+        # Mouse wheel zooms around the pointer, dragging with the middle button pans
+        if event.type == pygame.MOUSEWHEEL:
+            draw.zoom_at(pygame.mouse.get_pos(), ZOOM_STEP ** event.y)
+            redraw = True
+
+        if event.type == pygame.MOUSEMOTION and event.buttons[1]:
+            draw.pan(-event.rel[0], -event.rel[1])
+            redraw = True
+
         # User clicks the mouse. Get the position
-        if event.type == pygame.MOUSEBUTTONDOWN:
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button in (1, 3):
             pos = pygame.mouse.get_pos()
             grid_pos = get_grid_pos(pos)
             
-            logging.debug("[.] Mouse click at: " + str(pos) + "{" + str(grid_pos) + "}")
+            logging.debug("[.] Mouse click at: %s{%s}", pos, grid_pos)
 
             if grid_pos is None:
                 continue
@@ -124,13 +239,15 @@ while not done:
                 board.flag_square(grid_pos)
 
             board.check_win()
+            redraw = True
 
         # User presses a key
         if event.type == pygame.KEYDOWN:
-            logging.debug("[.] Key pressed: " + str(event.key))
+            logging.debug("[.] Key pressed: %s", event.key)
+            redraw = True
 
             if event.key == pygame.K_SPACE:
-                board.new_board(board.grid, board.bombs, settings["deterministic"])
+                pool.new_board(board, board.grid, board.bombs, settings["deterministic"])
 
             if event.key == pygame.K_r:
                 board.reveal_all()
@@ -147,6 +264,31 @@ while not done:
             if event.key == pygame.K_q:
                 done = True
 
+            if event.key == pygame.K_LEFT:
+                draw.pan(-PAN_STEP, 0)
+
+            if event.key == pygame.K_RIGHT:
+                draw.pan(PAN_STEP, 0)
+
+            if event.key == pygame.K_UP:
+                draw.pan(0, -PAN_STEP)
+
+            if event.key == pygame.K_DOWN:
+                draw.pan(0, PAN_STEP)
+
+            if event.key == pygame.K_a:
+                set_autoplay(not settings["autoplay"])
+
+            if event.key == pygame.K_h:
+                settings["hints"] = not settings["hints"]
+                logging.info("[.] Hints changed to: %s", settings["hints"])
+
+            if event.key == pygame.K_w:
+                Replay.from_board(board).save_file("replay.msr")
+
+            if event.key == pygame.K_m:
+                logging.info("[.] Loop metrics: %s", loop_metrics())
+
             if event.key == pygame.K_b:
                 change_mode("Beginner")
 
@@ -158,24 +300,53 @@ while not done:
 
             if event.key == pygame.K_d:
                 settings["deterministic"] = not settings["deterministic"]
-                logging.info("[.] Deterministic mode changed to: " + str(settings["deterministic"]))
-                board.new_board(board.grid, board.bombs, settings["deterministic"])
+                logging.info("[.] Deterministic mode changed to: %s", settings["deterministic"])
+                pool.new_board(board, board.grid, board.bombs, settings["deterministic"])
 
     # --- Game logic should go here
-    pygame.display.set_caption("Minesweeper - " + settings['mode'] + " " + str(board.flags) + "/" + str(board.bombs))
+    # Autoplay stops with the game, so a finished game sleeps until an event again
+    if settings["autoplay"]:
+        if autoplayer.step():
+            redraw = True
+        if board.game_over or board.won:
+            set_autoplay(False)
 
-    # --- Drawing code should go here
-    # First, clear the screen to white. Don't put other drawing commands
-    # above this, or they will be erased with this command.
-    screen.fill(WHITE)
+    if not redraw or done:
+        continue
+    redraw = False
 
-    Draw().draw(screen, board, settings)
+    set_caption()
 
-    # --- Go ahead and update the screen with what we've drawn.
-    pygame.display.update()
-
-    # --- Limit to 60 frames per second
-    clock.tick(60)
+    # --- Drawing code should go here
+    # Only the parts of the screen that changed are redrawn
+    dirty_rects = draw.draw(screen, board, settings)
+    if profiler is not None:
+        dirty_rects += profiler.draw_overlay(screen, draw.font('Consolas', 14), draw.overlay_area())
+    frames += 1
+    last_frame = time.perf_counter()
+
+    # --- Go ahead and update the parts of the screen we've drawn, or all of it after an expose
+    if exposed:
+        exposed = False
+        pygame.display.update()
+    else:
+        pygame.display.update(dirty_rects)
+
+    # --- Limit autoplay to 60 frames per second
+    if settings["autoplay"]:
+        clock.tick(60)
+
+logging.info("[.] Loop metrics: %s", loop_metrics())
+
+if loop_profile is not None:
+    loop_profile.disable()
+    loop_profile.dump_stats(args.cprofile)
+    logging.info("[+] Main loop profile written to %s", args.cprofile)
+
+if profiler is not None:
+    profiler.dump(args.profile_output)
 
 # Close the window and quit.
+pool.close()
 pygame.quit()
+log_listener.stop()
@@ -0,0 +1,188 @@
+import argparse
+import logging
+import random
+import time
+import numpy as np
+from .Board import Board, ADJACENT_UNREVEALED
+from .Solver import Solver
+from .Probability import Probability
+from .gamemode import gamemode
+from .cells import *
+
+def percentile(values, q):
+    """
+    Returns the q-th percentile (0..100) of a list of numbers
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+class AutoPlayer:
+    """
+    Plays a board: applies every certain move in a batch and otherwise clicks the least risky square
+
+    Squares the board reports as satisfiable are played first, the solver only runs when none are left.
+    """
+    def __init__(self, board, rng=None):
+        self.board = board
+        self.rng = rng or random.Random()
+        self.grid = None
+        self.satisfiable = board.subscribe()
+        self.reset_metrics()
+
+    def close(self):
+        """
+        Stops following the board, its moves no longer queue satisfiable squares for this player
+        """
+        self.board.unsubscribe(self.satisfiable)
+
+    def reset_metrics(self):
+        """
+        Clears the move counters and recorded latencies
+        """
+        self.moves = 0
+        self.guesses = 0
+        self.latencies = []
+        self.elapsed = 0.0
+
+    def decide(self):
+        """
+        Returns the next batch of ("reveal" | "flag", pos) moves and whether it is a guess
+        """
+        board = self.board
+        if self.grid != board.grid:
+            self.grid = board.grid
+            self.solver = Solver(board.grid)
+            self.probability = Probability(board.grid)
+
+        if not board.playing and board.start_pos is not None:
+            return [("reveal", board.start_pos)], False
+
+        moves = self.satisfied()
+        if moves:
+            return moves, False
+
+        cells = board.cells
+        height = board.grid[1]
+        safe, mines = self.solver.deduce(cells, board.bombs)
+        moves = [("reveal", pos) for pos in sorted(safe) if not cells[pos[0] * height + pos[1]] & FLAGGED]
+        moves += [("flag", pos) for pos in sorted(mines) if not cells[pos[0] * height + pos[1]] & FLAGGED]
+        if moves:
+            return moves, False
+
+        # No certain move, click the square least likely to be a bomb
+        probabilities = self.probability.compute(cells, board.bombs).ravel()
+        probabilities[[k for k, cell in enumerate(cells) if cell & FLAGGED]] = np.nan
+        if np.all(np.isnan(probabilities)):
+            return [], False
+        lowest = np.nanmin(probabilities)
+        candidates = np.flatnonzero(probabilities == lowest)
+        k = int(candidates[self.rng.randrange(candidates.size)])
+        return [("reveal", (k // height, k % height))], True
+
+    def satisfied(self):
+        """
+        Returns the moves decided by the queued satisfiable squares, trusting the flags on the board
+        """
+        board = self.board
+        cells = board.cells
+        height = board.grid[1]
+        moves = {}
+        while self.satisfiable:
+            k = self.satisfiable.popleft()
+            if not board.satisfiable(k):
+                continue
+            # As many unrevealed squares around as the number: the unflagged ones are bombs
+            action = "flag" if board.adjacent[k] >> ADJACENT_UNREVEALED == cells[k] & VALUE else "reveal"
+            for n in board.around(k):
+                if not cells[n] & (REVEALED | FLAGGED):
+                    moves.setdefault(n, action)
+        return [(action, divmod(n, height)) for n, action in moves.items()]
+
+    def step(self):
+        """
+        Decides and applies one batch of moves, returns the moves applied
+        """
+        board = self.board
+        if board.game_over or board.won:
+            return []
+
+        start = time.perf_counter()
+        moves, guess = self.decide()
+        decided = time.perf_counter()
+
+        height = board.grid[1]
+        applied = []
+        for action, pos in moves:
+            if board.cells[pos[0] * height + pos[1]] & REVEALED:
+                continue
+            if action == "reveal":
+                board.reveal_square(pos)
+            else:
+                board.flag_square(pos)
+            applied.append((action, pos))
+            if board.game_over:
+                break
+        board.check_win()
+
+        self.latencies.append(decided - start)
+        self.elapsed += time.perf_counter() - start
+        self.moves += len(applied)
+        self.guesses += guess
+        return applied
+
+    def play(self):
+        """
+        Plays until the game is won or lost, returns True if it was won
+        """
+        while not (self.board.game_over or self.board.won):
+            if not self.step() and not (self.board.game_over or self.board.won):
+                break
+        return self.board.won
+
+    def metrics(self):
+        """
+        Returns the throughput and decision latency so far
+        """
+        return {
+            "moves": self.moves,
+            "decisions": len(self.latencies),
+            "guesses": self.guesses,
+            "seconds": self.elapsed,
+            "moves_per_second": self.moves / self.elapsed if self.elapsed else 0.0,
+            "latency_mean": sum(self.latencies) / len(self.latencies) if self.latencies else 0.0,
+            "latency_p50": percentile(self.latencies, 50),
+            "latency_p99": percentile(self.latencies, 99),
+            "latency_max": max(self.latencies, default=0.0),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Lets the auto player play games and reports its throughput and latency")
+    parser.add_argument("--mode", default="Expert", choices=list(gamemode))
+    parser.add_argument("--grid", type=int, nargs=2, help="custom grid size, overrides --mode")
+    parser.add_argument("--bombs", type=int, help="custom number of bombs, overrides --mode")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--deterministic", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    grid = args.grid or gamemode[args.mode]["grid"]
+    bombs = args.bombs if args.bombs is not None else gamemode[args.mode]["bombs"]
+
+    random.seed(args.seed)
+    board = Board()
+    player = AutoPlayer(board, random.Random(args.seed))
+    wins = 0
+    for _ in range(args.games):
+        board.new_board(grid, bombs, args.deterministic)
+        wins += player.play()
+
+    print("games: " + str(args.games))
+    print("win_rate: " + str(wins / args.games if args.games else 0.0))
+    for key, value in player.metrics().items():
+        print(key + ": " + str(value))
+
+if __name__ == "__main__":
+    main()
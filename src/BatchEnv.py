@@ -0,0 +1,181 @@
+import argparse
+import time
+import numpy as np
+from .gamemode import gamemode
+from .neighbors import count_neighbors, dilate, label_openings
+from .cells import *
+
+# Actions, one (kind, x, y) row per board
+REVEAL_ACTION = 0
+FLAG_ACTION = 1
+
+# Observation of a square: 0..8 revealed number, same codes as the tiles of Draw otherwise
+OBS_UNREVEALED = 9
+OBS_FLAG = 10
+
+class BatchEnv:
+    """
+    Steps many boards of the same shape in lockstep with array operations
+
+    The boards are a (batch, squares) array of cells with the bits of cells.py. The openings
+    of every board are labelled when it is created, so revealing an empty square reveals its
+    opening and the numbers around it in one masked operation instead of a flood fill.
+
+    Reward is the fraction of the safe squares a move revealed, -1 for revealing a bomb, so a
+    won game adds up to 1. Finished boards are replaced by new ones before step() returns.
+    Floods stop at flags like on Board: an opening holding a flag or a square revealed before is
+    labelled again without them, only on the boards where that happens.
+    """
+    def __init__(self, batch, grid, bombs, seed=None):
+        self.batch = batch
+        self.grid = list(grid)
+        self.bombs = bombs
+        self.squares = grid[0] * grid[1]
+        self.safe_squares = self.squares - bombs
+        self.rng = np.random.default_rng(seed)
+        self.rows = np.arange(batch)
+
+        self.state = np.zeros((batch, self.squares), dtype=np.uint8)
+        self.labels = np.zeros((batch, self.squares), dtype=np.int32)
+        self.obs = np.full((batch, self.squares), OBS_UNREVEALED, dtype=np.uint8)
+        self.revealed_safe = np.zeros(batch, dtype=np.int64)
+        self.flags = np.zeros(batch, dtype=np.int64)
+        self.games = 0
+        self.wins = 0
+        self.reset()
+
+    def reset(self, boards=None):
+        """
+        Places new bombs on the given boards (a boolean mask or indices, all boards by default), returns the observation
+        """
+        rows = self.rows if boards is None else self.rows[boards]
+        count = rows.size
+        if count:
+            # The bombs go on the squares with the smallest random keys
+            keys = self.rng.random((count, self.squares), dtype=np.float32)
+            mines = np.zeros((count, self.squares), dtype=bool)
+            np.put_along_axis(mines, np.argpartition(keys, self.bombs - 1, axis=1)[:, :self.bombs], True, axis=1)
+            mines = mines.reshape(count, self.grid[0], self.grid[1])
+
+            state = count_neighbors(mines)
+            empty = (state == 0) & ~mines
+            state[mines] = BOMB
+
+            self.state[rows] = state.reshape(count, -1)
+            self.labels[rows] = label_openings(empty).reshape(count, -1)
+            self.obs[rows] = OBS_UNREVEALED
+            self.revealed_safe[rows] = 0
+            self.flags[rows] = 0
+        return self.observation()
+
+    def observation(self):
+        """
+        Returns the (batch, width, height) observation codes of every board
+        """
+        return self.obs.reshape(self.batch, self.grid[0], self.grid[1]).copy()
+
+    def step(self, actions):
+        """
+        Applies one (kind, x, y) action per board, returns (observation, reward, done)
+        """
+        actions = np.asarray(actions)
+        kind, x, y = actions[:, 0], actions[:, 1], actions[:, 2]
+        k = x * self.grid[1] + y
+        rows = self.rows
+        state = self.state
+        cell = state[rows, k]
+        unrevealed = (cell & REVEALED) == 0
+
+        # Flags toggle on unrevealed squares, no more flags than bombs
+        flag = (kind == FLAG_ACTION) & unrevealed
+        unflag = flag & ((cell & FLAGGED) != 0)
+        place = flag & ~unflag & (self.flags < self.bombs)
+        state[rows[unflag], k[unflag]] &= ~FLAGGED & 0xFF
+        self.obs[rows[unflag], k[unflag]] = OBS_UNREVEALED
+        state[rows[place], k[place]] |= FLAGGED
+        self.obs[rows[place], k[place]] = OBS_FLAG
+        self.flags += place.astype(np.int64) - unflag
+
+        # Reveals of hidden squares, flagged squares can't be revealed
+        reveal = (kind == REVEAL_ACTION) & unrevealed & ((cell & FLAGGED) == 0)
+        lost = reveal & ((cell & BOMB) != 0)
+        safe = reveal & ~lost
+        state[rows[safe], k[safe]] |= REVEALED
+        self.obs[rows[safe], k[safe]] = cell[safe] & VALUE
+        revealed = safe.astype(np.int64)
+
+        # An empty square opens its whole opening and the numbers around it
+        opening = safe & ((cell & VALUE) == 0)
+        if opening.any():
+            boards = rows[opening]
+            width, height = self.grid
+            cells = state[boards]
+            region = self.labels[boards] == self.labels[boards, k[opening]][:, None]
+            # The flood only passes through empty squares neither flagged nor revealed before this step
+            closed = (cells & (REVEALED | FLAGGED)) != 0
+            closed[np.arange(boards.size), k[opening]] = False
+            blocked = np.flatnonzero((region & closed).any(axis=1))
+            if blocked.size:
+                empty = ((cells[blocked] & (VALUE | BOMB)) == 0) & ~closed[blocked]
+                labels = label_openings(empty.reshape(-1, width, height)).reshape(blocked.size, -1)
+                start = k[opening][blocked]
+                region[blocked] = labels == labels[np.arange(blocked.size), start][:, None]
+            region = dilate(region.reshape(-1, width, height)).reshape(boards.size, -1)
+            region &= (cells & (REVEALED | FLAGGED)) == 0
+            revealed[boards] += region.sum(axis=1)
+            state[boards] = cells | (region * np.uint8(REVEALED))
+            self.obs[boards] = np.where(region, cells & VALUE, self.obs[boards])
+
+        self.revealed_safe += revealed
+        reward = revealed / self.safe_squares
+        reward[lost] = -1.0
+        won = self.revealed_safe == self.safe_squares
+        done = lost | won
+
+        if done.any():
+            self.games += int(done.sum())
+            self.wins += int(won.sum())
+            self.reset(done)
+        return self.observation(), reward, done
+
+def random_actions(env, rng):
+    """
+    Returns one reveal of a random square not known to be revealed per board
+    """
+    scores = rng.random(env.obs.shape) * (env.obs == OBS_UNREVEALED)
+    k = scores.argmax(axis=1)
+    return np.stack([np.full(env.batch, REVEAL_ACTION), k // env.grid[1], k % env.grid[1]], axis=1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Steps many boards in lockstep with random reveals and reports the step rate")
+    parser.add_argument("--mode", default="Expert", choices=list(gamemode))
+    parser.add_argument("--grid", type=int, nargs=2, help="custom grid size, overrides --mode")
+    parser.add_argument("--bombs", type=int, help="custom number of bombs, overrides --mode")
+    parser.add_argument("--batch", type=int, default=1024)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    grid = args.grid or gamemode[args.mode]["grid"]
+    bombs = args.bombs if args.bombs is not None else gamemode[args.mode]["bombs"]
+    env = BatchEnv(args.batch, grid, bombs, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+
+    # Only the steps are timed, not choosing the actions
+    seconds = 0.0
+    for _ in range(args.steps):
+        actions = random_actions(env, rng)
+        start = time.perf_counter()
+        env.step(actions)
+        seconds += time.perf_counter() - start
+
+    steps = args.batch * args.steps
+    print("batch: " + str(args.batch))
+    print("env_steps: " + str(steps))
+    print("seconds: " + str(seconds))
+    print("env_steps_per_second: " + str(steps / seconds if seconds else 0.0))
+    print("games: " + str(env.games))
+    print("wins: " + str(env.wins))
+
+if __name__ == "__main__":
+    main()
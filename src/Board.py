@@ -1,316 +1,883 @@
 import random
-import copy
+import time
+import struct
 import logging
-import pygame
+from array import array
+from collections import deque
+import numpy as np
+from .cells import *
+from .Solver import Solver
+from .neighbors import MAX_TABLE_SQUARES, count_neighbors, dilate, neighbor_table
+from .EventLog import EventLog, REVEAL, FLAG, UNFLAG, GAME_OVER, NEW_BOARD, NOT_DETERMINISTIC, NO_FLAGS, BULK
+
+# Binary save format: header followed by bit-packed bomb, revealed, flagged and revealed adjacent planes.
+# Version 2 stores the start and end times as doubles, so any clock fits; version 1 (integer times) still loads.
+SAVE_MAGIC = b"MSWP"
+SAVE_VERSION = 2
+SAVE_HEADER = struct.Struct("<4sBIIIBBBBiidd")
+SAVE_HEADERS = {1: struct.Struct("<4sBIIIBBBBiiqq"), SAVE_VERSION: SAVE_HEADER}
+NO_VALUE = -1
+# Saved boards are decoded this many squares at a time, so loading needs little memory besides the cells
+LOAD_BLOCK_SQUARES = 1 << 20
+
+# Board attributes stored in a snapshot alongside the cells
+SNAPSHOT_ATTRIBUTES = ("grid", "bombs", "safe_squares", "revealed_safe", "flags", "correct_flags", "game_over",
+                       "won", "playing", "start_time", "end_time", "start_pos", "isdeterministic",
+                       "seed", "moves")
+
+# Every reveal_square/flag_square call and bulk operation is appended to Board.moves as k << 2 | kind
+MOVE_REVEAL = 0
+MOVE_FLAG = 1
+MOVE_BULK = 2
+# Bulk operations are recorded with these in place of the square index
+REVEAL_ALL = 0
+UNREVEAL_ALL = 1
+FLAG_ALL = 2
+UNFLAG_ALL = 3
+# Boards up to this many squares store their moves in 4 bytes each
+MAX_COMPACT_SQUARES = 1 << 30
+# Neighbour counts around more newly revealed squares than this are updated with numpy
+MAX_LOOP_UPDATE = 256
+# Board.adjacent keeps both neighbour counts (at most 8) of a square in one byte:
+# flagged squares around it in the low nibble, unrevealed squares in the high one
+ADJACENT_FLAGS = 0x0F
+ADJACENT_UNREVEALED = 4
+ONE_UNREVEALED = 1 << ADJACENT_UNREVEALED
+
+def move_log(grid):
+    """
+    Returns an empty move log wide enough for the grid
+    """
+    return array("I" if grid[0] * grid[1] <= MAX_COMPACT_SQUARES else "q")
+
+def ticks():
+    """
+    Milliseconds from a monotonic clock, the default Board clock (same unit as pygame.time.get_ticks)
+    """
+    return int(time.monotonic() * 1000)
+
+def place_mines(squares, bombs, seed=None):
+    """
+    Returns a flat bomb mask with bombs on distinct squares, the same seed always gives the same mask
+
+    Every round draws as many random squares as bombs are missing and marks them, repeats only make
+    another round necessary, so the mask is the only array as large as the board. More than half the
+    squares are placed as the safe squares instead, to keep the rounds few.
+    """
+    if bombs > squares // 2:
+        return ~place_mines(squares, squares - bombs, seed)
+    rng = np.random.default_rng(seed)
+    mines = np.zeros(squares, dtype=bool)
+    placed = 0
+    while placed < bombs:
+        mines[rng.integers(0, squares, size=bombs - placed)] = True
+        placed = int(np.count_nonzero(mines))
+    return mines
+
+def add_counts(counts, squares, step):
+    """
+    Adds step to counts[k] once for every occurrence of k in the index array squares (faster than np.add.at)
+    """
+    if squares.size * 8 > counts.size:
+        counts += (np.bincount(squares, minlength=counts.size) * step).astype(counts.dtype)
+    elif squares.size:
+        squares, times = np.unique(squares, return_counts=True)
+        counts[squares] += (times * step).astype(counts.dtype)
+
+def satisfiable_mask(cells, counts):
+    """
+    Returns which of the given cells are satisfiable (see Board.satisfiable) given their packed neighbour counts
+    """
+    flags = counts & ADJACENT_FLAGS
+    unrevealed = counts >> ADJACENT_UNREVEALED
+    value = cells & VALUE
+    return ((cells & (REVEALED | BOMB)) == REVEALED) & (unrevealed > flags) & ((value == flags) | (value == unrevealed))
 
 class Board:
     class Square:
-        def __init__(self, pos, value):
-            self.pos = pos
-
-            self.value = value
-            self.revealed = False
-            self.flagged = False
+        """
+        View of a single square stored in Board.cells
 
-            self.bomb = (self.value == -1)
-            self.open = not self.bomb
-            self.display = (self.value != 0)
+        Changes made through a view bypass the Board counters, call Board.recount() afterwards
+        """
+        __slots__ = ("cells", "pos", "index")
 
-            self.revealed_adjacent = False
+        def __init__(self, board, pos):
+            self.cells = board.cells
+            self.pos = pos
+            self.index = pos[0] * board.grid[1] + pos[1]
 
         def __str__(self):
             return str(self.value)
-        
+
+        def _get(self, bit):
+            return bool(self.cells[self.index] & bit)
+
+        def _set(self, bit, state):
+            if state:
+                self.cells[self.index] |= bit
+            else:
+                self.cells[self.index] &= ~bit & 0xFF
+
+        @property
+        def value(self):
+            cell = self.cells[self.index]
+            return -1 if cell & BOMB else cell & VALUE
+
+        @property
+        def bomb(self):
+            return self._get(BOMB)
+
+        @property
+        def open(self):
+            return not self._get(BOMB)
+
+        @property
+        def display(self):
+            return self.value != 0
+
+        @property
+        def revealed(self):
+            return self._get(REVEALED)
+
+        @revealed.setter
+        def revealed(self, state):
+            self._set(REVEALED, state)
+
+        @property
+        def flagged(self):
+            return self._get(FLAGGED)
+
+        @flagged.setter
+        def flagged(self, state):
+            self._set(FLAGGED, state)
+
+        @property
+        def revealed_adjacent(self):
+            return self._get(REVEALED_ADJACENT)
+
+        @revealed_adjacent.setter
+        def revealed_adjacent(self, state):
+            self._set(REVEALED_ADJACENT, state)
+
         def reveal(self):
             self.revealed = True
-            logging.debug("[+] Square at " + str(self.pos) + " revealed (value: " + str(self.value) + ")")
+            logging.debug("[+] Square at %s revealed (value: %s)", self.pos, self.value)
 
         def unreveal(self):
             self.revealed = False
-            logging.debug("[+] Square at " + str(self.pos) + " unrevealed")
+            logging.debug("[+] Square at %s unrevealed", self.pos)
 
         def flag(self):
             self.flagged = True
-            logging.debug("[+] Square at " + str(self.pos) + " flagged")
+            logging.debug("[+] Square at %s flagged", self.pos)
 
         def unflag(self):
             self.flagged = False
-            logging.debug("[+] Square at " + str(self.pos) + " unflagged")
+            logging.debug("[+] Square at %s unflagged", self.pos)
+
+    class Column:
+        """
+        View of a single column of the board (board.board[i])
+        """
+        __slots__ = ("board", "i")
+
+        def __init__(self, board, i):
+            self.board = board
+            self.i = i
+
+        def __len__(self):
+            return self.board.grid[1]
+
+        def __getitem__(self, j):
+            if j < 0 or j >= self.board.grid[1]:
+                raise IndexError("square index out of range")
+            return Board.Square(self.board, (self.i, j))
+
+    class Grid:
+        """
+        View of the whole board (board.board), kept for the board.board[i][j] API
+        """
+        __slots__ = ("board",)
+
+        def __init__(self, board):
+            self.board = board
+
+        def __len__(self):
+            return self.board.grid[0]
 
-    def __init__(self):
+        def __getitem__(self, i):
+            if i < 0 or i >= self.board.grid[0]:
+                raise IndexError("column index out of range")
+            return Board.Column(self.board, i)
+
+    def __init__(self, clock=ticks):
+        # Any function returning milliseconds, e.g. pygame.time.get_ticks
+        self.clock = clock
+        self.events = EventLog()
+
+        # Snapshots only remember where the undo journal was, every square changed after
+        # the first snapshot is journaled as (index, old cell), -1 marks a full copy
         self.saved_boards = []
-        pass
+        self.journal = array("q")
+        self.journal_cells = bytearray()
+        self.journal_copies = []
+        self.grid = [0, 0]
+        self.cells = bytearray()
+        self.board = self.Grid(self)
+        self.moves = move_log(self.grid)
+
+        # Flagged and unrevealed squares around every square packed in a byte, kept up to date by every move
+        self.adjacent = bytearray()
+        # Queues returned by subscribe()
+        self.subscribers = []
+        # Grows whenever the cells change, every change goes through the neighbour count updates,
+        # so views can cache what they derive from the cells without comparing them
+        self.changes = 0
+
+        # Compare the running counters against a full scan on every check_win
+        self.check_counters = False
 
     def __str__(self):
-        return str(self.board)
-
-    def create_board(self, grid, bombs):
-        """
-        Creates a board with bombs and numbers
-        """
-        # Create empty board
-        board = []
-        for i in range(grid[0]):
-            board.append([])
-            for j in range(grid[1]):
-                board[i].append(self.Square((i, j), 0))
-        
-        # Choose random locations for bombs
-        bomb_indices = [(i // grid[1], i % grid[1]) for i in range(grid[0] * grid[1])]
-        random.shuffle(bomb_indices)
-        bomb_indices = bomb_indices[:bombs]
-
-        # Place bombs on board
-        for i in bomb_indices:
-            board[i[0]][i[1]] = self.Square(i, -1)
-            
-        for i in bomb_indices:
-            for x in range(i[0] - 1, i[0] + 2):
-                for y in range(i[1] - 1, i[1] + 2):
-                    if x < 0 or x >= len(board) or y < 0 or y >= len(board[0]):
-                        continue
-                    else:
-                        if not board[x][y].bomb:
-                            board[x][y].value += 1
+        values = np.where(self.state & BOMB, -1, (self.state & VALUE).astype(np.int8))
+        return str(values.tolist())
+
+    @property
+    def state(self):
+        """
+        The cells as a (grid[0], grid[1]) uint8 array sharing memory with Board.cells
+        """
+        return np.frombuffer(self.cells, dtype=np.uint8).reshape(self.grid[0], self.grid[1])
+
+    def create_board(self, grid, bombs, seed=None):
+        """
+        Creates a board with bombs and numbers, the same seed always places the same bombs
+        """
+        # Without a seed one is drawn from random, so random.seed still makes boards repeatable
+        if seed is None:
+            seed = random.getrandbits(64)
+        mines = place_mines(grid[0] * grid[1], bombs, seed).reshape(grid[0], grid[1])
+
+        # Numbers are stored in the low bits, bombs only carry the BOMB bit
+        state = count_neighbors(mines)
+        state[mines] = BOMB
 
         logging.info("[+] Board created")
-        return board
+        return bytearray(state.tobytes())
     
-    def __get_number(self, board, i, j):
+    def neighbors(self):
+        """
+        Returns the shared (offsets, indices) neighbour table of the grid, None for very large grids
+        """
+        if self.grid[0] * self.grid[1] > MAX_TABLE_SQUARES:
+            return None
+        return neighbor_table(self.grid[0], self.grid[1])
+
+    def around(self, k):
+        """
+        Returns the flat indices of the squares surrounding square k
+        """
+        table = self.neighbors()
+        if table is not None:
+            offsets, indices = table
+            return indices[offsets[k]:offsets[k + 1]]
+
+        width, height = self.grid
+        x, y = divmod(k, height)
+        return [i * height + j
+                for i in range(max(x - 1, 0), min(x + 2, width))
+                for j in range(max(y - 1, 0), min(y + 2, height))
+                if i != x or j != y]
+
+    def __get_number(self, i, j):
         """
         Returns the number of bombs surrounding a square
         """
-        number = 0
-        for x in range(i - 1, i + 2):
-            for y in range(j - 1, j + 2):
-                if x < 0 or x >= len(board) or y < 0 or y >= len(board[0]):
-                    continue
-                else:
-                    if board[x][y].bomb:
-                        number += 1
-        return number
+        return sum(1 for n in self.around(i * self.grid[1] + j) if self.cells[n] & BOMB)
     
-    def new_board(self, grid, bombs, deterministic=False):
+    def new_board(self, grid, bombs, deterministic=False, seed=None, start_pos=None):
         """
         Creates a new board
+
+        A board is identified by (grid, bombs, seed, start_pos): passing the seed and start_pos of a
+        deterministic board recreates it without searching again. Without a seed one is drawn from random.
         """
+        if seed is None:
+            seed = random.getrandbits(64)
+        # Rejected boards are replaced by boards with seeds drawn from this generator
+        rng = random.Random(seed)
+
+        self.journal_all()
         self.grid = grid
         self.bombs = bombs
-        self.board = self.create_board(grid, bombs)
-        self.start_pos = None
+        self.seed = seed
+        self.moves = move_log(grid)
+        self.cells = self.create_board(grid, bombs, seed)
+        self.start_pos = start_pos
         self.isdeterministic = deterministic
-        while deterministic and self.deterministic():
-            logging.info("[-] Board is not deterministic")
-            self.board = self.create_board(grid, bombs)
+        while deterministic and start_pos is None and not self.deterministic(rng):
+            self.events.record(NOT_DETERMINISTIC)
+            self.seed = rng.getrandbits(64)
+            self.cells = self.create_board(grid, bombs, self.seed)
+        self.__reset_counters()
+
+        self.events.record(NEW_BOARD, grid, bombs, deterministic, self.seed)
+
+    def blank_board(self, grid, bombs):
+        """
+        Sets up a board without bombs, drawn like a new board, to show until new_board is called
+        """
+        self.journal_all()
+        self.grid = grid
+        self.bombs = bombs
+        self.seed = None
+        self.moves = move_log(grid)
+        self.cells = bytearray(grid[0] * grid[1])
+        self.start_pos = None
+        self.isdeterministic = False
+        self.__reset_counters()
+
+    def __reset_counters(self):
+        self.recount_adjacent()
+        self.safe_squares = self.grid[0] * self.grid[1] - self.bombs
+        self.revealed_safe = 0
         self.flags = 0
+        self.correct_flags = 0
         self.game_over = False
         self.won = False
         self.playing = False
         self.start_time = None
         self.end_time = None
 
-        logging.info("[+] New board created (grid: " + str(grid) + ", bombs: " + str(bombs) + " deterministic: " + str(deterministic) + ")")
-
-    def deterministic(self):
-        """
-        Checks if the board is deterministic
-        """
-        self.start_pos = (random.randint(0, self.grid[0] - 1), random.randint(0, self.grid[1] - 1))
-
-        # Check if the start position is a bomb
-        while self.board[self.start_pos[0]][self.start_pos[1]].bomb or self.board[self.start_pos[0]][self.start_pos[1]].value != 0:
-            self.start_pos = (random.randint(0, self.grid[0] - 1), random.randint(0, self.grid[1] - 1))
-        
-        # Create a board to solve
-        # '?' = unrevealed
-        # -1 = bomb
-        # 0..8 = revealed
-        self.board_to_solve = []
-        for i in range(self.grid[0]):
-            self.board_to_solve.append([])
-            for j in range(self.grid[1]):
-                self.board_to_solve[i].append('?')
-
-        # Perform a depth-first search
-        stack = [self.start_pos]
-        to_check = []
-        visited = []
-        while stack:
-            pos = stack.pop()
-            if pos in visited:
-                continue
-            visited.append(pos)
-            self.board_to_solve[pos[0]][pos[1]] = self.board[pos[0]][pos[1]].value
-            for x in range(pos[0] - 1, pos[0] + 2):
-                for y in range(pos[1] - 1, pos[1] + 2):
-                    if x < 0 or x >= len(self.board) or y < 0 or y >= len(self.board[0]):
-                        continue
-                    elif (x, y) not in visited:
-                        if self.board[x][y].value != 0:
-                            stack.append((x, y))
-                        else:
-                            to_check.append((x, y))
-
-        # Perform a breadth-first search
-        while to_check:
-            to_check_next = []
-            while to_check:
-                pos = to_check.pop(0)
-                if pos in visited:
-                    continue
-                visited.append(pos)
-                self.board_to_solve[pos[0]][pos[1]] = self.board[pos[0]][pos[1]].value
-                number = 0
-                for x in range(pos[0] - 1, pos[0] + 2):
-                    for y in range(pos[1] - 1, pos[1] + 2):
-                        if x < 0 or x >= len(self.board) or y < 0 or y >= len(self.board[0]):
-                            continue
-                        elif self.board_to_solve[x][y] == '?' or self.board_to_solve[x][y] == -1:
-                            number += 1
-                if number == self.board[pos[0]][pos[1]].value:
-                    for x in range(pos[0] - 1, pos[0] + 2):
-                        for y in range(pos[1] - 1, pos[1] + 2):
-                            if x < 0 or x >= len(self.board) or y < 0 or y >= len(self.board[0]):
-                                continue
-                            elif self.board_to_solve[x][y] == '?':
-                                self.board_to_solve[x][y] = -1
-                                to_check_next.append((x, y))
-            to_check = to_check_next
-
-        # Check if the board is deterministic
-        for i in range(self.grid[0]):
-            for j in range(self.grid[1]):
-                if self.board_to_solve[i][j] == '?' and not self.board[i][j].bomb:
-                    return False
-        return True
+    def deterministic(self, rng=random):
+        """
+        Picks a starting square and checks if the board can be cleared from it without guessing
+        """
+        # The starting square has to be an opening (no bomb and no adjacent bombs)
+        openings = np.flatnonzero(self.state.ravel() == 0)
+        if openings.size == 0:
+            self.start_pos = None
+            return False
+        k = int(openings[rng.randrange(openings.size)])
+        self.start_pos = (k // self.grid[1], k % self.grid[1])
+
+        return Solver(self.grid).solve(self.cells, self.start_pos)
 
     def reveal_square(self, pos):
         """
-        Reveals a square
+        Reveals a square, returns the list of newly revealed squares
         """
         if not self.playing:
             self.playing = True
-            self.start_time = pygame.time.get_ticks()
-            
-        square = self.board[pos[0]][pos[1]]
-        if square.flagged:
-            return
-        elif not square.revealed:
-            square.reveal()
-            if square.bomb:
+            self.start_time = self.clock()
+
+        k = pos[0] * self.grid[1] + pos[1]
+        self.moves.append(k << 2 | MOVE_REVEAL)
+        cell = self.cells[k]
+        if cell & FLAGGED:
+            return []
+        elif not cell & REVEALED:
+            if self.saved_boards:
+                self.journal.append(k)
+                self.journal_cells.append(cell)
+            self.cells[k] = cell | REVEALED
+            self.__uncovered([k])
+            revealed = [pos]
+            if cell & BOMB:
                 self.game_over = True
-                self.end_time = pygame.time.get_ticks()
-                logging.info("[-] Game over")
-            elif square.value == 0 and not square.revealed_adjacent:
-                square.revealed_adjacent = True
-                self.reveal_adjacent(pos)
-        elif self.checksum(pos) and not square.revealed_adjacent:
-            square.revealed_adjacent = True
-            self.reveal_adjacent(pos)
+                self.end_time = self.clock()
+                self.events.record(GAME_OVER, pos)
+                return revealed
+            self.revealed_safe += 1
+            if cell & VALUE == 0 and not cell & REVEALED_ADJACENT:
+                self.cells[k] |= REVEALED_ADJACENT
+                revealed += self.reveal_adjacent(pos)
+        elif self.checksum(pos) and not cell & REVEALED_ADJACENT:
+            if self.saved_boards:
+                self.journal.append(k)
+                self.journal_cells.append(cell)
+            self.cells[k] |= REVEALED_ADJACENT
+            revealed = self.reveal_adjacent(pos)
+        else:
+            return []
+
+        self.events.record(REVEAL, pos, len(revealed))
+        return revealed
 
     def reveal_adjacent(self, pos):
         """
-        Reveals all adjacent squares
+        Reveals all adjacent squares, flooding through empty squares, returns the newly revealed squares
         """
-        for x in range(pos[0] - 1, pos[0] + 2):
-            for y in range(pos[1] - 1, pos[1] + 2):
-                if x < 0 or x >= len(self.board) or y < 0 or y >= len(self.board[0]):
+        cells = self.cells
+        height = self.grid[1]
+        table = self.neighbors()
+        if table is not None:
+            offsets, indices = table
+        revealed = []
+        uncovered = []
+        record = bool(self.saved_boards)
+        journal = self.journal
+        journal_cells = self.journal_cells
+
+        pending = deque([pos[0] * height + pos[1]])
+        while pending:
+            k = pending.popleft()
+            around = indices[offsets[k]:offsets[k + 1]] if table is not None else self.around(k)
+            for n in around:
+                cell = cells[n]
+                if cell & (REVEALED | FLAGGED):
                     continue
-                else:
-                    if not self.board[x][y].revealed:
-                        self.reveal_square((x, y))
+                if record:
+                    journal.append(n)
+                    journal_cells.append(cell)
+                cells[n] = cell | REVEALED
+                uncovered.append(n)
+                revealed.append(divmod(n, height))
+                if cell & BOMB:
+                    self.game_over = True
+                    self.end_time = self.clock()
+                    self.events.record(GAME_OVER, divmod(n, height))
+                    continue
+                self.revealed_safe += 1
+                if cell & VALUE == 0 and not cell & REVEALED_ADJACENT:
+                    cells[n] |= REVEALED_ADJACENT
+                    pending.append(n)
+        self.__uncovered(uncovered)
+        return revealed
 
     def flag_square(self, pos):
         """
         Flags a square
         """
-        if not self.board[pos[0]][pos[1]].revealed:
-            if self.board[pos[0]][pos[1]].flagged:
-                self.board[pos[0]][pos[1]].unflag()
+        k = pos[0] * self.grid[1] + pos[1]
+        self.moves.append(k << 2 | MOVE_FLAG)
+        cell = self.cells[k]
+        if not cell & REVEALED:
+            if self.saved_boards:
+                self.journal.append(k)
+                self.journal_cells.append(cell)
+            if cell & FLAGGED:
+                self.cells[k] = cell & ~FLAGGED
+                self.events.record(UNFLAG, pos)
                 self.flags -= 1
+                if cell & BOMB:
+                    self.correct_flags -= 1
+                self.__flagged(k, -1)
             elif self.flags >= self.bombs:
-                logging.info("[-] No more flags available")
+                self.events.record(NO_FLAGS)
             else:
-                self.board[pos[0]][pos[1]].flag()
+                self.cells[k] = cell | FLAGGED
+                self.events.record(FLAG, pos)
                 self.flags += 1
+                if cell & BOMB:
+                    self.correct_flags += 1
+                self.__flagged(k, 1)
+
+    def apply_moves(self, moves, revealed, adjacent, toggled):
+        """
+        Applies the combined effect of a run of moves whose outcome does not depend on their order
+
+        moves are the encoded moves as an array, revealed the flat indices of the unrevealed squares they
+        reveal, adjacent those of the revealed squares they reveal the neighbours of and toggled those of
+        the unrevealed squares they flag or unflag, every square once. Working these out is up to the
+        caller, see Replay. No game events are recorded for the moves.
+        """
+        cells = np.frombuffer(self.cells, dtype=np.uint8)
+        if self.saved_boards:
+            changed = np.union1d(np.union1d(revealed, adjacent), toggled)
+            self.journal.extend(changed.tolist())
+            self.journal_cells.extend(cells[changed].tobytes())
+        self.moves.frombytes(np.asarray(moves, dtype=self.moves.typecode).tobytes())
+        if not self.playing and ((moves & 3) == MOVE_REVEAL).any():
+            self.playing = True
+            self.start_time = self.clock()
+
+        bombs = np.count_nonzero(cells[revealed] & BOMB)
+        cells[revealed] |= REVEALED
+        cells[adjacent] |= REVEALED_ADJACENT
+        self.revealed_safe += len(revealed) - bombs
+        if bombs:
+            self.game_over = True
+            self.end_time = self.clock()
+
+        old = cells[toggled]
+        cells[toggled] = old ^ FLAGGED
+        added = toggled[(old & FLAGGED) == 0]
+        removed = toggled[(old & FLAGGED) != 0]
+        self.flags += len(added) - len(removed)
+        self.correct_flags += int(np.count_nonzero(cells[added] & BOMB)) - int(np.count_nonzero(cells[removed] & BOMB))
+        if len(toggled) <= MAX_LOOP_UPDATE:
+            for k in added.tolist():
+                self.__flagged(k, 1)
+            for k in removed.tolist():
+                self.__flagged(k, -1)
+        else:
+            counts = np.frombuffer(self.adjacent, dtype=np.uint8)
+            add_counts(counts, self.__around_all(added), 1)
+            add_counts(counts, self.__around_all(removed), -1)
+            self.__notify(self.__around_all(toggled))
+        self.__uncovered(revealed)
 
     def checksum(self, pos):
         """
         Checks if the number of flagged squares around a revealed square is equal to the value of the square
+
+        With a wrong flag among them a bomb around is left unflagged, revealing the others then ends the game.
         """
-        number = 0
-        for x in range(pos[0] - 1, pos[0] + 2):
-            for y in range(pos[1] - 1, pos[1] + 2):
-                if x < 0 or x >= len(self.board) or y < 0 or y >= len(self.board[0]):
-                    continue
-                else:
-                    if self.board[x][y].flagged:
-                        if not self.board[x][y].bomb:
-                            self.game_over = True
-                            self.end_time = pygame.time.get_ticks()
-                            return False
-                        number += 1
-        return (number == self.board[pos[0]][pos[1]].value)
+        k = pos[0] * self.grid[1] + pos[1]
+        cell = self.cells[k]
+        return not cell & BOMB and self.adjacent[k] & ADJACENT_FLAGS == cell & VALUE
+
+    def satisfiable(self, k):
+        """
+        Checks if the number of revealed square k decides every unknown square around it: all safe when
+        it has as many flags around, all bombs when it has as many unrevealed squares around
+        """
+        cell = self.cells[k]
+        if not cell & REVEALED or cell & BOMB:
+            return False
+        counts = self.adjacent[k]
+        flags = counts & ADJACENT_FLAGS
+        unrevealed = counts >> ADJACENT_UNREVEALED
+        value = cell & VALUE
+        return unrevealed > flags and (value == flags or value == unrevealed)
+
+    def subscribe(self):
+        """
+        Returns a queue receiving the flat index of every square that becomes satisfiable
+
+        New boards, snapshots being loaded and bulk operations clear the queue and queue every square
+        satisfiable at that point. Squares can be queued more than once and may not be satisfiable
+        anymore when they are read, check them with satisfiable().
+        """
+        queue = deque()
+        self.subscribers.append(queue)
+        self.__notify_all()
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.remove(queue)
+
+    def __notify(self, squares):
+        """
+        Queues the satisfiable squares among the given flat indices (a list or an index array)
+        """
+        if not self.subscribers:
+            return
+        if isinstance(squares, np.ndarray):
+            if squares.size * 8 > len(self.cells):
+                touched = np.zeros(len(self.cells), dtype=bool)
+                touched[squares] = True
+                squares = np.flatnonzero(touched)
+            else:
+                squares = np.unique(squares)
+            cells = np.frombuffer(self.cells, dtype=np.uint8)[squares]
+            counts = np.frombuffer(self.adjacent, dtype=np.uint8)[squares]
+            ready = squares[satisfiable_mask(cells, counts)].tolist()
+        else:
+            ready = [k for k in dict.fromkeys(squares) if self.satisfiable(k)]
+        for queue in self.subscribers:
+            queue.extend(ready)
+
+    def __notify_all(self):
+        """
+        Queues every satisfiable square of the board, without building an index array of all squares
+        """
+        if not self.subscribers:
+            return
+        cells = np.frombuffer(self.cells, dtype=np.uint8)
+        counts = np.frombuffer(self.adjacent, dtype=np.uint8)
+        ready = np.flatnonzero(satisfiable_mask(cells, counts)).tolist()
+        for queue in self.subscribers:
+            queue.extend(ready)
+
+    def __around_all(self, squares):
+        """
+        Returns the flat indices around every square of an index array, once for every square they are around
+        """
+        width, height = self.grid
+        x, y = np.divmod(squares, height)
+        around = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                if dx or dy:
+                    valid = (x + dx >= 0) & (x + dx < width) & (y + dy >= 0) & (y + dy < height)
+                    around.append(squares[valid] + (dx * height + dy))
+        return np.concatenate(around)
+
+    def __uncovered(self, squares):
+        """
+        Updates the unrevealed counts around newly revealed squares (flat indices, a list or an index array)
+        """
+        self.changes += 1
+        if len(squares) == 0:
+            return
+        table = self.neighbors()
+        if len(squares) <= MAX_LOOP_UPDATE and table is not None:
+            if isinstance(squares, np.ndarray):
+                squares = squares.tolist()
+            offsets, indices = table
+            counts = self.adjacent
+            for k in squares:
+                for n in indices[offsets[k]:offsets[k + 1]]:
+                    counts[n] -= ONE_UNREVEALED
+            if not self.subscribers:
+                return
+            touched = list(squares)
+            for k in squares:
+                touched.extend(indices[offsets[k]:offsets[k + 1]])
+        elif len(squares) * 8 > len(self.cells):
+            # Counting around a mask of the squares beats gathering the eight neighbours of each
+            uncovered = np.zeros(len(self.cells), dtype=bool)
+            uncovered[squares] = True
+            uncovered = uncovered.reshape(self.grid[0], self.grid[1])
+            counts = np.frombuffer(self.adjacent, dtype=np.uint8).reshape(self.grid[0], self.grid[1])
+            counts -= count_neighbors(uncovered) << ADJACENT_UNREVEALED
+            if not self.subscribers:
+                return
+            touched = np.flatnonzero(dilate(uncovered))
+        else:
+            squares = np.array(squares, dtype=np.int64)
+            around = self.__around_all(squares)
+            counts = np.frombuffer(self.adjacent, dtype=np.uint8)
+            add_counts(counts, around, -ONE_UNREVEALED)
+            touched = np.concatenate([squares, around])
+        self.__notify(touched)
+
+    def __flagged(self, k, change):
+        """
+        Updates the flag counts around a square that was flagged (change 1) or unflagged (change -1)
+        """
+        self.changes += 1
+        counts = self.adjacent
+        around = self.around(k)
+        for n in around:
+            counts[n] += change
+        self.__notify(around)
+
+    def count_adjacent(self):
+        """
+        Counts the flagged and unrevealed squares around every square with a full scan, packed like Board.adjacent
+        """
+        state = self.state
+        counts = count_neighbors((state & REVEALED) == 0)
+        counts <<= ADJACENT_UNREVEALED
+        counts |= count_neighbors((state & FLAGGED) != 0)
+        return bytearray(counts.tobytes())
+
+    def recount_adjacent(self):
+        """
+        Resets the flagged and unrevealed counts around every square from the cells, and the subscribed queues
+        """
+        self.adjacent = self.count_adjacent()
+        self.changes += 1
+        for queue in self.subscribers:
+            queue.clear()
+        self.__notify_all()
     
     def check_win(self):
         """
         Checks if the player has won
         """
-        reveals_and_bombs = True
-        for i in range(self.grid[0]):
-            for j in range(self.grid[1]):
-                if not self.board[i][j].revealed and not self.board[i][j].bomb:
-                    reveals_and_bombs = False
-        
-        self.won = reveals_and_bombs
+        if self.check_counters:
+            assert self.count_squares() == (self.revealed_safe, self.flags, self.correct_flags), "Board counters out of sync"
+            assert self.count_adjacent() == self.adjacent, "Neighbour counts out of sync"
+
+        # Every square that is not a bomb has to be revealed
+        self.won = (self.revealed_safe == self.safe_squares)
 
         if self.won:
-            self.end_time = pygame.time.get_ticks()
+            self.end_time = self.clock()
 
     def reveal_all(self):
         """
         Reveals all squares
         """
-        for i in range(self.grid[0]):
-            for j in range(self.grid[1]):
-                self.board[i][j].reveal()
+        self.journal_all()
+        self.state[:] |= REVEALED
+        self.revealed_safe = self.safe_squares
+        self.recount_adjacent()
+        self.moves.append(REVEAL_ALL << 2 | MOVE_BULK)
+        self.events.record(BULK, "All squares revealed")
 
     def unreveal_all(self):
         """
         Unreveals all squares
         """
-        for i in range(self.grid[0]):
-            for j in range(self.grid[1]):
-                self.board[i][j].unreveal()
+        self.journal_all()
+        self.state[:] &= ~REVEALED & 0xFF
+        self.revealed_safe = 0
+        self.recount_adjacent()
+        self.moves.append(UNREVEAL_ALL << 2 | MOVE_BULK)
+        self.events.record(BULK, "All squares unrevealed")
 
     def flag_all(self):
         """
         Flags all bombs
         """
-        for i in range(self.grid[0]):
-            for j in range(self.grid[1]):
-                if self.board[i][j].bomb:
-                    self.board[i][j].flag()
+        self.journal_all()
+        state = self.state
+        state[(state & BOMB) != 0] |= FLAGGED
+        self.recount()
+        self.moves.append(FLAG_ALL << 2 | MOVE_BULK)
+        self.events.record(BULK, "All bombs flagged")
 
     def unflag_all(self):
         """
         Unflags all squares
         """
-        for i in range(self.grid[0]):
-            for j in range(self.grid[1]):
-                self.board[i][j].unflag()
+        self.journal_all()
+        self.state[:] &= ~FLAGGED & 0xFF
+        self.flags = 0
+        self.correct_flags = 0
+        self.recount_adjacent()
+        self.moves.append(UNFLAG_ALL << 2 | MOVE_BULK)
+        self.events.record(BULK, "All squares unflagged")
+
+    def journal_all(self):
+        """
+        Journals a full copy of the cells before they are replaced or changed in bulk
+        """
+        if self.saved_boards:
+            self.journal.append(-1)
+            self.journal_cells.append(0)
+            self.journal_copies.append(bytes(self.cells))
 
     def save_board(self):
         """
         Saves the board to a stack
         """
-        self.saved_boards.append(copy.deepcopy(self.board))
+        state = {name: getattr(self, name) for name in SNAPSHOT_ATTRIBUTES}
+        self.saved_boards.append((len(self.journal), len(self.moves), state))
 
     def load_board(self):
         """
         Loads the board from a stack
         """
-        if self.saved_boards:
-            self.board = self.saved_boards.pop()
-        else:
+        if not self.saved_boards:
             logging.error("[-] No saved boards")
+            return
+
+        # Undo every change made since the snapshot, newest first
+        mark, moves, state = self.saved_boards.pop()
+        while len(self.journal) > mark:
+            k = self.journal.pop()
+            cell = self.journal_cells.pop()
+            if k < 0:
+                self.cells = bytearray(self.journal_copies.pop())
+            else:
+                self.cells[k] = cell
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.recount_adjacent()
+        # The log is restored by reference, moves made after the snapshot are dropped from it
+        del self.moves[moves:]
+
+    def to_bytes(self):
+        """
+        Serializes the complete game state
+        """
+        state = self.state
+        start_pos = self.start_pos if self.start_pos is not None else (NO_VALUE, NO_VALUE)
+        header = SAVE_HEADER.pack(SAVE_MAGIC, SAVE_VERSION, self.grid[0], self.grid[1], self.bombs,
+                                  self.game_over, self.won, self.playing, self.isdeterministic,
+                                  start_pos[0], start_pos[1],
+                                  NO_VALUE if self.start_time is None else self.start_time,
+                                  NO_VALUE if self.end_time is None else self.end_time)
+        planes = [np.packbits((state & bit) != 0) for bit in (BOMB, REVEALED, FLAGGED, REVEALED_ADJACENT)]
+        return header + b"".join(plane.tobytes() for plane in planes)
+
+    def from_bytes(self, data):
+        """
+        Restores the complete game state from to_bytes() output (bytes or a uint8 memmap)
+
+        The planes are decoded a block of rows at a time straight into the cells, a memmap is only
+        read one block at a time.
+        """
+        magic, version = struct.unpack("<4sB", bytes(data[:5]))
+        if magic != SAVE_MAGIC or version not in SAVE_HEADERS:
+            raise ValueError("Not a saved board (magic: " + str(magic) + ", version: " + str(version) + ")")
+        header = SAVE_HEADERS[version]
+        (magic, version, width, height, bombs, game_over, won, playing, isdeterministic,
+         start_x, start_y, start_time, end_time) = header.unpack(bytes(data[:header.size]))
+
+        squares = width * height
+        plane_size = (squares + 7) // 8
+
+        def unpack(plane, first, rows):
+            """
+            Returns rows rows of a plane from row first on
+            """
+            start = first * height
+            count = rows * height
+            offset = header.size + plane * plane_size + start // 8
+            packed = np.frombuffer(data, dtype=np.uint8, count=(start % 8 + count + 7) // 8, offset=offset)
+            return np.unpackbits(packed)[start % 8:start % 8 + count].view(bool).reshape(rows, height)
+
+        cells = bytearray(squares)
+        state = np.frombuffer(cells, dtype=np.uint8).reshape(width, height)
+        block = max(1, LOAD_BLOCK_SQUARES // max(1, height))
+        for first in range(0, width, block):
+            rows = min(block, width - first)
+            # The bombs of the rows on either side of the block count towards the numbers on its edges
+            before = min(first, 1)
+            after = min(width - first - rows, 1)
+            mines = unpack(0, first - before, before + rows + after)
+            part = state[first:first + rows]
+            part[:] = count_neighbors(mines)[before:before + rows]
+            part[mines[before:before + rows]] = BOMB
+            for plane, bit in ((1, REVEALED), (2, FLAGGED), (3, REVEALED_ADJACENT)):
+                part[unpack(plane, first, rows)] |= bit
+
+        self.journal_all()
+        self.grid = [width, height]
+        self.bombs = bombs
+        self.cells = cells
+        self.safe_squares = squares - bombs
+        self.recount()
+        self.game_over = bool(game_over)
+        self.won = bool(won)
+        self.playing = bool(playing)
+        self.isdeterministic = bool(isdeterministic)
+        self.start_pos = None if start_x == NO_VALUE else (start_x, start_y)
+        self.seed = None
+        self.moves = move_log(self.grid)
+        self.start_time = None if start_time == NO_VALUE else start_time
+        self.end_time = None if end_time == NO_VALUE else end_time
+
+    def save_file(self, path):
+        """
+        Saves the complete game state to a file
+        """
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+        logging.info("[+] Board saved to %s", path)
+
+    def load_file(self, path, mmap=False):
+        """
+        Loads the complete game state from a file, memory-mapping it if asked to, so it is read
+        one block of rows at a time instead of all at once
+        """
+        if mmap:
+            self.from_bytes(np.memmap(path, dtype=np.uint8, mode="r"))
+        else:
+            with open(path, "rb") as file:
+                self.from_bytes(file.read())
+        logging.info("[+] Board loaded from %s", path)
+
+    def count_squares(self):
+        """
+        Counts the revealed safe squares, flags and correct flags with a full scan
+        """
+        state = self.state
+        bombs = (state & BOMB) != 0
+        revealed = (state & REVEALED) != 0
+        flagged = (state & FLAGGED) != 0
+        return (int(np.count_nonzero(revealed & ~bombs)), int(np.count_nonzero(flagged)), int(np.count_nonzero(flagged & bombs)))
+
+    def recount(self):
+        """
+        Resets the running counters from the cells
+        """
+        self.revealed_safe, self.flags, self.correct_flags = self.count_squares()
+        self.recount_adjacent()
@@ -0,0 +1,90 @@
+import logging
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .Board import Board
+from .gamemode import gamemode
+
+def generate(grid, bombs, seed):
+    """
+    Searches for a deterministic board, returns the (seed, start_pos) that recreate it
+    """
+    board = Board()
+    board.new_board(grid, bombs, True, seed)
+    return board.seed, board.start_pos
+
+class BoardPool:
+    """
+    Keeps a few deterministic boards of every preset ready, searched for in the background
+
+    Only (seed, start_pos) is kept for every board, Board.new_board recreates it from them in
+    one create_board call. Any concurrent.futures executor can run the search, a
+    ProcessPoolExecutor keeps it off the interpreter of the game.
+    """
+    def __init__(self, presets=None, size=2, executor=None):
+        if presets is None:
+            presets = [(mode["grid"], mode["bombs"]) for mode in gamemode.values()]
+        self.size = size
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="BoardPool")
+        self.lock = threading.RLock()
+        self.ready = {}
+        self.pending = {}
+        self.closed = False
+        with self.lock:
+            for grid, bombs in presets:
+                key = (tuple(grid), bombs)
+                self.ready[key] = deque()
+                self.pending[key] = 0
+                self.__fill(key)
+
+    def __fill(self, key):
+        """
+        Starts searches until the preset has size boards ready or being searched for
+        """
+        while not self.closed and len(self.ready[key]) + self.pending[key] < self.size:
+            self.pending[key] += 1
+            future = self.executor.submit(generate, list(key[0]), key[1], random.getrandbits(64))
+            future.add_done_callback(lambda future, key=key: self.__done(key, future))
+
+    def __done(self, key, future):
+        with self.lock:
+            self.pending[key] -= 1
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                logging.error("[-] Board pool search failed: %s", future.exception())
+                return
+            self.ready[key].append(future.result())
+
+    def take(self, grid, bombs):
+        """
+        Returns the (seed, start_pos) of a ready board and starts searching for its replacement
+
+        Returns None if the preset is not pooled or no board is ready yet.
+        """
+        key = (tuple(grid), bombs)
+        with self.lock:
+            if key not in self.ready:
+                return None
+            result = self.ready[key].popleft() if self.ready[key] else None
+            self.__fill(key)
+        return result
+
+    def new_board(self, board, grid, bombs, deterministic=False):
+        """
+        Creates a new board, taking a ready one from the pool for deterministic boards when possible
+        """
+        ready = self.take(grid, bombs) if deterministic else None
+        if ready is None:
+            board.new_board(grid, bombs, deterministic)
+        else:
+            board.new_board(grid, bombs, True, *ready)
+
+    def close(self):
+        """
+        Stops searching for boards
+        """
+        with self.lock:
+            self.closed = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
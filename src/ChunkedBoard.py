@@ -0,0 +1,279 @@
+import os
+import random
+import shutil
+import logging
+import tempfile
+from collections import OrderedDict, deque
+from functools import lru_cache
+import numpy as np
+from .Board import ticks
+from .cells import *
+from .neighbors import count_neighbors
+
+# Squares one reveal floods at most, below a density of about 0.09 the empty squares of an endless
+# board connect and a flood would never end. continue_flood() carries on from where it stopped.
+MAX_FLOOD = 1 << 16
+
+@lru_cache(maxsize=256)
+def chunk_mines(seed, chunk_size, bombs, cx, cy, width, height):
+    """
+    Returns the (chunk_size, chunk_size) bomb mask of a chunk, derived only from the seed and chunk coordinates
+    """
+    rng = random.Random("{0}:{1}:{2}".format(seed, cx, cy))
+    mines = np.zeros(chunk_size * chunk_size, dtype=bool)
+    if bombs:
+        # Only the part of an edge chunk that lies on the board can hold bombs
+        indices = np.array(rng.sample(range(width * height), bombs))
+        mines[(indices // height) * chunk_size + indices % height] = True
+    return mines.reshape(chunk_size, chunk_size)
+
+class ChunkedBoard:
+    """
+    Huge board split into chunks that are generated when first touched
+
+    Every chunk holds a fixed share of the bombs, placed from (seed, chunk coordinates), so
+    untouched chunks never need to be stored. Loading a chunk beyond max_chunks evicts the least
+    recently used one, also in the middle of a flood, chunks the player changed are written to
+    disk and read back later.
+    """
+    def __init__(self, width, height, density=0.15, seed=0, chunk_size=64, max_chunks=256, path=None, clock=ticks,
+                 max_flood=MAX_FLOOD):
+        self.grid = [width, height]
+        self.density = density
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.max_flood = max_flood
+        self.clock = clock
+
+        self.path = path or tempfile.mkdtemp(prefix="minesweeper-chunks-")
+        self.temporary = path is None
+        os.makedirs(self.path, exist_ok=True)
+
+        self.chunks = OrderedDict()
+        self.dirty = set()
+        # Squares an unfinished flood still has to spread from
+        self.frontier = deque()
+
+        self.bombs = self.__count_bombs()
+        self.safe_squares = width * height - self.bombs
+        self.revealed_safe = 0
+        self.flags = 0
+        self.correct_flags = 0
+        self.game_over = False
+        self.won = False
+        self.playing = False
+        self.start_time = None
+        self.end_time = None
+
+        logging.info("[+] Chunked board created (grid: %s, bombs: %s, seed: %s)", self.grid, self.bombs, seed)
+
+    def __chunk_area(self, cx, cy):
+        """
+        Returns the size of the part of a chunk that lies on the board
+        """
+        width = min(self.chunk_size, self.grid[0] - cx * self.chunk_size)
+        height = min(self.chunk_size, self.grid[1] - cy * self.chunk_size)
+        return width, height
+
+    def __chunk_bombs(self, width, height):
+        return int(width * height * self.density)
+
+    def __count_bombs(self):
+        """
+        Counts the bombs of the whole board without generating it
+        """
+        size = self.chunk_size
+        full_x, rest_x = divmod(self.grid[0], size)
+        full_y, rest_y = divmod(self.grid[1], size)
+        return (full_x * full_y * self.__chunk_bombs(size, size)
+                + full_x * self.__chunk_bombs(size, rest_y)
+                + full_y * self.__chunk_bombs(rest_x, size)
+                + self.__chunk_bombs(rest_x, rest_y))
+
+    def __mines(self, cx, cy):
+        """
+        Returns the bomb mask of a chunk, empty for chunks off the board
+        """
+        if cx < 0 or cy < 0 or cx * self.chunk_size >= self.grid[0] or cy * self.chunk_size >= self.grid[1]:
+            return np.zeros((self.chunk_size, self.chunk_size), dtype=bool)
+        width, height = self.__chunk_area(cx, cy)
+        return chunk_mines(self.seed, self.chunk_size, self.__chunk_bombs(width, height), cx, cy, width, height)
+
+    def __file(self, key):
+        return os.path.join(self.path, "{0}_{1}.chunk".format(*key))
+
+    def __generate(self, cx, cy):
+        """
+        Creates the cells of a chunk, its numbers need the bombs of the surrounding chunks
+        """
+        size = self.chunk_size
+        mines = np.block([[self.__mines(cx + dx, cy + dy) for dy in (-1, 0, 1)] for dx in (-1, 0, 1)])
+        state = count_neighbors(mines)[size:2 * size, size:2 * size]
+        state[mines[size:2 * size, size:2 * size]] = BOMB
+        return bytearray(state.tobytes())
+
+    def chunk(self, cx, cy):
+        """
+        Returns the cells of a chunk, loading or generating it on first use
+        """
+        key = (cx, cy)
+        cells = self.chunks.get(key)
+        if cells is not None:
+            self.chunks.move_to_end(key)
+            return cells
+
+        path = self.__file(key)
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                cells = bytearray(file.read())
+        else:
+            cells = self.__generate(cx, cy)
+        self.chunks[key] = cells
+        self.evict()
+        return cells
+
+    def evict(self):
+        """
+        Drops the least recently used chunks above max_chunks, writing the changed ones to disk
+
+        The most recently used chunk is always kept, it is the one being read or changed.
+        """
+        while len(self.chunks) > max(1, self.max_chunks):
+            key, cells = self.chunks.popitem(last=False)
+            if key in self.dirty:
+                with open(self.__file(key), "wb") as file:
+                    file.write(cells)
+                self.dirty.discard(key)
+
+    def close(self):
+        """
+        Removes the chunk files if they were written to a temporary directory
+        """
+        self.chunks.clear()
+        self.dirty.clear()
+        if self.temporary:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def get(self, pos):
+        """
+        Returns the cell byte of a square
+        """
+        cells = self.chunk(pos[0] // self.chunk_size, pos[1] // self.chunk_size)
+        return cells[(pos[0] % self.chunk_size) * self.chunk_size + pos[1] % self.chunk_size]
+
+    def __set(self, pos, cell):
+        key = (pos[0] // self.chunk_size, pos[1] // self.chunk_size)
+        cells = self.chunk(*key)
+        cells[(pos[0] % self.chunk_size) * self.chunk_size + pos[1] % self.chunk_size] = cell
+        self.dirty.add(key)
+
+    def around(self, pos):
+        """
+        Returns the squares surrounding a square
+        """
+        x, y = pos
+        return [(i, j)
+                for i in range(max(x - 1, 0), min(x + 2, self.grid[0]))
+                for j in range(max(y - 1, 0), min(y + 2, self.grid[1]))
+                if i != x or j != y]
+
+    def reveal_square(self, pos):
+        """
+        Reveals a square, returns the list of newly revealed squares
+        """
+        if not self.playing:
+            self.playing = True
+            self.start_time = self.clock()
+
+        cell = self.get(pos)
+        if cell & FLAGGED:
+            return []
+        elif not cell & REVEALED:
+            self.__set(pos, cell | REVEALED)
+            revealed = [pos]
+            if cell & BOMB:
+                self.game_over = True
+                self.end_time = self.clock()
+                logging.info("[-] Game over at %s", pos)
+                return revealed
+            self.revealed_safe += 1
+            if cell & VALUE == 0 and not cell & REVEALED_ADJACENT:
+                self.__set(pos, cell | REVEALED | REVEALED_ADJACENT)
+                revealed += self.reveal_adjacent(pos)
+        elif self.checksum(pos) and not cell & REVEALED_ADJACENT:
+            self.__set(pos, cell | REVEALED_ADJACENT)
+            revealed = self.reveal_adjacent(pos)
+        else:
+            return []
+        return revealed
+
+    def reveal_adjacent(self, pos):
+        """
+        Reveals all adjacent squares, flooding through empty squares across chunks
+
+        At most about max_flood squares are revealed, the rest of the flood is left in frontier.
+        """
+        self.frontier.append(pos)
+        return self.continue_flood()
+
+    def continue_flood(self):
+        """
+        Spreads an unfinished flood by at most about max_flood more squares, returns the newly revealed squares
+        """
+        revealed = []
+        pending = self.frontier
+        while pending and len(revealed) < self.max_flood:
+            for square in self.around(pending.popleft()):
+                cell = self.get(square)
+                if cell & (REVEALED | FLAGGED):
+                    continue
+                self.__set(square, cell | REVEALED)
+                revealed.append(square)
+                if cell & BOMB:
+                    self.game_over = True
+                    self.end_time = self.clock()
+                    logging.info("[-] Game over at %s", square)
+                    continue
+                self.revealed_safe += 1
+                if cell & VALUE == 0 and not cell & REVEALED_ADJACENT:
+                    self.__set(square, cell | REVEALED | REVEALED_ADJACENT)
+                    pending.append(square)
+        return revealed
+
+    def flag_square(self, pos):
+        """
+        Flags a square
+        """
+        cell = self.get(pos)
+        if not cell & REVEALED:
+            if cell & FLAGGED:
+                self.__set(pos, cell & ~FLAGGED)
+                self.flags -= 1
+                if cell & BOMB:
+                    self.correct_flags -= 1
+            elif self.flags >= self.bombs:
+                logging.info("[-] No more flags available")
+            else:
+                self.__set(pos, cell | FLAGGED)
+                self.flags += 1
+                if cell & BOMB:
+                    self.correct_flags += 1
+
+    def checksum(self, pos):
+        """
+        Checks if the number of flagged squares around a revealed square is equal to the value of the square
+
+        With a wrong flag among them a bomb around is left unflagged, revealing the others then ends the game.
+        """
+        cell = self.get(pos)
+        number = sum(1 for square in self.around(pos) if self.get(square) & FLAGGED)
+        return not cell & BOMB and number == cell & VALUE
+
+    def check_win(self):
+        """
+        Checks if the player has won
+        """
+        self.won = (self.revealed_safe == self.safe_squares)
+        if self.won:
+            self.end_time = self.clock()
@@ -0,0 +1,171 @@
+import argparse
+import asyncio
+import logging
+import random
+import time
+import zlib
+import numpy as np
+from .AutoPlayer import percentile
+from .Server import (GameServer, HELLO, MOVE, RESET, SNAPSHOT, DELTA, MOVE_BODY, SNAPSHOT_HEADER,
+                     DELTA_HEADER, REVEAL_MOVE, FLAG_MOVE, message, read_message)
+from .gamemode import gamemode
+from .cells import *
+
+class GameClient:
+    """
+    Connection to a GameServer keeping the visible state of the board up to date
+    """
+    def __init__(self, name):
+        self.name = name
+        self.player = None
+        self.grid = None
+        self.bombs = 0
+        self.cells = bytearray()
+        self.game_over = False
+        self.won = False
+        self.games = 0
+        self.next_move = 0
+        self.pending = {}
+        self.snapshot = None
+        self.reader_task = None
+
+    async def connect(self, host, port):
+        """
+        Joins the game and waits for the snapshot of the board
+        """
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.snapshot = asyncio.get_running_loop().create_future()
+        self.writer.write(message(HELLO, self.name.encode()))
+        self.reader_task = asyncio.create_task(self.read())
+        await self.snapshot
+
+    async def close(self):
+        self.writer.close()
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+
+    async def move(self, kind, pos):
+        """
+        Sends a move and waits until the server applied it, returns the round trip time in seconds
+        """
+        move = self.next_move
+        self.next_move += 1
+        done = asyncio.get_running_loop().create_future()
+        self.pending[move] = done
+        start = time.perf_counter()
+        self.writer.write(message(MOVE, MOVE_BODY.pack(move, kind, pos[0], pos[1])))
+        await self.writer.drain()
+        await done
+        return time.perf_counter() - start
+
+    async def reset(self):
+        self.writer.write(message(RESET))
+        await self.writer.drain()
+
+    async def read(self):
+        """
+        Applies snapshots and deltas as they arrive
+        """
+        try:
+            while True:
+                kind, payload = await read_message(self.reader)
+                if kind == SNAPSHOT:
+                    self.player, width, height, self.bombs, game_over, won = SNAPSHOT_HEADER.unpack_from(payload)
+                    self.grid = [width, height]
+                    self.cells = bytearray(zlib.decompress(payload[SNAPSHOT_HEADER.size:]))
+                    self.game_over, self.won = bool(game_over), bool(won)
+                    self.games += 1
+                    if not self.snapshot.done():
+                        self.snapshot.set_result(None)
+                elif kind == DELTA:
+                    player, move, game_over, won, count = DELTA_HEADER.unpack_from(payload)
+                    indices = np.frombuffer(payload, dtype="<u4", count=count, offset=DELTA_HEADER.size)
+                    shown = np.frombuffer(payload, dtype=np.uint8, count=count, offset=DELTA_HEADER.size + 4 * count)
+                    np.frombuffer(self.cells, dtype=np.uint8)[indices] = shown
+                    self.game_over, self.won = bool(game_over), bool(won)
+                    if player == self.player and move in self.pending:
+                        self.pending.pop(move).set_result(None)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            for done in self.pending.values():
+                if not done.done():
+                    done.set_exception(ConnectionError("Connection to the server lost"))
+
+    def random_unknown(self, rng, tries=64):
+        """
+        Returns a random square this client has not seen revealed, or None
+        """
+        squares = len(self.cells)
+        for _ in range(tries):
+            k = rng.randrange(squares)
+            if not self.cells[k] & REVEALED:
+                return divmod(k, self.grid[1])
+        return None
+
+async def simulate_player(host, port, name, moves, rng, latencies):
+    """
+    Joins, clicks random unknown squares, flagging one in ten, and leaves
+    """
+    client = GameClient(name)
+    await client.connect(host, port)
+    for _ in range(moves):
+        pos = client.random_unknown(rng)
+        if pos is None:
+            await client.reset()
+            await asyncio.sleep(0)
+            continue
+        kind = FLAG_MOVE if rng.random() < 0.1 else REVEAL_MOVE
+        latencies.append(await client.move(kind, pos))
+    await client.close()
+
+async def load_test(host, port, players, moves, seed, grid=None, bombs=None):
+    """
+    Lets many simulated players play at once, starting a local server when grid is given
+    """
+    server = None
+    if grid is not None:
+        server = GameServer(grid, bombs)
+        port = await server.start(host, 0)
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[simulate_player(host, port, "player" + str(i), moves, random.Random(seed + i), latencies)
+                           for i in range(players)])
+    seconds = time.perf_counter() - start
+
+    if server is not None:
+        await server.stop()
+    return {
+        "players": players,
+        "moves": len(latencies),
+        "seconds": seconds,
+        "moves_per_second": len(latencies) / seconds if seconds else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p99": percentile(latencies, 99),
+        "latency_max": max(latencies, default=0.0),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulates many players clicking on one server and reports move latencies")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--players", type=int, default=200)
+    parser.add_argument("--moves", type=int, default=50, help="moves per player")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--local", action="store_true", help="start a server in this process instead of connecting to one")
+    parser.add_argument("--mode", default="Expert", choices=list(gamemode), help="board of the local server")
+    parser.add_argument("--grid", type=int, nargs=2, help="custom grid size of the local server, overrides --mode")
+    parser.add_argument("--bombs", type=int, help="custom number of bombs of the local server, overrides --mode")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    grid = bombs = None
+    if args.local:
+        grid = args.grid or gamemode[args.mode]["grid"]
+        bombs = args.bombs if args.bombs is not None else gamemode[args.mode]["bombs"]
+
+    result = asyncio.run(load_test(args.host, args.port, args.players, args.moves, args.seed, grid, bombs))
+    for key, value in result.items():
+        print(key + ": " + str(value))
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,60 @@
+import math
 import pygame
+import numpy as np
 from .colors import *
 from .gamemode import gamemode
+from .FontCache import FontCache
+from .Probability import Probability
+from .cells import *
+
+# Tiles a square can be drawn with, 0..8 are revealed squares showing their number
+UNREVEALED = 9
+FLAG = 10
+BOMB_SHOWN = 11
+START = 12
+
+# Above this many changed squares the whole grid is pushed as a single rect
+MAX_DIRTY_SQUARES = 64
+
+# Squares smaller than this many pixels are drawn from a downsampled image instead of tiles
+MIN_TILE = 8
+# Zooming in stops once squares are this many pixels wide
+MAX_TILE = 80
+
+# With hints shown, unrevealed squares are drawn with tile HINT + level, from level 0 (safe) to
+# HINT_LEVELS - 1 (bomb) in steps of bomb probability
+HINT = 13
+HINT_LEVELS = 11
+HINT_COLORS = [tuple(round(a + (b - a) * level / (HINT_LEVELS - 1)) for a, b in zip(LIGHT_GREEN, LIGHT_RED))
+               for level in range(HINT_LEVELS)]
+
+# Colors of the downsampled image, squares showing a number are darker than empty ones
+LOD_COLORS = np.array([LIGHT_GREY] + [GREY] * 8 + [DARK_GREY, LIGHT_RED, DARK_RED, GREEN] + HINT_COLORS, dtype=np.uint8)
 
 class Draw:
-    def __init__(self):
-        pass
+    def __init__(self, fonts=None):
+        self.fonts = fonts or FontCache()
+        self.layout = None
+        self.view = None
+        self.shown = None
+        self.tile_size = None
+        self.zoom = 1.0
+        self.offset = [0, 0]
+        self.timer = None
+        self.label = None
+        self.probability = None
+        self.hints = None
+
+    def font(self, name, size, bold=False):
+        """
+        Returns a font, creating it only the first time it is asked for
+        """
+        return self.fonts.font(name, size, bold)
 
     def draw(self, screen, board, settings):
+        """
+        Draws everything that changed since the last frame and returns the dirty rects
+        """
         self.screen = screen
         self.mode = settings["mode"]
         self.board = board
@@ -17,36 +65,183 @@ class Draw:
         self.grid_start_location = (100 + (self.size[0] - self.grid_size[0]) // 2, (self.size[1] - self.grid_size[1]) // 2)
         self.grid_end_location = (self.grid_start_location[0] + self.grid_size[0], self.grid_start_location[1] + self.grid_size[1])
 
-        self.draw_instructions()
-        self.draw_labels()
-        self.draw_grid()
+        layout = (screen, screen.get_size(), self.mode, tuple(board.grid))
+        if layout != self.layout:
+            # Mode, board shape or window changed: reset the view and redraw everything
+            self.layout = layout
+            self.zoom = 1.0
+            self.offset = [0, 0]
+            self.view = None
+            self.update_view()
+            self.timer = None
+            self.label = None
+            self.screen.fill(WHITE)
+            self.draw_instructions()
+            self.draw_labels()
+            self.draw_grid()
+            self.display_timer()
+            return [self.screen.get_rect()]
+
+        return self.draw_labels() + self.draw_grid() + self.display_timer()
+
+    def update_view(self):
+        """
+        Computes the square size for the current zoom and keeps the view on the board
+        """
+        grid = self.board.grid
+        cell_x = self.grid_size[0] / grid[0] * self.zoom
+        cell_y = self.grid_size[1] / grid[1] * self.zoom
+        self.tiled = min(cell_x, cell_y) >= MIN_TILE
+        if self.tiled:
+            cell_x, cell_y = int(cell_x), int(cell_y)
+        self.cell_x, self.cell_y = cell_x, cell_y
 
-        self.display_timer()
+        self.offset[0] = int(min(max(self.offset[0], 0), max(0, grid[0] * cell_x - self.grid_size[0])))
+        self.offset[1] = int(min(max(self.offset[1], 0), max(0, grid[1] * cell_y - self.grid_size[1])))
+
+    def to_grid(self, pos):
+        """
+        Returns the square under a screen position, or None
+        """
+        if self.layout is None:
+            return None
+        start_x, start_y = self.grid_start_location
+        if not (start_x <= pos[0] < self.grid_end_location[0] and start_y <= pos[1] < self.grid_end_location[1]):
+            return None
+
+        x = int((pos[0] - start_x + self.offset[0]) // self.cell_x)
+        y = int((pos[1] - start_y + self.offset[1]) // self.cell_y)
+        if x >= self.board.grid[0] or y >= self.board.grid[1]:
+            return None
+        return (x, y)
+
+    def pan(self, dx, dy):
+        """
+        Moves the view by a number of pixels
+        """
+        if self.layout is None:
+            return
+        self.offset[0] += dx
+        self.offset[1] += dy
+        self.update_view()
+
+    def zoom_at(self, pos, factor):
+        """
+        Zooms by a factor, keeping the square under pos in place
+        """
+        if self.layout is None:
+            return
+        grid = self.board.grid
+        fit = min(self.grid_size[0] / grid[0], self.grid_size[1] / grid[1])
+        old_x, old_y = self.cell_x, self.cell_y
+        self.zoom = min(max(self.zoom * factor, 1.0), max(1.0, MAX_TILE / fit))
+
+        # Anchor on the mouse if it is over the grid, otherwise on the middle of the grid
+        anchor_x = pos[0] - self.grid_start_location[0]
+        anchor_y = pos[1] - self.grid_start_location[1]
+        if not (0 <= anchor_x < self.grid_size[0] and 0 <= anchor_y < self.grid_size[1]):
+            anchor_x, anchor_y = self.grid_size[0] // 2, self.grid_size[1] // 2
+
+        self.update_view()
+        self.offset[0] = round((self.offset[0] + anchor_x) / old_x * self.cell_x - anchor_x)
+        self.offset[1] = round((self.offset[1] + anchor_y) / old_y * self.cell_y - anchor_y)
+        self.update_view()
+
+    def create_tiles(self):
+        """
+        Pre-renders one surface per kind of square at the current square size
+        """
+        self.tile_size = (self.cell_x, self.cell_y)
+        self.len_x, self.len_y = self.tile_size
+
+        font = self.font('Calibri', min(25, self.len_y), True)
+        colors = [LIGHT_GREY] * 9 + [DARK_GREY, LIGHT_RED, DARK_RED, GREEN] + HINT_COLORS
+        self.tiles = []
+        for number, color in enumerate(colors):
+            # The white border makes up the grid lines between squares
+            tile = pygame.Surface((self.len_x, self.len_y))
+            tile.fill(WHITE)
+            tile.fill(color, (1, 1, self.len_x - 2, self.len_y - 2))
+            if 0 < number < UNREVEALED:
+                text = font.render(str(number), True, BLACK)
+                tile.blit(text, [self.len_x // 2 - text.get_width() // 2, self.len_y // 2 - text.get_height() // 2])
+            self.tiles.append(tile)
+
+    def tile_codes(self, xs, ys):
+        """
+        Returns the tile every square in the xs, ys slices should currently be drawn with
+        """
+        state = self.board.state[xs, ys]
+        revealed = (state & REVEALED) != 0
+        bombs = (state & BOMB) != 0
+
+        codes = np.where(revealed, state & VALUE, UNREVEALED).astype(np.uint8)
+        if self.settings.get("hints") and not (self.board.game_over or self.board.won):
+            hidden = codes == UNREVEALED
+            codes[hidden] = HINT + self.hint_levels()[xs, ys][hidden]
+        codes[(state & FLAGGED) != 0] = FLAG
+        codes[bombs if self.board.game_over else bombs & revealed] = BOMB_SHOWN
+        start_pos = self.board.start_pos
+        if self.board.isdeterministic and start_pos is not None and not self.board.playing:
+            i, rest_x = divmod(start_pos[0] - xs.start, xs.step or 1)
+            j, rest_y = divmod(start_pos[1] - ys.start, ys.step or 1)
+            if 0 <= i < codes.shape[0] and 0 <= j < codes.shape[1] and not rest_x and not rest_y:
+                codes[i, j] = START
+        return codes
+
+    def hint_levels(self):
+        """
+        Returns the hint level of every square, the bomb probabilities are only computed again when the board changed
+        """
+        board = self.board
+        if self.probability is None or self.probability.grid != board.grid:
+            self.probability = Probability(board.grid)
+            self.hints = None
+        key = (board, board.changes)
+        if self.hints is None or self.hints[0] != key:
+            probabilities = self.probability.compute(board.cells, board.bombs)
+            levels = np.rint(np.nan_to_num(probabilities) * (HINT_LEVELS - 1)).astype(np.uint8)
+            self.hints = (key, levels)
+        return self.hints[1]
+
+    def visible(self, offset, cell, size, count):
+        """
+        Returns the first and past the last square index inside the grid area along one axis
+        """
+        return int(offset // cell), min(count, math.ceil((offset + size) / cell))
 
     def display_timer(self):
         """
         Creates and displays the timer
         """
-        font = pygame.font.SysFont('Arial', 40)
         if self.board.game_over or self.board.won:
             start = self.board.start_time
             end = self.board.end_time
             time = (end - start) / 1000
         elif self.board.playing:
             start = self.board.start_time
-            current = pygame.time.get_ticks()
+            current = self.board.clock()
             time = (current - start) / 1000
         else:
             time = 0
 
-        text = font.render("{0:.2f} s".format(time).zfill(8), True, BLUE)
-        self.screen.blit(text, [50, self.grid_start_location[1] + 10])
+        value = "{0:.2f} s".format(time).zfill(8)
+        if self.timer is not None and self.timer[0] == value:
+            return []
+
+        rects = []
+        if self.timer is not None:
+            rects.append(self.screen.fill(WHITE, self.timer[1]))
+        text = self.font('Arial', 40).render(value, True, BLUE)
+        rects.append(self.screen.blit(text, [50, self.grid_start_location[1] + 10]))
+        self.timer = (value, rects[-1])
+        return rects
 
     def draw_instructions(self):
         """
         Draws the instructions
         """
-        font = pygame.font.SysFont('Comic Sans MS', 30)
+        font = self.font('Comic Sans MS', 30)
         height = font.get_height() * 3
 
         text = font.render("Left Click - Reveal", True, BLACK)
@@ -59,56 +254,99 @@ class Draw:
         self.screen.blit(text, [25, self.grid_start_location[1] + 100 + height * 5 // 2 + 10])
 
         text = font.render("Q - Quit", True, BLACK)
-        self.screen.blit(text, [25, self.grid_start_location[1] + 100 + height * 7 // 2 + 10])
+        rect = self.screen.blit(text, [25, self.grid_start_location[1] + 100 + height * 7 // 2 + 10])
+        self.instructions_end = rect.bottom
+
+    def overlay_area(self):
+        """
+        Returns the part of the left panel below the instructions, which nothing else is drawn in
+        """
+        top = self.instructions_end + 10
+        return pygame.Rect(5, top, self.grid_start_location[0] - 10, max(0, self.size[1] - top - 5))
 
     def draw_labels(self):
         """
         Draws the labels
         """
         if self.board.game_over:
-            # Draw the text "Game Over"
-            font = pygame.font.SysFont('Calibri', 25, True, False)
-            text = font.render("Game Over", True, BLACK)
-            self.screen.blit(text, [self.grid_start_location[0] + self.grid_size[0] // 2 - text.get_width() // 2, self.grid_start_location[1] - 25])
+            value = "Game Over"
+        elif self.board.won:
+            value = "You Won"
+        else:
+            value = None
 
-        if self.board.won:
-            # Draw the text "You Won"
-            font = pygame.font.SysFont('Calibri', 25, True, False)
-            text = font.render("You Won", True, BLACK)
-            self.screen.blit(text, [self.grid_start_location[0] + self.grid_size[0] // 2 - text.get_width() // 2, self.grid_start_location[1] - 25])
+        if self.label is not None and self.label[0] == value:
+            return []
+
+        rects = []
+        if self.label is not None and self.label[1] is not None:
+            rects.append(self.screen.fill(WHITE, self.label[1]))
+        rect = None
+        if value is not None:
+            text = self.font('Calibri', 25, True).render(value, True, BLACK)
+            rect = self.screen.blit(text, [self.grid_start_location[0] + self.grid_size[0] // 2 - text.get_width() // 2, self.grid_start_location[1] - 25])
+            rects.append(rect)
+        self.label = (value, rect)
+        return rects
 
     def draw_grid(self):
         """
-        Draws the grid
+        Draws the squares inside the view, only those whose tile changed unless the view moved
         """
         grid = self.board.grid
+        x0, x1 = self.visible(self.offset[0], self.cell_x, self.grid_size[0], grid[0])
+        y0, y1 = self.visible(self.offset[1], self.cell_y, self.grid_size[1], grid[1])
+        area = pygame.Rect(self.grid_start_location, self.grid_size)
+        if not self.tiled:
+            return self.draw_downsampled(area, x0, x1, y0, y1)
+
+        if self.tile_size != (self.cell_x, self.cell_y):
+            self.create_tiles()
+
+        codes = self.tile_codes(slice(x0, x1), slice(y0, y1))
+        view = (x0, y0, self.offset[0], self.offset[1], self.cell_x, self.cell_y)
+        self.screen.set_clip(area)
+        if view != self.view or self.shown is None or self.shown.shape != codes.shape:
+            self.view = view
+            self.screen.fill(WHITE, area)
+            changed = np.arange(codes.size)
+        else:
+            changed = np.flatnonzero(codes != self.shown)
+        self.shown = codes
+
+        left = area.x + x0 * self.cell_x - self.offset[0]
+        top = area.y + y0 * self.cell_y - self.offset[1]
+        height = y1 - y0
+        flat = codes.ravel()
+        rects = []
+        for k in changed.tolist():
+            i, j = divmod(k, height)
+            rects.append(self.screen.blit(self.tiles[flat[k]], (left + i * self.cell_x, top + j * self.cell_y)))
+        self.screen.set_clip(None)
+
+        if len(rects) > MAX_DIRTY_SQUARES:
+            return [area]
+        return rects
+
+    def draw_downsampled(self, area, x0, x1, y0, y1):
+        """
+        Draws squares too small for tiles as one image, sampling at most about one square per pixel
+        """
+        step_x = max(1, int(1 / self.cell_x))
+        step_y = max(1, int(1 / self.cell_y))
+        codes = self.tile_codes(slice(x0, x1, step_x), slice(y0, y1, step_y))
+        view = (x0, y0, self.offset[0], self.offset[1], self.cell_x, self.cell_y)
+        if view == self.view and self.shown is not None and np.array_equal(codes, self.shown):
+            return []
+        self.view = view
+        self.shown = codes
+
+        image = pygame.surfarray.make_surface(LOD_COLORS[codes])
+        size = (math.ceil((x1 - x0) * self.cell_x), math.ceil((y1 - y0) * self.cell_y))
+        image = pygame.transform.scale(image, size)
 
-        start_x = self.grid_start_location[0]
-        end_x = self.grid_end_location[0]
-        len_x = (end_x - start_x) // grid[0]
-
-        start_y = self.grid_start_location[1]
-        end_y = self.grid_end_location[1]
-        len_y = (end_y - start_y) // grid[1]
-
-        for i in range(grid[0]):
-            for j in range(grid[1]):
-                if self.board.isdeterministic and self.board.start_pos == (i, j) and not self.board.playing:
-                    pygame.draw.rect(self.screen, GREEN, (start_x + i * len_x, start_y + j * len_y, len_x, len_y))
-                elif self.board.board[i][j].bomb and (self.board.board[i][j].revealed or self.board.game_over):
-                    pygame.draw.rect(self.screen, DARK_RED, (start_x + i * len_x, start_y + j * len_y, len_x, len_y))
-                elif self.board.board[i][j].flagged:
-                    pygame.draw.rect(self.screen, LIGHT_RED, (start_x + i * len_x, start_y + j * len_y, len_x, len_y))
-                elif not self.board.board[i][j].revealed:
-                    pygame.draw.rect(self.screen, DARK_GREY, (start_x + i * len_x, start_y + j * len_y, len_x, len_y))
-                else:
-                    pygame.draw.rect(self.screen, LIGHT_GREY, (start_x + i * len_x, start_y + j * len_y, len_x, len_y))
-                    if self.board.board[i][j].value > 0:
-                        font = pygame.font.SysFont('Calibri', 25, True, False)
-                        text = font.render(str(self.board.board[i][j].value), True, BLACK)
-                        self.screen.blit(text, [start_x + i * len_x + len_x // 2 - text.get_width() // 2, start_y + j * len_y + len_y // 2 - text.get_height() // 2])
-
-        for x in range(start_x, end_x + 1, len_x):
-            pygame.draw.line(self.screen, WHITE, (x, start_y), (x, end_y), 2)
-        for y in range(start_y, end_y + 1, len_y):
-            pygame.draw.line(self.screen, WHITE, (start_x, y), (end_x, y), 2)
\ No newline at end of file
+        self.screen.set_clip(area)
+        self.screen.fill(WHITE, area)
+        self.screen.blit(image, (area.x + round(x0 * self.cell_x) - self.offset[0], area.y + round(y0 * self.cell_y) - self.offset[1]))
+        self.screen.set_clip(None)
+        return [area]
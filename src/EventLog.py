@@ -0,0 +1,79 @@
+import logging
+import queue
+import time
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+
+# Game events, recorded as (time, event, *args) and only formatted when they are logged
+REVEAL = 0
+FLAG = 1
+UNFLAG = 2
+GAME_OVER = 3
+NEW_BOARD = 4
+NOT_DETERMINISTIC = 5
+NO_FLAGS = 6
+BULK = 7
+
+EVENTS = {
+    REVEAL: (logging.DEBUG, "[+] Square at %s revealed %s squares"),
+    FLAG: (logging.DEBUG, "[+] Square at %s flagged"),
+    UNFLAG: (logging.DEBUG, "[+] Square at %s unflagged"),
+    GAME_OVER: (logging.INFO, "[-] Game over at %s"),
+    NEW_BOARD: (logging.INFO, "[+] New board created (grid: %s, bombs: %s deterministic: %s seed: %s)"),
+    NOT_DETERMINISTIC: (logging.INFO, "[-] Board is not deterministic"),
+    NO_FLAGS: (logging.INFO, "[-] No more flags available"),
+    BULK: (logging.DEBUG, "[+] %s"),
+}
+
+class EventLog:
+    """
+    Ring buffer of the most recent game events
+    """
+    def __init__(self, size=4096, logger=None):
+        self.events = deque(maxlen=size)
+        self.logger = logger or logging.getLogger()
+
+    def record(self, event, *args):
+        """
+        Records an event, passing it on to the logger only if its level is enabled
+        """
+        self.events.append((time.monotonic(), event) + args)
+        level, message = EVENTS[event]
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, message, *args)
+
+    def format(self, entry):
+        """
+        Formats a recorded event
+        """
+        timestamp, event = entry[:2]
+        return "{0:.3f} ".format(timestamp) + EVENTS[event][1] % entry[2:]
+
+    def dump(self):
+        """
+        Returns the recorded events as text lines, oldest first
+        """
+        return [self.format(entry) for entry in self.events]
+
+    def clear(self):
+        """
+        Forgets every recorded event
+        """
+        self.events.clear()
+
+def start_file_logging(filename, level=logging.INFO, log_format="%(asctime)s:%(levelname)s:%(message)s"):
+    """
+    Logs to a file from a background thread so the game loop never waits on the disk
+
+    Returns the listener, call its stop() method before exiting to flush the queue
+    """
+    records = queue.SimpleQueue()
+    handler = logging.FileHandler(filename)
+    handler.setFormatter(logging.Formatter(log_format))
+    listener = QueueListener(records, handler)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(QueueHandler(records))
+    listener.start()
+    return listener
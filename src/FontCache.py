@@ -0,0 +1,71 @@
+import json
+import logging
+import os
+import pygame
+import pygame.sysfont
+
+# Where the resolved font files are remembered between runs
+FONT_CACHE = os.environ.get("MINESWEEPER_FONT_CACHE",
+                            os.path.join(os.path.expanduser("~"), ".cache", "minesweeper", "fonts.json"))
+
+class FontCache:
+    """
+    Creates fonts like pygame.font.SysFont, looking every name up only once
+
+    The first SysFont call scans the font directories of the system. The file every (name, bold, italic)
+    resolved to, and whether the style has to be faked, is saved so later runs open the file directly.
+    """
+    def __init__(self, path=FONT_CACHE):
+        self.path = path
+        self.entries = None
+        self.fonts = {}
+
+    def __load(self):
+        self.entries = {}
+        if self.path is None:
+            return
+        try:
+            with open(self.path) as file:
+                self.entries = json.load(file)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as error:
+            logging.warning("[-] Ignoring font cache %s: %s", self.path, error)
+
+    def __save(self):
+        if self.path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".tmp", "w") as file:
+                json.dump(self.entries, file, indent=2)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as error:
+            logging.warning("[-] Could not write font cache %s: %s", self.path, error)
+
+    def resolve(self, name, bold=False, italic=False):
+        """
+        Returns [font file or None for the default font, fake bold, fake italic] the way SysFont would
+        """
+        if self.entries is None:
+            self.__load()
+        key = name + "|" + str(int(bold)) + str(int(italic))
+        entry = self.entries.get(key)
+        if entry is None or (entry[0] is not None and not os.path.exists(entry[0])):
+            # SysFont hands what it found to the constructor, which here just returns it
+            entry = pygame.font.SysFont(name, 1, bold, italic, lambda path, size, set_bold, set_italic:
+                                        [path, set_bold, set_italic])
+            self.entries[key] = entry
+            self.__save()
+            logging.info("[+] Font %s resolved to %s", key, entry[0])
+        return entry
+
+    def font(self, name, size, bold=False, italic=False):
+        """
+        Returns a font, creating it only the first time it is asked for
+        """
+        key = (name, size, bold, italic)
+        if key not in self.fonts:
+            path, set_bold, set_italic = self.resolve(name, bold, italic)
+            self.fonts[key] = pygame.sysfont.font_constructor(path, size, set_bold, set_italic)
+        return self.fonts[key]
@@ -0,0 +1,160 @@
+import logging
+from collections import OrderedDict
+from math import comb
+import numpy as np
+from .Solver import breadth_first, enumerate_component, convolve
+from .neighbors import count_neighbors, neighbor_table
+from .cells import *
+
+class Probability:
+    """
+    Exact bomb probability of every unrevealed square given the player visible state of a board
+
+    Flags are player guesses and are treated as unrevealed squares. Frontier components of more than
+    max_component squares are cut into pieces of at most that many squares and the numbers across a cut
+    are ignored, so the probabilities of the squares near the cuts are estimates rather than exact.
+    """
+    def __init__(self, grid, cache_size=1024, max_component=80):
+        self.grid = grid
+        self.max_component = max_component
+        self.offsets, self.indices = neighbor_table(grid[0], grid[1])
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+
+    def compute(self, cells, bombs):
+        """
+        Returns a (grid[0], grid[1]) float array of bomb probabilities, NaN for revealed squares
+        """
+        state = np.frombuffer(cells, dtype=np.uint8).reshape(self.grid[0], self.grid[1])
+        revealed = (state & REVEALED) != 0
+        unknown = ~revealed
+
+        # Revealed numbers next to at least one unrevealed square
+        numbers = revealed & ((state & BOMB) == 0) & ((state & VALUE) > 0)
+        frontier = np.flatnonzero((numbers & (count_neighbors(unknown) > 0)).ravel())
+
+        constraints = {}
+        for k in frontier.tolist():
+            squares = tuple(n for n in self.indices[self.offsets[k]:self.offsets[k + 1]] if not cells[n] & REVEALED)
+            constraints[k] = (squares, cells[k] & VALUE)
+
+        components = []
+        for variables, parts in self.__components(constraints):
+            if len(variables) > self.max_component:
+                logging.debug("[.] Frontier component too large to enumerate (" + str(len(variables)) + " squares)")
+                components += [self.__solve(*piece) for piece in self.__cut(variables, parts)]
+            else:
+                components.append(self.__solve(variables, parts))
+
+        constrained = sum(len(variables) for variables, _ in components)
+        interior = int(np.count_nonzero(unknown)) - constrained
+
+        probabilities = np.full(len(cells), np.nan)
+        if interior or components:
+            self.__combine(components, interior, bombs, probabilities, unknown.ravel())
+        return probabilities.reshape(self.grid[0], self.grid[1])
+
+    def __components(self, constraints):
+        """
+        Splits the constraints into groups that share unrevealed squares
+        """
+        by_square = {}
+        for k, (squares, _) in constraints.items():
+            for n in squares:
+                by_square.setdefault(n, []).append(k)
+
+        seen = set()
+        for start in constraints:
+            if start in seen:
+                continue
+            seen.add(start)
+            parts = []
+            variables = set()
+            pending = [start]
+            while pending:
+                k = pending.pop()
+                parts.append(constraints[k])
+                for n in constraints[k][0]:
+                    if n in variables:
+                        continue
+                    variables.add(n)
+                    for other in by_square[n]:
+                        if other not in seen:
+                            seen.add(other)
+                            pending.append(other)
+            yield sorted(variables), sorted(parts)
+
+    def __solve(self, variables, parts):
+        """
+        Enumerates a component, reusing the result if the same component was seen before
+        """
+        key = tuple(parts)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        result = (variables, enumerate_component(variables, parts))
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def __cut(self, variables, parts):
+        """
+        Splits a component into pieces of at most max_component squares along its breadth-first order,
+        keeping only the constraints inside a piece. Squares left without constraints count as interior squares.
+        """
+        order = breadth_first(variables, parts)
+        piece = {square: i // self.max_component for i, square in enumerate(order)}
+        pieces = {}
+        for squares, value in parts:
+            owners = {piece[square] for square in squares}
+            if len(owners) == 1:
+                pieces.setdefault(owners.pop(), []).append((squares, value))
+        for kept in pieces.values():
+            yield sorted({square for squares, _ in kept for square in squares}), kept
+
+    def __combine(self, components, interior, bombs, probabilities, unknown):
+        """
+        Weighs every component solution by the ways to place the remaining bombs in the interior
+        """
+        # Number of solutions of each component by the number of bombs it uses
+        distributions = []
+        for _, results in components:
+            distribution = [0] * (max(results, default=0) + 1)
+            for used, (solutions, _) in results.items():
+                distribution[used] = solutions
+            distributions.append(distribution)
+
+        # Distributions of all the components before and after each component
+        prefix = [[1]]
+        for distribution in distributions:
+            prefix.append(convolve(prefix[-1], distribution))
+        suffix = [[1]]
+        for distribution in reversed(distributions):
+            suffix.append(convolve(suffix[-1], distribution))
+        suffix.reverse()
+
+        def interior_ways(used):
+            left = bombs - used
+            return comb(interior, left) if 0 <= left <= interior else 0
+
+        total = prefix[-1]
+        weights = [count * interior_ways(used) for used, count in enumerate(total)]
+        norm = sum(weights)
+        if norm == 0:
+            # The visible state is inconsistent with the number of bombs
+            return
+
+        for c, (variables, results) in enumerate(components):
+            others = convolve(prefix[c], suffix[c + 1])
+            # Weight of the rest of the board when this component uses a given number of bombs
+            rest = {}
+            for used in results:
+                rest[used] = sum(count * interior_ways(used + other) for other, count in enumerate(others))
+            for i, square in enumerate(variables):
+                probabilities[square] = sum(counts[i] * rest[used] for used, (_, counts) in results.items()) / norm
+
+        if interior:
+            expected = sum(weight * (bombs - used) for used, weight in enumerate(weights))
+            probabilities[unknown & np.isnan(probabilities)] = expected / norm / interior
@@ -0,0 +1,376 @@
+import argparse
+import bisect
+import logging
+import struct
+import sys
+import time
+from array import array
+import numpy as np
+from .Board import (Board, SNAPSHOT_ATTRIBUTES, NO_VALUE, MOVE_REVEAL, MOVE_FLAG, MOVE_BULK, REVEAL_ALL,
+                    UNREVEAL_ALL, FLAG_ALL, UNFLAG_ALL, ADJACENT_FLAGS, move_log)
+from .neighbors import label_openings
+from .cells import *
+
+# Replay file layout: header (magic, version, width, height, bombs, deterministic, seed, start_x, start_y,
+# move itemsize) followed by the moves in the encoding of Board.moves, little endian
+REPLAY_MAGIC = b"MSRP"
+# Version 2: boards are drawn by Board.place_mines, version 1 seeds give other boards
+REPLAY_VERSION = 2
+REPLAY_HEADER = struct.Struct("<4sBIIIBQiiB")
+
+# Runs of moves are applied together in batches of at most MAX_BATCH moves, runs shorter than
+# MIN_BATCH and moves on boards smaller than MIN_BATCH_SQUARES are cheaper to apply one move at a time
+MIN_BATCH = 64
+MAX_BATCH = 1 << 16
+MIN_BATCH_SQUARES = 1 << 14
+
+def gather(offsets, values, rows):
+    """
+    Returns values[offsets[row]:offsets[row + 1]] of every row concatenated, and the position in rows of every value
+    """
+    lengths = offsets[rows + 1] - offsets[rows]
+    ends = np.cumsum(lengths)
+    owner = np.repeat(np.arange(len(rows)), lengths)
+    positions = np.arange(ends[-1] if len(rows) else 0) - np.repeat(ends - lengths, lengths) + offsets[rows][owner]
+    return values[positions], owner
+
+def distinct(values):
+    """
+    Returns the sorted distinct values of an array (np.unique hashes them, which is slower for large arrays)
+    """
+    values = np.sort(values)
+    keep = np.ones(values.size, dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    return values[keep]
+
+def first_events(squares, events):
+    """
+    Returns the distinct squares and the first event touching each of them
+    """
+    order = np.lexsort((events, squares))
+    squares = squares[order]
+    first = np.ones(squares.size, dtype=bool)
+    first[1:] = squares[1:] != squares[:-1]
+    return squares[first], events[order][first]
+
+class Replay:
+    """
+    Replays the move log of a board from its seed
+
+    Checkpoints of the cells are taken every interval moves while replaying forward, so seeking
+    back only restores the nearest checkpoint and applies the moves after it.
+
+    Moves are applied in batches: the longest run of moves none of which changes what a later one
+    does is applied at once with array operations. Chords that fire, floods through flags or through
+    squares revealed before, hitting the flag limit and bulk operations end a run and are applied
+    one at a time. The replayed board records no game events for batched moves.
+    """
+    def __init__(self, grid, bombs, seed, moves, deterministic=False, start_pos=None, interval=None):
+        self.grid = list(grid)
+        self.bombs = bombs
+        self.seed = seed
+        self.moves = moves
+        self.deterministic = deterministic
+        self.start_pos = start_pos
+        # By default the checkpoints together hold about as many bytes as there are moves times 64
+        self.interval = interval or max(1024, self.grid[0] * self.grid[1] // 64)
+
+        self.board = Board()
+        self.checkpoints = []
+        self.checkpoint_moves = []
+        self.position = None
+        self.openings = None
+        self.batch = MIN_BATCH
+
+    @classmethod
+    def from_board(cls, board, interval=None):
+        """
+        Creates a replay of the moves made on a board so far
+        """
+        if board.seed is None:
+            raise ValueError("The board has no seed to replay from")
+        return cls(board.grid, board.bombs, board.seed, array(board.moves.typecode, board.moves),
+                   board.isdeterministic, board.start_pos, interval)
+
+    def __len__(self):
+        return len(self.moves)
+
+    def to_bytes(self):
+        """
+        Serializes the replay
+        """
+        start_pos = self.start_pos if self.start_pos is not None else (NO_VALUE, NO_VALUE)
+        header = REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.grid[0], self.grid[1], self.bombs,
+                                    self.deterministic, self.seed, start_pos[0], start_pos[1], self.moves.itemsize)
+        moves = self.moves
+        if sys.byteorder != "little":
+            moves = array(moves.typecode, moves)
+            moves.byteswap()
+        return header + moves.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, interval=None):
+        """
+        Creates a replay from to_bytes() output
+        """
+        (magic, version, width, height, bombs, deterministic, seed,
+         start_x, start_y, itemsize) = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError("Not a replay (magic: " + str(magic) + ", version: " + str(version) + ")")
+
+        moves = move_log([width, height])
+        if moves.itemsize != itemsize:
+            raise ValueError("Unexpected move size " + str(itemsize))
+        moves.frombytes(data[REPLAY_HEADER.size:])
+        if sys.byteorder != "little":
+            moves.byteswap()
+        start_pos = None if start_x == NO_VALUE else (start_x, start_y)
+        return cls([width, height], bombs, seed, moves, bool(deterministic), start_pos, interval)
+
+    def save_file(self, path):
+        """
+        Saves the replay to a file
+        """
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+        logging.info("[+] Replay of %s moves saved to %s", len(self.moves), path)
+
+    @classmethod
+    def load_file(cls, path, interval=None):
+        """
+        Loads a replay from a file
+        """
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read(), interval)
+
+    def __checkpoint(self):
+        state = {name: getattr(self.board, name) for name in SNAPSHOT_ATTRIBUTES if name != "moves"}
+        self.checkpoints.append((bytes(self.board.cells), state))
+        self.checkpoint_moves.append(self.position)
+
+    def __restore(self, index):
+        cells, state = self.checkpoints[index]
+        self.board.cells = bytearray(cells)
+        for name, value in state.items():
+            setattr(self.board, name, value)
+        self.board.recount_adjacent()
+        self.position = self.checkpoint_moves[index]
+
+    def seek(self, position):
+        """
+        Brings the board to the state after the first position moves and returns it
+        """
+        position = max(0, min(position, len(self.moves)))
+        if self.position is None:
+            self.board.new_board(self.grid, self.bombs, self.deterministic, self.seed, self.start_pos)
+            self.position = 0
+            self.__checkpoint()
+
+        if position < self.position or position >= self.position + self.interval:
+            # Nearest checkpoint at or before the target, it may be ahead of the current position
+            index = bisect.bisect_right(self.checkpoint_moves, position) - 1
+            if self.checkpoint_moves[index] > self.position or position < self.position:
+                self.__restore(index)
+
+        self.__apply(position)
+        self.board.check_win()
+        return self.board
+
+    def __openings(self):
+        """
+        Returns (labels, flooded, floods, offsets, indices): revealing the empty square k floods the squares
+        floods[flooded[labels[k]]:flooded[labels[k] + 1]], its opening and the numbers around it, and
+        offsets, indices is the neighbour table as arrays
+
+        Computed once from the bombs, None if the board is too small or has no neighbour table to batch moves with.
+        """
+        if self.openings is None:
+            board = self.board
+            if board.neighbors() is None or len(board.cells) < MIN_BATCH_SQUARES:
+                self.openings = False
+                return None
+            state = board.state
+            squares = state.size
+            empty = (state & (VALUE | BOMB)) == 0
+            labels = label_openings(empty[np.newaxis])[0].ravel()
+            zeros = np.flatnonzero(empty)
+            names, opening = np.unique(labels[zeros], return_inverse=True)
+            labels = np.full(squares, -1, dtype=np.int64)
+            labels[zeros] = opening
+
+            offsets, indices = board.neighbors()
+            offsets = np.frombuffer(offsets, dtype=np.int64)
+            indices = np.frombuffer(indices, dtype=np.int32)
+            # Every opening floods its empty squares and, once for each, the numbers bordering it
+            around, owner = gather(offsets, indices, zeros)
+            border = ~empty.ravel()[around]
+            keys = distinct(opening[owner[border]] * squares + around[border])
+            keys = np.sort(np.concatenate([opening * squares + zeros, keys]))
+            flooded = np.searchsorted(keys // squares, np.arange(names.size + 1))
+            self.openings = (labels, flooded, keys % squares, offsets, indices)
+        return self.openings or None
+
+    def __batch(self, start, stop):
+        """
+        Applies the longest run of the moves [start, stop) that can be applied at once, returns its length
+        """
+        board = self.board
+        labels, flooded, floods, offsets, indices = self.__openings()
+        moves = np.frombuffer(self.moves, dtype=self.moves.typecode)[start:stop].astype(np.int64)
+        bulk = np.flatnonzero((moves & 3) == MOVE_BULK)
+        if bulk.size:
+            moves = moves[:bulk[0]]
+        if not moves.size:
+            return 0
+        events = np.arange(moves.size)
+        squares = moves >> 2
+        cells = np.frombuffer(board.cells, dtype=np.uint8)
+        cell = cells[squares]
+        reveal = (moves & 3) == MOVE_REVEAL
+        revealed = (cell & REVEALED) != 0
+        flagged = (cell & FLAGGED) != 0
+        adjacent = (cell & REVEALED_ADJACENT) != 0
+        value = cell & (VALUE | BOMB)
+
+        # What every move does given the board before the run
+        clicked = reveal & ~flagged
+        chord = clicked & revealed & ~adjacent & (value <= VALUE)
+        fires = chord & ((np.frombuffer(board.adjacent, dtype=np.uint8)[squares] & ADJACENT_FLAGS) == value)
+        flood = clicked & ~revealed & ~adjacent & (value == 0)
+        single = clicked & ~revealed & ~flood
+        toggle = ~reveal & ~revealed
+
+        # A chord reveals the unflagged unrevealed squares around it like clicks on each of them would
+        around, around_by = gather(offsets, indices, squares[chord])
+        around_by = events[chord][around_by]
+        around_cells = cells[around]
+        uncovered = fires[around_by] & ((around_cells & (REVEALED | FLAGGED)) == 0)
+        empty_around = uncovered & ((around_cells & (VALUE | BOMB | REVEALED_ADJACENT)) == 0)
+        single_around = uncovered & ~empty_around
+
+        # Moves whose outcome depends on more than the board before the run end it
+        irregular = np.zeros(moves.size, dtype=bool)
+        toggled = np.flatnonzero(toggle)
+        change = np.where(flagged[toggled], -1, 1)
+        flags = board.flags + np.cumsum(change) - change
+        irregular[toggled[(change > 0) & (flags >= board.bombs)]] = True
+
+        # Floods stopping at flags or at squares revealed before would reveal less than the whole opening
+        opened = np.concatenate([squares[flood], around[empty_around]])
+        opened_by = np.concatenate([events[flood], around_by[empty_around]])
+        region, owner = gather(flooded, floods, labels[opened])
+        region_by = opened_by[owner]
+        region_cells = cells[region]
+        empty = (region_cells & (VALUE | BOMB)) == 0
+        blocked = ((region_cells & FLAGGED) != 0) | (empty & ((region_cells & (REVEALED | REVEALED_ADJACENT)) != 0))
+        irregular[region_by[blocked]] = True
+        end = int(np.argmax(irregular)) if irregular.any() else moves.size
+
+        # Squares flagged or unflagged in the run
+        marked = np.zeros(cells.size, dtype=bool)
+        marked[squares[toggled]] = True
+
+        # Squares revealed by every move. Clicking a square revealed earlier in the run is a chord on it,
+        # which does nothing on an empty square (revealed with its neighbours) or on a number while the flags
+        # around it, all left alone by the run, differ from it. Any other move on such a square ends the run.
+        unrevealed = (region_cells & REVEALED) == 0
+        shown = np.concatenate([squares[single], around[single_around], region[unrevealed]])
+        shown_by = np.concatenate([events[single], around_by[single_around], region_by[unrevealed]])
+        if shown.size:
+            first, first_by = first_events(shown, shown_by)
+            found = np.minimum(np.searchsorted(first, squares), first.size - 1)
+            later = (first[found] == squares) & (first_by[found] < events)
+            if later.any():
+                idle = later & reveal & (value == 0)
+                numbers = np.flatnonzero(later & reveal & (value > 0) & (value <= VALUE))
+                near, near_by = gather(offsets, indices, squares[numbers])
+                moved = np.zeros(numbers.size, dtype=bool)
+                moved[near_by[marked[near]]] = True
+                idle[numbers] = ~moved & ((np.frombuffer(board.adjacent, dtype=np.uint8)[squares[numbers]] &
+                                           ADJACENT_FLAGS) != value[numbers])
+                stuck = later & ~idle
+                if stuck.any():
+                    end = min(end, int(np.argmax(stuck)))
+
+        # A square flagged or unflagged in the run must not be looked at by any other move of it
+        if toggled.size:
+            touched = np.concatenate([squares, shown, around])
+            touched_by = np.concatenate([events, shown_by, around_by])
+            keep = marked[touched]
+            keys = distinct(touched[keep] * moves.size + touched_by[keep])
+            again = np.flatnonzero(keys[1:] // moves.size == keys[:-1] // moves.size)
+            if again.size:
+                end = min(end, int((keys[again + 1] % moves.size).min()))
+
+        if end == 0:
+            return 0
+        adjacent_squares = np.concatenate([region[empty & (region_by < end)], squares[:end][fires[:end]]])
+        board.apply_moves(moves[:end], distinct(shown[shown_by < end]), adjacent_squares,
+                          squares[toggled[toggled < end]])
+        return end
+
+    def __apply(self, position):
+        """
+        Applies the moves up to position, taking a checkpoint at every multiple of the interval passed
+        """
+        board = self.board
+        reveal = board.reveal_square
+        flag = board.flag_square
+        height = self.grid[1]
+        bulk = {REVEAL_ALL: board.reveal_all, UNREVEAL_ALL: board.unreveal_all,
+                FLAG_ALL: board.flag_all, UNFLAG_ALL: board.unflag_all}
+
+        while self.position < position:
+            stop = min(position, (self.position // self.interval + 1) * self.interval)
+            while self.position < stop:
+                applied = 0
+                if stop - self.position >= MIN_BATCH and self.__openings() is not None:
+                    applied = self.__batch(self.position, min(stop, self.position + self.batch))
+                    self.position += applied
+                    # Batches grow while runs fill them and shrink to about twice the runs found
+                    self.batch = min(MAX_BATCH, max(MIN_BATCH, 2 * applied))
+                if applied >= MIN_BATCH:
+                    continue
+                end = min(stop, self.position + MIN_BATCH - applied)
+                for move in self.moves[self.position:end]:
+                    kind = move & 3
+                    if kind == MOVE_REVEAL:
+                        reveal(divmod(move >> 2, height))
+                    elif kind == MOVE_FLAG:
+                        flag(divmod(move >> 2, height))
+                    else:
+                        bulk[move >> 2]()
+                self.position = end
+            if stop % self.interval == 0 and stop > self.checkpoint_moves[-1]:
+                self.__checkpoint()
+        # The replayed board only needs the log it is replaying
+        del board.moves[:]
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays a saved move log and reports the replay speed")
+    parser.add_argument("path", help="replay file written by Replay.save_file")
+    parser.add_argument("--seek", type=int, help="move to stop at, defaults to the last move")
+    parser.add_argument("--show", action="store_true", help="print the board after replaying")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    replay = Replay.load_file(args.path)
+    position = len(replay) if args.seek is None else args.seek
+
+    start = time.perf_counter()
+    board = replay.seek(position)
+    seconds = time.perf_counter() - start
+
+    print("grid: " + str(replay.grid))
+    print("bombs: " + str(replay.bombs))
+    print("seed: " + str(replay.seed))
+    print("moves: " + str(replay.position) + "/" + str(len(replay)))
+    print("seconds: " + str(seconds))
+    print("moves_per_second: " + str(replay.position / seconds if seconds else 0.0))
+    print("game_over: " + str(board.game_over))
+    print("won: " + str(board.won))
+    if args.show:
+        print(board)
+
+if __name__ == "__main__":
+    main()
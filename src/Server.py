@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import logging
+import struct
+import zlib
+import numpy as np
+from .Board import Board
+from .gamemode import gamemode
+from .cells import *
+
+# Every message is a MESSAGE header (type, payload length) followed by the payload, all little endian
+MESSAGE = struct.Struct("<BI")
+
+# Client to server
+HELLO = 0  # payload: player name, utf-8, reconnecting with the same name keeps the player id
+MOVE = 1  # payload: MOVE_BODY
+RESET = 2  # no payload, starts a new game
+
+# Server to client
+SNAPSHOT = 3  # payload: SNAPSHOT_HEADER then the zlib compressed visible cells of the whole board
+DELTA = 4  # payload: DELTA_HEADER then count uint32 square indices and count visible cells
+
+MOVE_BODY = struct.Struct("<IBII")  # move id, kind, x, y
+SNAPSHOT_HEADER = struct.Struct("<IIIIBB")  # player id, width, height, bombs, game over, won
+DELTA_HEADER = struct.Struct("<IIBBI")  # player id, move id, game over, won, count
+
+# Kinds of moves
+REVEAL_MOVE = 0
+FLAG_MOVE = 1
+
+# Longest payload a client may send, a player name or a move is far shorter
+MAX_PAYLOAD = 1024
+# Players whose unsent data grows past this many bytes are too slow to keep up and are dropped,
+# reconnecting gets them a snapshot
+MAX_BUFFERED = 4 << 20
+
+# Bits clients get to see of a square, the number and bomb bits only once it is revealed
+VISIBLE = REVEALED | FLAGGED
+
+def visible_cells(cells, indices=None):
+    """
+    Returns what a player may know about every square, or only the given ones, as bytes
+    """
+    state = np.frombuffer(cells, dtype=np.uint8)
+    if indices is not None:
+        state = state[indices]
+    shown = np.where(state & REVEALED, state & (VISIBLE | VALUE | BOMB), state & FLAGGED)
+    return shown.astype(np.uint8).tobytes()
+
+def message(kind, payload=b""):
+    return MESSAGE.pack(kind, len(payload)) + payload
+
+async def read_message(reader, max_payload=None):
+    """
+    Reads one message, returns (type, payload)
+    """
+    kind, length = MESSAGE.unpack(await reader.readexactly(MESSAGE.size))
+    if max_payload is not None and length > max_payload:
+        raise ValueError("payload of " + str(length) + " bytes")
+    return kind, await reader.readexactly(length)
+
+class GameServer:
+    """
+    Runs one board for every connected player
+
+    Moves are applied one at a time on the event loop. Every player gets the squares a move changed,
+    players joining or reconnecting get a compressed snapshot of the whole board.
+    """
+    def __init__(self, grid, bombs, restart=True):
+        self.grid = grid
+        self.bombs = bombs
+        self.restart = restart
+        self.board = Board()
+        self.board.new_board(grid, bombs)
+        self.players = {}
+        self.writers = {}
+        self.handlers = set()
+        self.moves = 0
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        """
+        Starts listening, returns the port in use
+        """
+        self.server = await asyncio.start_server(self.handle, host, port)
+        port = self.server.sockets[0].getsockname()[1]
+        logging.info("[+] Server listening on %s:%s", host, port)
+        return port
+
+    async def stop(self):
+        """
+        Closes every connection and stops listening
+        """
+        self.server.close()
+        for writer in list(self.writers.values()):
+            writer.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    def snapshot(self, player, compressed=None):
+        """
+        Returns the snapshot message of a player, the compressed cells can be shared between players
+        """
+        board = self.board
+        if compressed is None:
+            compressed = zlib.compress(visible_cells(board.cells), 1)
+        header = SNAPSHOT_HEADER.pack(player, board.grid[0], board.grid[1], board.bombs, board.game_over, board.won)
+        return message(SNAPSHOT, header + compressed)
+
+    def parse_move(self, payload):
+        """
+        Returns the (move id, kind, x, y) of a MOVE payload, raises ValueError if it is not a valid move
+        """
+        if len(payload) != MOVE_BODY.size:
+            raise ValueError("move of " + str(len(payload)) + " bytes")
+        move, kind, x, y = MOVE_BODY.unpack(payload)
+        if kind not in (REVEAL_MOVE, FLAG_MOVE):
+            raise ValueError("unknown move kind " + str(kind))
+        if not (x < self.board.grid[0] and y < self.board.grid[1]):
+            raise ValueError("square " + str((x, y)) + " outside the board")
+        return move, kind, x, y
+
+    def apply(self, kind, x, y):
+        """
+        Applies a move, returns the indices of the squares it changed
+        """
+        board = self.board
+        if board.game_over or board.won or not (0 <= x < board.grid[0] and 0 <= y < board.grid[1]):
+            return []
+        height = board.grid[1]
+        if kind == REVEAL_MOVE:
+            changed = [i * height + j for i, j in board.reveal_square((x, y))]
+        else:
+            board.flag_square((x, y))
+            changed = [x * height + y]
+        board.check_win()
+        return changed
+
+    def delta(self, player, move, changed):
+        board = self.board
+        indices = np.array(changed, dtype=np.uint32)
+        header = DELTA_HEADER.pack(player, move, board.game_over, board.won, len(changed))
+        return message(DELTA, header + indices.astype("<u4").tobytes() + visible_cells(board.cells, indices))
+
+    def send(self, player, writer, data):
+        """
+        Queues data for a player without waiting, drops the player if too much is queued already
+        """
+        if writer.is_closing():
+            return
+        if writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+            logging.warning("[-] Dropping player %s, it is not reading its updates", player)
+            writer.close()
+            return
+        writer.write(data)
+
+    def broadcast(self, data):
+        for player, writer in list(self.writers.items()):
+            if writer.is_closing():
+                del self.writers[player]
+            else:
+                self.send(player, writer, data)
+
+    def new_game(self):
+        self.board.new_board(self.grid, self.bombs)
+        compressed = zlib.compress(visible_cells(self.board.cells), 1)
+        for player, writer in list(self.writers.items()):
+            self.send(player, writer, self.snapshot(player, compressed))
+
+    async def handle(self, reader, writer):
+        """
+        Serves one connection, which has to start with a HELLO
+        """
+        player = None
+        handler = asyncio.current_task()
+        self.handlers.add(handler)
+        try:
+            kind, payload = await read_message(reader, MAX_PAYLOAD)
+            if kind != HELLO:
+                return
+            name = payload.decode()
+            player = self.players.setdefault(name, len(self.players))
+            self.writers[player] = writer
+            writer.write(self.snapshot(player))
+            logging.info("[+] Player %s joined as %s", name, player)
+
+            while True:
+                kind, payload = await read_message(reader, MAX_PAYLOAD)
+                if kind == MOVE:
+                    move, action, x, y = self.parse_move(payload)
+                    changed = self.apply(action, x, y)
+                    self.moves += 1
+                    data = self.delta(player, move, changed)
+                    if changed:
+                        self.broadcast(data)
+                    else:
+                        writer.write(data)
+                    if self.restart and (self.board.game_over or self.board.won):
+                        self.new_game()
+                elif kind == RESET:
+                    self.new_game()
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except (ValueError, struct.error) as error:
+            # Malformed messages, including names that are not utf-8, end only their own connection
+            logging.warning("[-] Dropping connection of player %s: %s", player, error)
+        finally:
+            if player is not None and self.writers.get(player) is writer:
+                del self.writers[player]
+                logging.info("[-] Player %s left", player)
+            writer.close()
+            self.handlers.discard(handler)
+
+async def serve(grid, bombs, host, port, restart):
+    server = GameServer(grid, bombs, restart)
+    await server.start(host, port)
+    async with server.server:
+        await server.server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves one board to many players")
+    parser.add_argument("--mode", default="Expert", choices=list(gamemode))
+    parser.add_argument("--grid", type=int, nargs=2, help="custom grid size, overrides --mode")
+    parser.add_argument("--bombs", type=int, help="custom number of bombs, overrides --mode")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-restart", action="store_true", help="keep a finished game until a player resets it")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    grid = args.grid or gamemode[args.mode]["grid"]
+    bombs = args.bombs if args.bombs is not None else gamemode[args.mode]["bombs"]
+    try:
+        asyncio.run(serve(grid, bombs, args.host, args.port, not args.no_restart))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
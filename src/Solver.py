@@ -0,0 +1,446 @@
+import logging
+from collections import deque
+import numpy as np
+from .cells import *
+from .neighbors import count_neighbors, neighbor_table
+
+# States of a square as seen by the solver
+UNKNOWN = 0
+OPEN = 1                    # Revealed, its number is known
+MINE = 2                    # Known to be a bomb
+SAFE = 3                    # Known to be safe but not revealed yet
+
+def convolve(a, b):
+    """
+    Multiplies two polynomials given as lists of (arbitrary precision) coefficients
+    """
+    result = [0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                result[i + j] += x * y
+    return result
+
+def add_poly(polys, key, poly):
+    """
+    Adds a polynomial to the one stored under key
+    """
+    current = polys.get(key)
+    if current is None:
+        polys[key] = poly
+        return
+    if len(current) < len(poly):
+        current.extend([0] * (len(poly) - len(current)))
+    for i, x in enumerate(poly):
+        current[i] += x
+
+def breadth_first(variables, constraints):
+    """
+    Orders the variables so that squares sharing a constraint stay close together
+    """
+    linked = {v: set() for v in variables}
+    for squares, _ in constraints:
+        for square in squares:
+            linked[square].update(squares)
+
+    order = []
+    seen = set()
+    for start in sorted(variables, key=lambda v: len(linked[v])):
+        if start in seen:
+            continue
+        seen.add(start)
+        pending = deque([start])
+        while pending:
+            square = pending.popleft()
+            order.append(square)
+            for n in sorted(linked[square]):
+                if n not in seen:
+                    seen.add(n)
+                    pending.append(n)
+    return order
+
+def enumerate_component(variables, constraints):
+    """
+    Counts the bomb assignments of a frontier component that satisfy its constraints
+
+    variables is a list of squares, constraints a list of (squares, bombs) pairs.
+    Variables are assigned in breadth-first order and partial assignments are merged on
+    the bombs still needed by the constraints that are partly assigned, so the cost grows
+    with the width of the frontier rather than with its length.
+    Returns {bombs used: (number of solutions, bomb count per variable)}
+    """
+    order = breadth_first(variables, constraints)
+    n = len(order)
+    position = {v: i for i, v in enumerate(order)}
+    members = [sorted(position[square] for square in squares) for squares, _ in constraints]
+
+    starts = [[] for _ in range(n)]
+    contains = [[] for _ in range(n)]
+    free = [{} for _ in range(n)]
+    for c, positions in enumerate(members):
+        starts[positions[0]].append(c)
+        for rank, i in enumerate(positions):
+            contains[i].append(c)
+            free[i][c] = len(positions) - rank - 1
+    # Constraints that are partly assigned once position i is assigned
+    active = [[] for _ in range(n)]
+    for c, positions in enumerate(members):
+        for i in range(positions[0], positions[-1]):
+            active[i].append(c)
+
+    def transition(i, state, value):
+        need = dict(zip(active[i - 1], state)) if i else {}
+        for c in starts[i]:
+            need[c] = constraints[c][1]
+        for c in contains[i]:
+            left = need[c] - value
+            if left < 0 or left > free[i][c]:
+                return None
+            need[c] = left
+        return tuple(need[c] for c in active[i])
+
+    # forward[i]: {state before position i: bombs used so far -> number of partial assignments}
+    # steps[i]: {state before position i: (state after a 0, state after a 1)}, reused by the passes below
+    forward = [{(): [1]}]
+    steps = []
+    for i in range(n):
+        polys = {}
+        step = {}
+        for state, poly in forward[i].items():
+            step[state] = (transition(i, state, 0), transition(i, state, 1))
+            for value, after in enumerate(step[state]):
+                if after is not None:
+                    add_poly(polys, after, [0] * value + poly)
+        forward.append(polys)
+        steps.append(step)
+
+    # backward[i]: {state before position i: bombs used from i on -> number of completions}
+    backward = [None] * n + [{(): [1]}]
+    for i in range(n - 1, -1, -1):
+        polys = {}
+        for state in forward[i]:
+            for value, after in enumerate(steps[i][state]):
+                if after is not None and after in backward[i + 1]:
+                    add_poly(polys, state, [0] * value + backward[i + 1][after])
+        backward[i] = polys
+
+    total = forward[n].get((), [])
+    results = {used: (solutions, [0] * n) for used, solutions in enumerate(total) if solutions}
+
+    index = {v: i for i, v in enumerate(variables)}
+    for i, square in enumerate(order):
+        # Assignments with a bomb on the square, merged on the state they lead to before convolving
+        ahead = {}
+        for state, poly in forward[i].items():
+            after = steps[i][state][1]
+            if after is not None and after in backward[i + 1]:
+                add_poly(ahead, after, list(poly))
+        bombs = {}
+        for after, poly in ahead.items():
+            add_poly(bombs, 0, [0] + convolve(poly, backward[i + 1][after]))
+        for used, count in enumerate(bombs.get(0, [])):
+            if count:
+                results[used][1][index[square]] = count
+    return results
+
+class Solver:
+    """
+    Constraint propagation solver for the player visible state of a board
+    """
+    def __init__(self, grid, max_component=40):
+        self.grid = grid
+        self.max_component = max_component
+        self.offsets, self.indices = neighbor_table(grid[0], grid[1])
+        # Number of squares around every square
+        self.degree = bytes(np.diff(np.frombuffer(self.offsets, dtype=np.int64)).astype(np.uint8))
+
+    def solve(self, cells, start_pos):
+        """
+        Checks if the board can be cleared from start_pos without guessing
+        """
+        self.__reset(cells, True)
+        self.__open(start_pos[0] * self.grid[1] + start_pos[1])
+        self.__run()
+        return self.remaining == 0
+
+    def guesses(self, cells, start_pos):
+        """
+        Counts the guesses needed to clear the board from start_pos when every guess is lucky
+
+        Whenever nothing more can be deduced a safe square is opened, one bordering the open squares if there is one.
+        """
+        self.__reset(cells, True)
+        self.__open(start_pos[0] * self.grid[1] + start_pos[1])
+        self.__run()
+        guesses = 0
+        while self.remaining:
+            self.__open(self.__guess())
+            guesses += 1
+            self.__run()
+        return guesses
+
+    def deduce(self, cells, bombs=None):
+        """
+        Returns the squares that are certainly safe and certainly bombs given the revealed squares
+        """
+        self.__reset(cells, False, bombs)
+        self.__run()
+
+        height = self.grid[1]
+        safe = {(k // height, k % height) for k, state in enumerate(self.known) if state == SAFE}
+        mines = {(k // height, k % height) for k, state in enumerate(self.known) if state == MINE}
+        return safe, mines
+
+    def __reset(self, cells, truth, bombs=None):
+        """
+        Sets up the solver state for a board
+        """
+        self.cells = cells
+        self.truth = truth
+        self.known = bytearray(len(cells))
+        self.values = bytearray(len(cells))
+        # Unknown squares and known bombs around every square, so a constraint is checked without a scan
+        self.unknown_around = bytearray(self.degree)
+        self.mines_around = bytearray(len(cells))
+        self.queue = deque()
+        self.queued = set()
+        self.mines = 0
+        self.unknown = len(cells)
+
+        if truth:
+            self.bombs = sum(1 for cell in cells if cell & BOMB)
+            self.remaining = len(cells) - self.bombs
+        else:
+            self.bombs = bombs
+            self.remaining = None
+            for k, cell in enumerate(cells):
+                if cell & REVEALED and not cell & BOMB:
+                    self.known[k] = OPEN
+                    self.values[k] = cell & VALUE
+                    self.unknown -= 1
+                    self.__check(k)
+            state = np.frombuffer(cells, dtype=np.uint8).reshape(self.grid[0], self.grid[1])
+            opened = count_neighbors((state & (REVEALED | BOMB)) == REVEALED).ravel()
+            self.unknown_around = bytearray((np.frombuffer(self.degree, dtype=np.uint8) - opened).tobytes())
+
+    def __check(self, k):
+        """
+        Queues an open square to have its constraint re-evaluated
+        """
+        if k not in self.queued:
+            self.queued.add(k)
+            self.queue.append(k)
+
+    def __open(self, k):
+        """
+        Marks a square as safe, revealing it (and its opening) when the solution is known
+        """
+        if not self.truth:
+            self.known[k] = SAFE
+            self.unknown -= 1
+            for n in self.indices[self.offsets[k]:self.offsets[k + 1]]:
+                self.unknown_around[n] -= 1
+            return
+
+        pending = deque([k])
+        while pending:
+            k = pending.popleft()
+            if self.known[k] != UNKNOWN:
+                continue
+            self.known[k] = OPEN
+            self.values[k] = self.cells[k] & VALUE
+            self.unknown -= 1
+            self.remaining -= 1
+            self.__check(k)
+            for n in self.indices[self.offsets[k]:self.offsets[k + 1]]:
+                self.unknown_around[n] -= 1
+                if self.known[n] == OPEN:
+                    self.__check(n)
+                elif self.values[k] == 0 and self.known[n] == UNKNOWN:
+                    pending.append(n)
+
+    def __mark(self, k):
+        """
+        Marks a square as a bomb
+        """
+        self.known[k] = MINE
+        self.mines += 1
+        self.unknown -= 1
+        for n in self.indices[self.offsets[k]:self.offsets[k + 1]]:
+            self.unknown_around[n] -= 1
+            self.mines_around[n] += 1
+            if self.known[n] == OPEN:
+                self.__check(n)
+
+    def __guess(self):
+        """
+        Returns a safe unknown square, preferring one next to an open square
+        """
+        fallback = None
+        for k, state in enumerate(self.known):
+            if state != UNKNOWN or self.cells[k] & BOMB:
+                continue
+            if any(self.known[n] == OPEN for n in self.indices[self.offsets[k]:self.offsets[k + 1]]):
+                return k
+            if fallback is None:
+                fallback = k
+        return fallback
+
+    def __constraint(self, k):
+        """
+        Returns the unknown squares around an open square and the number of bombs among them
+        """
+        unknown = []
+        bombs = self.values[k]
+        for n in self.indices[self.offsets[k]:self.offsets[k + 1]]:
+            state = self.known[n]
+            if state == UNKNOWN:
+                unknown.append(n)
+            elif state == MINE:
+                bombs -= 1
+        return unknown, bombs
+
+    def __apply(self, safe, mines):
+        """
+        Applies deduced squares, returns True if anything changed
+        """
+        progress = False
+        for k in mines:
+            if self.known[k] == UNKNOWN:
+                self.__mark(k)
+                progress = True
+        for k in safe:
+            if self.known[k] == UNKNOWN:
+                self.__open(k)
+                progress = True
+        return progress
+
+    def __run(self):
+        """
+        Applies the rules from cheapest to most expensive until nothing more can be deduced
+        """
+        while self.remaining != 0:
+            self.__propagate()
+            if self.remaining == 0 or self.unknown == 0:
+                break
+            frontier = self.__frontier()
+            if self.__pairs(frontier) or self.__global() or self.__enumerate(frontier):
+                continue
+            break
+
+    def __propagate(self):
+        """
+        Single square rule: all unknowns are bombs or all unknowns are safe
+        """
+        while self.queue:
+            k = self.queue.popleft()
+            self.queued.discard(k)
+            unknown = self.unknown_around[k]
+            bombs = self.values[k] - self.mines_around[k]
+            if not unknown or 0 < bombs < unknown:
+                continue
+            squares = [n for n in self.indices[self.offsets[k]:self.offsets[k + 1]] if self.known[n] == UNKNOWN]
+            if bombs == 0:
+                self.__apply(squares, ())
+            elif bombs == unknown:
+                self.__apply((), squares)
+
+    def __frontier(self):
+        """
+        Returns {open square: (unknown squares, bombs among them)} for every open square bordering unknowns
+        """
+        frontier = {}
+        for k, state in enumerate(self.known):
+            if state == OPEN:
+                unknown, bombs = self.__constraint(k)
+                if unknown:
+                    frontier[k] = (frozenset(unknown), bombs)
+        return frontier
+
+    def __pairs(self, frontier):
+        """
+        Pair rule: compares the constraints of open squares sharing unknown squares
+        """
+        by_square = {}
+        for k, (unknown, _) in frontier.items():
+            for n in unknown:
+                by_square.setdefault(n, []).append(k)
+
+        safe = set()
+        mines = set()
+        for a, (unknown_a, bombs_a) in frontier.items():
+            others = {b for n in unknown_a for b in by_square[n] if b > a}
+            for b in others:
+                unknown_b, bombs_b = frontier[b]
+                only_a = unknown_a - unknown_b
+                only_b = unknown_b - unknown_a
+                if bombs_a - bombs_b == len(only_a):
+                    mines |= only_a
+                    safe |= only_b
+                elif bombs_b - bombs_a == len(only_b):
+                    mines |= only_b
+                    safe |= only_a
+        return self.__apply(safe, mines)
+
+    def __global(self):
+        """
+        Bomb count rule: all bombs found or every unknown square is a bomb
+        """
+        if self.bombs is None:
+            return False
+        unknown = [k for k, state in enumerate(self.known) if state == UNKNOWN]
+        if self.mines == self.bombs:
+            return self.__apply(unknown, ())
+        if self.bombs - self.mines == len(unknown):
+            return self.__apply((), unknown)
+        return False
+
+    def __enumerate(self, frontier):
+        """
+        Exact enumeration of every small independent frontier component
+        """
+        safe = set()
+        mines = set()
+        for variables, constraints in self.__components(frontier):
+            if len(variables) > self.max_component:
+                logging.debug("[.] Frontier component too large to enumerate (" + str(len(variables)) + " squares)")
+                continue
+            results = enumerate_component(variables, constraints)
+            solutions = sum(count for count, _ in results.values())
+            for i, square in enumerate(variables):
+                bombs = sum(counts[i] for _, counts in results.values())
+                if bombs == 0:
+                    safe.add(square)
+                elif bombs == solutions:
+                    mines.add(square)
+        return self.__apply(safe, mines)
+
+    def __components(self, frontier):
+        """
+        Splits the frontier into groups of unknown squares linked by shared constraints
+        """
+        by_square = {}
+        for k, (unknown, _) in frontier.items():
+            for n in unknown:
+                by_square.setdefault(n, []).append(k)
+
+        seen = set()
+        for start in by_square:
+            if start in seen:
+                continue
+            seen.add(start)
+            variables = []
+            used = set()
+            pending = deque([start])
+            while pending:
+                square = pending.popleft()
+                variables.append(square)
+                for k in by_square[square]:
+                    if k in used:
+                        continue
+                    used.add(k)
+                    for n in frontier[k][0]:
+                        if n not in seen:
+                            seen.add(n)
+                            pending.append(n)
+            yield variables, [(frontier[k][0], frontier[k][1]) for k in used]
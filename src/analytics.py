@@ -0,0 +1,177 @@
+import argparse
+import logging
+import time
+from multiprocessing import Pool
+import numpy as np
+from .Board import place_mines
+from .Solver import Solver
+from .gamemode import gamemode
+from .neighbors import count_neighbors, dilate, label_openings
+from .cells import *
+
+# Difficulty metrics of boards, computed on stacks of boards with array operations
+#
+# 3BV is the minimum number of clicks clearing a board: one per opening plus one per number
+# no opening reveals. Isolated numbers are those numbers, islands the 8-connected groups of them.
+
+METRICS = ["3bv", "openings", "isolated", "islands"]
+
+def seeded_cells(grid, bombs, seeds):
+    """
+    Returns the (len(seeds), width, height) cells Board.create_board makes from every seed
+    """
+    mines = np.stack([place_mines(grid[0] * grid[1], bombs, seed) for seed in seeds])
+    mines = mines.reshape(len(seeds), grid[0], grid[1])
+
+    cells = count_neighbors(mines)
+    cells[mines] = BOMB
+    return cells
+
+def count_groups(labels):
+    """
+    Returns the number of groups of every board labelled by label_openings
+    """
+    boards = labels.shape[0]
+    squares = labels[0].size
+    return (labels.reshape(boards, squares) == np.arange(1, squares + 1)).sum(axis=1)
+
+def metrics(cells):
+    """
+    Returns {metric: array with one value per board} for a (boards, width, height) stack of cells
+    """
+    cells = np.asarray(cells, dtype=np.uint8)
+    mines = (cells & BOMB) != 0
+    values = cells & VALUE
+    empty = (values == 0) & ~mines
+    isolated = (values != 0) & ~mines & ~dilate(empty)
+
+    openings = count_groups(label_openings(empty))
+    numbers = isolated.sum(axis=(1, 2))
+    return {
+        "3bv": openings + numbers,
+        "openings": openings,
+        "isolated": numbers,
+        "islands": count_groups(label_openings(isolated)),
+    }
+
+def start_square(cells, height):
+    """
+    Returns the first opening of a board, the first safe square if it has none
+    """
+    flat = cells.ravel()
+    candidates = np.flatnonzero(flat == 0)
+    if candidates.size == 0:
+        candidates = np.flatnonzero((flat & BOMB) == 0)
+    k = int(candidates[0])
+    return (k // height, k % height)
+
+def guess_counts(cells, solver=None):
+    """
+    Returns the number of guesses the solver needs to clear every board of a stack, starting from start_square
+    """
+    boards, width, height = cells.shape
+    solver = solver or Solver([width, height])
+    return np.array([solver.guesses(bytearray(board.tobytes()), start_square(board, height)) for board in cells],
+                    dtype=np.int64)
+
+def board_metrics(board):
+    """
+    Returns the metrics of a single Board, the guesses starting from its start_pos if it has one
+    """
+    cells = board.state.reshape(1, board.grid[0], board.grid[1])
+    result = {name: int(value[0]) for name, value in metrics(cells).items()}
+    start_pos = board.start_pos or start_square(cells[0], board.grid[1])
+    result["guesses"] = Solver(board.grid).guesses(bytearray(board.cells), start_pos)
+    return result
+
+def analyze_seeds(args):
+    """
+    Pool entry point, returns the metrics of the boards of seeds [first, first + count)
+    """
+    grid, bombs, first, count, guesses = args
+    seeds = np.arange(first, first + count, dtype=np.uint64)
+    cells = seeded_cells(grid, bombs, [int(seed) for seed in seeds])
+    result = metrics(cells)
+    result["seed"] = seeds
+    if guesses:
+        result["guesses"] = guess_counts(cells)
+    return result
+
+def analyze_corpus(grid, bombs, boards, seed=0, chunk=4096, processes=None, guesses=False):
+    """
+    Yields the metrics of the boards of seeds [seed, seed + boards) one chunk at a time, in seed order
+    """
+    tasks = [(grid, bombs, first, min(chunk, seed + boards - first), guesses)
+             for first in range(seed, seed + boards, chunk)]
+    if processes == 1:
+        for task in tasks:
+            yield analyze_seeds(task)
+        return
+    with Pool(processes) as pool:
+        yield from pool.imap(analyze_seeds, tasks)
+
+def summarize(values):
+    """
+    Returns the mean, p50, p99 and maximum of one metric
+    """
+    if values.size == 0:
+        return {"mean": 0.0, "p50": 0, "p99": 0, "max": 0}
+    ordered = np.sort(values)
+    return {
+        "mean": float(values.mean()),
+        "p50": int(ordered[min(ordered.size - 1, ordered.size * 50 // 100)]),
+        "p99": int(ordered[min(ordered.size - 1, ordered.size * 99 // 100)]),
+        "max": int(ordered[-1]),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Computes 3BV, openings, isolated numbers and islands of seeded boards")
+    parser.add_argument("--mode", default="Expert", choices=list(gamemode))
+    parser.add_argument("--grid", type=int, nargs=2, help="custom grid size, overrides --mode")
+    parser.add_argument("--bombs", type=int, help="custom number of bombs, overrides --mode")
+    parser.add_argument("--boards", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first board")
+    parser.add_argument("--chunk", type=int, default=4096, help="boards per task")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--guesses", action="store_true", help="also count the solver guesses, much slower")
+    parser.add_argument("--min-3bv", type=int, help="only keep boards with at least this 3BV")
+    parser.add_argument("--max-3bv", type=int, help="only keep boards with at most this 3BV")
+    parser.add_argument("--max-guesses", type=int, help="only keep boards needing at most this many guesses")
+    parser.add_argument("--output", help="write the metrics of the kept boards to this .npz file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    grid = args.grid or gamemode[args.mode]["grid"]
+    bombs = args.bombs if args.bombs is not None else gamemode[args.mode]["bombs"]
+    guesses = args.guesses or args.max_guesses is not None
+
+    start = time.perf_counter()
+    kept = []
+    for result in analyze_corpus(grid, bombs, args.boards, args.seed, args.chunk, args.processes, guesses):
+        keep = np.ones(result["seed"].size, dtype=bool)
+        if args.min_3bv is not None:
+            keep &= result["3bv"] >= args.min_3bv
+        if args.max_3bv is not None:
+            keep &= result["3bv"] <= args.max_3bv
+        if args.max_guesses is not None:
+            keep &= result["guesses"] <= args.max_guesses
+        kept.append({name: values[keep] for name, values in result.items()})
+    seconds = time.perf_counter() - start
+
+    columns = {name: np.concatenate([result[name] for result in kept]) for name in kept[0]} if kept else {}
+    print("grid: " + str(grid))
+    print("bombs: " + str(bombs))
+    print("boards: " + str(args.boards))
+    print("kept: " + str(columns["seed"].size if columns else 0))
+    print("seconds: " + str(seconds))
+    print("boards_per_second: " + str(args.boards / seconds if seconds else 0.0))
+    for name in METRICS + ["guesses"]:
+        if name in columns:
+            print(name + ": " + str(summarize(columns[name])))
+
+    if args.output and columns:
+        np.savez(args.output, **columns)
+        logging.info("[+] Metrics written to %s", args.output)
+
+if __name__ == "__main__":
+    main()
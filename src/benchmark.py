@@ -0,0 +1,218 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import time
+import numpy as np
+from .AutoPlayer import AutoPlayer
+from .Board import Board
+from .Probability import Probability
+from .gamemode import gamemode
+
+# Benchmarks for board generation, solving, revealing, bomb probabilities and rendering
+#
+# Every case is run with fixed seeds and the timings are written as JSON so runs can be compared
+
+DENSITIES = [0.1, 0.15, 0.2]
+LARGE_GRIDS = [[100, 100], [1000, 1000]]
+
+def cases(large=True):
+    """
+    Returns the (name, grid, bombs) cases to benchmark
+    """
+    result = [(mode, gamemode[mode]["grid"], gamemode[mode]["bombs"]) for mode in gamemode]
+    if large:
+        for grid in LARGE_GRIDS:
+            for density in DENSITIES:
+                name = str(grid[0]) + "x" + str(grid[1]) + "@" + str(density)
+                result.append((name, grid, int(grid[0] * grid[1] * density)))
+    return result
+
+def measure(function, repeat, setup=None):
+    """
+    Times a function, calling setup (untimed) before every run
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min": min(times),
+        "mean": sum(times) / repeat,
+        "max": max(times),
+    }
+
+def opening(board):
+    """
+    Returns the first square with no bomb around it, or None
+    """
+    openings = np.flatnonzero(board.state.ravel() == 0)
+    if openings.size == 0:
+        return None
+    k = int(openings[0])
+    return (k // board.grid[1], k % board.grid[1])
+
+def bench_create_board(grid, bombs, repeat, seed):
+    board = Board()
+    random.seed(seed)
+    return measure(lambda: board.create_board(grid, bombs), repeat)
+
+def bench_deterministic(grid, bombs, repeat, seed):
+    board = Board()
+    random.seed(seed)
+    return measure(lambda: board.new_board(grid, bombs, True), repeat)
+
+def bench_reveal_square(grid, bombs, repeat, seed):
+    board = Board()
+    random.seed(seed)
+    board.new_board(grid, bombs)
+    start_pos = opening(board)
+    if start_pos is None:
+        return None
+    cells = bytes(board.cells)
+
+    def reset():
+        board.cells = bytearray(cells)
+        board.recount()
+        board.playing = False
+
+    result = measure(lambda: board.reveal_square(start_pos), repeat, reset)
+    result["revealed"] = board.revealed_safe
+    return result
+
+def bench_probability(grid, bombs, repeat, seed, games=5):
+    """
+    Times the bomb probabilities of every position of games played by the auto player, one position at a time
+    """
+    positions = []
+    for game_seed in range(seed, seed + games):
+        board = Board()
+        board.new_board(grid, bombs, seed=game_seed)
+        player = AutoPlayer(board, random.Random(game_seed))
+        while not (board.game_over or board.won) and player.step():
+            positions.append(bytes(board.cells))
+    if not positions:
+        return None
+
+    # A new Probability every run, so no position is answered from the cache of the previous run
+    times = []
+    for _ in range(repeat):
+        probability = Probability(grid)
+        for cells in positions:
+            start = time.perf_counter()
+            probability.compute(cells, bombs)
+            times.append(time.perf_counter() - start)
+    times.sort()
+    return {
+        "repeat": repeat,
+        "positions": len(positions),
+        "min": times[0],
+        "median": times[len(times) // 2],
+        "mean": sum(times) / len(times),
+        "max": times[-1],
+    }
+
+def bench_draw(mode, grid, bombs, repeat, seed):
+    """
+    Times a full frame, an idle frame and the frame after a click, with the dummy video driver
+    """
+    import pygame
+    from .Draw import Draw
+
+    board = Board()
+    random.seed(seed)
+    board.new_board(grid, bombs)
+    start_pos = opening(board)
+    settings = {"mode": mode, "deterministic": False}
+    screen = pygame.display.set_mode(gamemode[mode]["size"])
+    draw = Draw()
+
+    def full():
+        draw.layout = None
+        draw.draw(screen, board, settings)
+
+    results = {"full": measure(full, repeat)}
+    results["idle"] = measure(lambda: draw.draw(screen, board, settings), repeat)
+    if start_pos is not None:
+        cells = bytes(board.cells)
+
+        def click():
+            board.cells = bytearray(cells)
+            board.recount()
+            board.playing = False
+            draw.draw(screen, board, settings)
+            board.reveal_square(start_pos)
+
+        results["click"] = measure(lambda: draw.draw(screen, board, settings), repeat, click)
+    return results
+
+def run(repeat=5, seed=0, large=True, render=True):
+    """
+    Runs every benchmark and returns the results
+    """
+    results = []
+
+    def record(benchmark, name, grid, bombs, result):
+        if result is not None:
+            results.append(dict(benchmark=benchmark, case=name, grid=list(grid), bombs=bombs, seed=seed, **result))
+
+    for name, grid, bombs in cases(large):
+        record("create_board", name, grid, bombs, bench_create_board(grid, bombs, repeat, seed))
+        record("reveal_square", name, grid, bombs, bench_reveal_square(grid, bombs, repeat, seed))
+        # Rejection sampling of no-guess boards is only practical on small or sparse grids
+        squares = grid[0] * grid[1]
+        if squares <= 30 * 16 or (squares <= 100 * 100 and bombs <= squares * DENSITIES[0]):
+            record("deterministic", name, grid, bombs, bench_deterministic(grid, bombs, repeat, seed))
+        if squares <= 30 * 16:
+            record("probability", name, grid, bombs, bench_probability(grid, bombs, repeat, seed))
+
+    if render:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        import pygame
+        pygame.display.init()
+        pygame.font.init()
+        for name, grid, bombs in cases(False):
+            for frame, result in bench_draw(name, grid, bombs, repeat, seed).items():
+                record("draw_" + frame, name, grid, bombs, result)
+        # Large grids are drawn downsampled, their frame time should not grow with the board
+        for grid in LARGE_GRIDS if large else []:
+            for density in DENSITIES:
+                bombs = int(grid[0] * grid[1] * density)
+                name = str(grid[0]) + "x" + str(grid[1]) + "@" + str(density)
+                for frame, result in bench_draw("Expert", grid, bombs, repeat, seed).items():
+                    record("draw_" + frame, name, grid, bombs, result)
+        pygame.quit()
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "results": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks board generation, solving, revealing, bomb probabilities and rendering")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file to write, defaults to stdout")
+    parser.add_argument("--no-large", action="store_true", help="only benchmark the gamemode presets")
+    parser.add_argument("--no-render", action="store_true", help="skip the rendering benchmarks")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = run(args.repeat, args.seed, not args.no_large, not args.no_render)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
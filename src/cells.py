@@ -0,0 +1,6 @@
+# Bit layout of a single square in Board.cells
+VALUE = 0x0F                # Number of adjacent bombs (0..8)
+BOMB = 0x10
+REVEALED = 0x20
+FLAGGED = 0x40
+REVEALED_ADJACENT = 0x80
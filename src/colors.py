@@ -8,4 +8,5 @@ GREY = (128, 128, 128)
 DARK_GREY = (64, 64, 64)
 LIGHT_GREY = (192, 192, 192)
 LIGHT_RED = (255, 128, 128)
-DARK_RED = (128, 0, 0)
\ No newline at end of file
+DARK_RED = (128, 0, 0)
+LIGHT_GREEN = (144, 238, 144)
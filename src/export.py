@@ -0,0 +1,301 @@
+import argparse
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from multiprocessing import Pool
+import numpy as np
+from .Board import Board
+from .AutoPlayer import AutoPlayer
+from .Replay import Replay
+from .BatchEnv import OBS_UNREVEALED, OBS_FLAG
+from .gamemode import gamemode
+from .cells import *
+
+# Training data export
+#
+# Every sample is the board as the player sees it before a move, with the bomb mask and the mask of
+# the hidden squares that are safe to click. Samples are fixed size records in .npy shards of
+# shard_size records each, so loaders can memory map a shard and read any sample without loading it.
+# index.json lists the shards, how many records of each are written, the next seed to play and the
+# replay files already exported.
+
+INDEX_FILE = "index.json"
+INDEX_VERSION = 1
+
+def sample_dtype(grid):
+    """
+    Returns the record type of one sample of a grid
+    """
+    shape = (grid[0], grid[1])
+    return np.dtype([("obs", np.uint8, shape), ("mines", np.bool_, shape), ("safe", np.bool_, shape),
+                     ("seed", "<u8"), ("step", "<u4")])
+
+def board_sample(board):
+    """
+    Returns the (obs, mines, safe) arrays of a board, obs using the observation codes of BatchEnv
+    """
+    state = board.state
+    revealed = (state & REVEALED) != 0
+    mines = (state & BOMB) != 0
+    obs = np.where(revealed, state & VALUE, np.where(state & FLAGGED, OBS_FLAG, OBS_UNREVEALED)).astype(np.uint8)
+    return obs, mines, ~revealed & ~mines
+
+def solver_samples(grid, bombs, seed, deterministic=False):
+    """
+    Plays the board of a seed with the auto player, yields (obs, mines, safe) before every step
+    """
+    board = Board()
+    board.new_board(grid, bombs, deterministic, seed)
+    player = AutoPlayer(board, random.Random("moves:" + str(seed)))
+    while not (board.game_over or board.won):
+        sample = board_sample(board)
+        if not player.step():
+            break
+        yield sample
+
+def replay_samples(replay):
+    """
+    Yields (obs, mines, safe) before every move of a replay
+    """
+    board = replay.seek(0)
+    for position in range(1, len(replay) + 1):
+        sample = board_sample(board)
+        board = replay.seek(position)
+        yield sample
+
+def records(grid, samples, seed):
+    """
+    Packs the samples of one game into an array of records
+    """
+    samples = list(samples)
+    result = np.zeros(len(samples), dtype=sample_dtype(grid))
+    for step, (obs, mines, safe) in enumerate(samples):
+        result[step] = (obs, mines, safe, seed, step)
+    return result
+
+def game_records(args):
+    """
+    Pool entry point, returns the records of the game of one seed
+    """
+    grid, bombs, seed, deterministic = args
+    return records(grid, solver_samples(grid, bombs, seed, deterministic), seed)
+
+class ShardWriter:
+    """
+    Appends records to the shards of a directory, picking up where the index left off
+
+    Records written after the last index update are overwritten when resuming, so the index
+    is only updated between games, after every game that fills a shard, and always describes complete games.
+    """
+    def __init__(self, path, grid, shard_size=16384):
+        self.path = path
+        self.grid = list(grid)
+        self.dtype = sample_dtype(grid)
+        self.index_path = os.path.join(path, INDEX_FILE)
+        self.shard = None
+        os.makedirs(path, exist_ok=True)
+
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as file:
+                index = json.load(file)
+            if index["version"] != INDEX_VERSION or index["grid"] != self.grid:
+                raise ValueError("Existing export is for another grid or version: " + str(index["grid"]))
+            self.shard_size = index["shard_size"]
+            self.shards = index["shards"]
+            self.next_seed = index["next_seed"]
+            self.replays = index.get("replays", [])
+            logging.info("[+] Resuming export at seed %s (%s samples, %s replays)", self.next_seed, self.samples,
+                         len(self.replays))
+        else:
+            self.shard_size = shard_size
+            self.shards = []
+            self.next_seed = None
+            self.replays = []
+
+    @property
+    def samples(self):
+        return sum(shard["samples"] for shard in self.shards)
+
+    def __open_shard(self):
+        """
+        Maps the last shard if it has room, a new one otherwise
+        """
+        if self.shards and self.shards[-1]["samples"] < self.shard_size:
+            self.shard = np.load(os.path.join(self.path, self.shards[-1]["file"]), mmap_mode="r+")
+            return
+        name = "shard_{0:05d}.npy".format(len(self.shards))
+        self.shard = np.lib.format.open_memmap(os.path.join(self.path, name), mode="w+",
+                                               dtype=self.dtype, shape=(self.shard_size,))
+        self.shards.append({"file": name, "samples": 0})
+
+    def write(self, game, next_seed=None, replay=None):
+        """
+        Appends the records of one game, next_seed is the seed to resume from after it and replay
+        the replay file it was read from
+        """
+        start = 0
+        filled = False
+        while start < len(game):
+            if self.shard is None:
+                self.__open_shard()
+            shard = self.shards[-1]
+            count = min(len(game) - start, self.shard_size - shard["samples"])
+            self.shard[shard["samples"]:shard["samples"] + count] = game[start:start + count]
+            shard["samples"] += count
+            start += count
+            if shard["samples"] == self.shard_size:
+                self.shard.flush()
+                self.shard = None
+                filled = True
+        if next_seed is not None:
+            self.next_seed = next_seed
+        if replay is not None:
+            self.replays.append(replay)
+        if filled:
+            self.write_index()
+
+    def write_index(self):
+        """
+        Flushes the current shard and replaces the index
+        """
+        if self.shard is not None:
+            self.shard.flush()
+        index = {
+            "version": INDEX_VERSION,
+            "grid": self.grid,
+            "dtype": self.dtype.descr,
+            "shard_size": self.shard_size,
+            "samples": self.samples,
+            "next_seed": self.next_seed,
+            "replays": self.replays,
+            "shards": self.shards,
+        }
+        with open(self.index_path + ".tmp", "w") as file:
+            json.dump(index, file, indent=2)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def close(self):
+        self.write_index()
+        self.shard = None
+
+class ShardReader:
+    """
+    Random access to the samples of an export, shards are memory mapped when first read
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE)) as file:
+            index = json.load(file)
+        self.grid = index["grid"]
+        self.shard_size = index["shard_size"]
+        self.shards = index["shards"]
+        self.samples = sum(shard["samples"] for shard in self.shards)
+        self.maps = {}
+
+    def __len__(self):
+        return self.samples
+
+    def __getitem__(self, i):
+        """
+        Returns the record of sample i, with obs, mines, safe, seed and step fields
+        """
+        if i < 0:
+            i += self.samples
+        if not 0 <= i < self.samples:
+            raise IndexError("sample index out of range")
+        shard, row = divmod(i, self.shard_size)
+        if shard not in self.maps:
+            self.maps[shard] = np.load(os.path.join(self.path, self.shards[shard]["file"]), mmap_mode="r")
+        return self.maps[shard][row]
+
+def export(path, grid, bombs, games, seed=0, shard_size=16384, processes=None, deterministic=False):
+    """
+    Plays the games of seeds [seed, seed + games) and writes their samples, returns the number of samples written
+
+    At most twice as many games as processes are in flight, their records are written in seed order.
+    """
+    writer = ShardWriter(path, grid, shard_size)
+    first = seed if writer.next_seed is None else writer.next_seed
+    before = writer.samples
+    tasks = ((grid, bombs, game_seed, deterministic) for game_seed in range(first, seed + games))
+    try:
+        if processes == 1:
+            for task in tasks:
+                writer.write(game_records(task), task[2] + 1)
+        else:
+            with Pool(processes) as pool:
+                window = 2 * (processes or os.cpu_count() or 1)
+                pending = deque()
+                for task in tasks:
+                    pending.append((task[2], pool.apply_async(game_records, (task,))))
+                    if len(pending) >= window:
+                        game_seed, result = pending.popleft()
+                        writer.write(result.get(), game_seed + 1)
+                while pending:
+                    game_seed, result = pending.popleft()
+                    writer.write(result.get(), game_seed + 1)
+    finally:
+        writer.close()
+    return writer.samples - before
+
+def export_replays(path, paths, shard_size=16384):
+    """
+    Writes the samples of replay files, returns the number of samples written
+
+    Replays are recorded in the index by absolute path, the ones already exported are skipped.
+    """
+    written = 0
+    writer = None
+    try:
+        for replay_path in paths:
+            replay = Replay.load_file(replay_path)
+            if writer is None:
+                writer = ShardWriter(path, replay.grid, shard_size)
+            elif replay.grid != writer.grid:
+                raise ValueError("Replay " + replay_path + " is for another grid: " + str(replay.grid))
+            name = os.path.abspath(replay_path)
+            if name in writer.replays:
+                continue
+            game = records(replay.grid, replay_samples(replay), replay.seed)
+            writer.write(game, replay=name)
+            written += len(game)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Exports the positions of played games as memory mapped training shards")
+    parser.add_argument("path", help="output directory, an existing export is resumed")
+    parser.add_argument("--mode", default="Expert", choices=list(gamemode))
+    parser.add_argument("--grid", type=int, nargs=2, help="custom grid size, overrides --mode")
+    parser.add_argument("--bombs", type=int, help="custom number of bombs, overrides --mode")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--shard-size", type=int, default=16384, help="samples per shard")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--deterministic", action="store_true")
+    parser.add_argument("--replays", nargs="+", help="export these replay files instead of playing games")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    grid = args.grid or gamemode[args.mode]["grid"]
+    bombs = args.bombs if args.bombs is not None else gamemode[args.mode]["bombs"]
+
+    start = time.perf_counter()
+    if args.replays:
+        samples = export_replays(args.path, args.replays, args.shard_size)
+    else:
+        samples = export(args.path, grid, bombs, args.games, args.seed, args.shard_size, args.processes,
+                         args.deterministic)
+    seconds = time.perf_counter() - start
+
+    print("samples: " + str(samples))
+    print("seconds: " + str(seconds))
+    print("samples_per_second: " + str(samples / seconds if seconds else 0.0))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+from array import array
+from functools import lru_cache
+import numpy as np
+
+# Boards above this many squares walk their neighbours with clamped ranges instead of a table
+MAX_TABLE_SQUARES = 1 << 22
+
+def count_neighbors(mines):
+    """
+    Returns the number of bombs surrounding every square of a (..., width, height) bomb mask
+    """
+    width, height = mines.shape[-2:]
+    padded = np.zeros(mines.shape[:-2] + (width + 2, height + 2), dtype=np.uint8)
+    padded[..., 1:-1, 1:-1] = mines
+
+    # Sum the eight shifted copies of the bomb mask
+    counts = np.zeros(mines.shape, dtype=np.uint8)
+    for dx in range(3):
+        for dy in range(3):
+            if dx != 1 or dy != 1:
+                counts += padded[..., dx:dx + width, dy:dy + height]
+    return counts
+
+def dilate(mask):
+    """
+    Returns a (..., width, height) mask grown by one square in every direction
+    """
+    width, height = mask.shape[-2:]
+    padded = np.zeros(mask.shape[:-2] + (width + 2, height + 2), dtype=bool)
+    padded[..., 1:-1, 1:-1] = mask
+    grown = mask.copy()
+    for dx in range(3):
+        for dy in range(3):
+            if dx != 1 or dy != 1:
+                grown |= padded[..., dx:dx + width, dy:dy + height]
+    return grown
+
+def label_openings(empty):
+    """
+    Gives every 8-connected group of squares of a (boards, width, height) mask its own label,
+    the largest flat index + 1 of the group
+
+    Labels are propagated as the maximum over neighbours, then every square jumps to the label of the
+    square its label names, until nothing changes. Squares outside the mask get 0.
+    """
+    boards, width, height = empty.shape
+    squares = width * height
+    dtype = np.int16 if squares < 1 << 15 else np.int32
+    labels = np.where(empty, np.arange(1, squares + 1, dtype=dtype).reshape(width, height), 0).astype(dtype)
+    active = np.arange(boards)
+    offsets = np.repeat(np.arange(boards) * squares - 1, squares)
+    while active.size:
+        current = labels[active]
+        # Maximum over the 3x3 block, along x then along y
+        rows = current.copy()
+        np.maximum(rows[:, 1:], current[:, :-1], out=rows[:, 1:])
+        np.maximum(rows[:, :-1], current[:, 1:], out=rows[:, :-1])
+        spread = rows.copy()
+        np.maximum(spread[:, :, 1:], rows[:, :, :-1], out=spread[:, :, 1:])
+        np.maximum(spread[:, :, :-1], rows[:, :, 1:], out=spread[:, :, :-1])
+        spread *= empty[active]
+        # Pointer jumping, label l is the flat index l - 1 of a square of the same opening
+        flat = spread.reshape(-1)
+        np.maximum(flat, flat.take(np.maximum(flat + offsets[:flat.size], 0)) * (flat > 0), out=flat)
+        changed = (spread != current).any(axis=(1, 2))
+        labels[active] = spread
+        active = active[changed]
+    return labels
+
+@lru_cache(maxsize=4)
+def neighbor_table(width, height):
+    """
+    Returns (offsets, indices), the flat indices of the squares around square k being
+    indices[offsets[k]:offsets[k + 1]] (CSR layout), computed once per grid shape
+    """
+    x, y = np.meshgrid(np.arange(width), np.arange(height), indexing="ij")
+    candidates = []
+    valid = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            if dx or dy:
+                i = x + dx
+                j = y + dy
+                candidates.append((i * height + j).ravel())
+                valid.append(((i >= 0) & (i < width) & (j >= 0) & (j < height)).ravel())
+    candidates = np.stack(candidates, axis=1)
+    valid = np.stack(valid, axis=1)
+
+    offsets = np.zeros(width * height + 1, dtype=np.int64)
+    np.cumsum(valid.sum(axis=1), out=offsets[1:])
+
+    table = (array("q"), array("i"))
+    table[0].frombytes(offsets.tobytes())
+    table[1].frombytes(candidates[valid].astype(np.int32).tobytes())
+    return table
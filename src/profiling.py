@@ -0,0 +1,154 @@
+import functools
+import json
+import logging
+import threading
+import time
+from .colors import *
+
+# Call durations are kept in power of two buckets, bucket i holds calls of [2^(i-1), 2^i) microseconds
+HISTOGRAM_BUCKETS = 32
+
+class Stat:
+    """
+    Count, total, maximum and histogram of the durations of one function
+    """
+    __slots__ = ("count", "total", "max", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.histogram[min(HISTOGRAM_BUCKETS - 1, int(seconds * 1e6).bit_length())] += 1
+
+    def percentile(self, q):
+        """
+        Returns an upper bound of the q-th percentile (0..100) in seconds, from the histogram
+        """
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= self.count * q / 100:
+                return min(self.max, (1 << bucket) / 1e6)
+        return 0.0
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self.max,
+            "histogram_us": {str(1 << bucket): count for bucket, count in enumerate(self.histogram) if count},
+        }
+
+class Profiler:
+    """
+    Times chosen methods by replacing them on their class, nothing is replaced unless instrument() is called
+
+    Only calls made on the thread that created the profiler are timed, boards generated by the
+    BoardPool thread are not mixed into the timings of the game and the stats need no lock.
+    """
+    def __init__(self):
+        self.stats = {}
+        self.counters = {}
+        self.patched = []
+        self.thread = threading.get_ident()
+
+    def stat(self, name):
+        if name not in self.stats:
+            self.stats[name] = Stat()
+        return self.stats[name]
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def wrap(self, cls, name, counter=None):
+        """
+        Times every call of cls.name, counter(result) is called after every call if given
+        """
+        function = getattr(cls, name)
+        stat = self.stat(cls.__name__ + "." + name)
+        thread = self.thread
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            if threading.get_ident() != thread:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            stat.add(time.perf_counter() - start)
+            if counter is not None:
+                counter(result)
+            return result
+
+        setattr(cls, name, timed)
+        self.patched.append((cls, name, function))
+
+    def restore(self):
+        """
+        Puts back every method replaced by wrap()
+        """
+        for cls, name, function in reversed(self.patched):
+            setattr(cls, name, function)
+        self.patched = []
+
+    def lines(self):
+        """
+        Returns one text line per timed function and counter, times in milliseconds (mean/p99)
+        """
+        lines = []
+        for name, stat in self.stats.items():
+            if stat.count:
+                lines.append("{0} {1} {2:.2f}/{3:.2f}".format(name.split(".")[-1], stat.count,
+                                                              stat.total / stat.count * 1000, stat.percentile(99) * 1000))
+        for name, value in self.counters.items():
+            lines.append("{0} {1}".format(name.split(".")[-1], value))
+        return lines
+
+    def draw_overlay(self, screen, font, area):
+        """
+        Draws the statistics into an area of the screen nothing else draws in, returns the dirty rects
+        """
+        area = screen.fill(WHITE, area)
+        screen.set_clip(area)
+        for i, line in enumerate(self.lines()):
+            screen.blit(font.render(line, True, DARK_GREY), (area.x, area.y + i * font.get_linesize()))
+        screen.set_clip(None)
+        return [area]
+
+    def to_dict(self):
+        return {
+            "stats": {name: stat.to_dict() for name, stat in self.stats.items()},
+            "counters": dict(self.counters),
+        }
+
+    def dump(self, path):
+        """
+        Writes the statistics as JSON
+        """
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+        logging.info("[+] Profile written to %s", path)
+
+def instrument(profiler):
+    """
+    Times the board generation, the moves and every drawing stage of the game
+    """
+    from .Board import Board
+    from .Draw import Draw
+
+    profiler.wrap(Board, "new_board")
+    profiler.wrap(Board, "create_board")
+    profiler.wrap(Board, "deterministic", lambda result: profiler.count("Board.rejections", not result))
+    profiler.wrap(Board, "reveal_square", lambda result: profiler.count("Board.revealed_cells", len(result)))
+    profiler.wrap(Board, "check_win")
+    for stage in ("draw", "draw_grid", "draw_downsampled", "draw_labels", "display_timer"):
+        profiler.wrap(Draw, stage)
@@ -0,0 +1,133 @@
+import argparse
+import logging
+import random
+import time
+from multiprocessing import Pool
+from .Board import Board
+from .Solver import Solver
+from .gamemode import gamemode
+from .cells import *
+
+# Headless game runner, plays games with a policy without pygame
+#
+# A policy is called with (board, rng) and returns a list of ("reveal" | "flag", pos) moves
+
+def unknown_squares(board):
+    """
+    Returns the squares that are neither revealed nor flagged
+    """
+    height = board.grid[1]
+    return [(k // height, k % height) for k, cell in enumerate(board.cells) if not cell & (REVEALED | FLAGGED)]
+
+def random_policy(board, rng):
+    """
+    Clicks a random unknown square
+    """
+    if board.start_pos is not None and not board.playing:
+        return [("reveal", board.start_pos)]
+    return [("reveal", rng.choice(unknown_squares(board)))]
+
+def solver_policy(board, rng):
+    """
+    Plays every certain move found by the solver, guesses a random unknown square otherwise
+    """
+    if board.start_pos is not None and not board.playing:
+        return [("reveal", board.start_pos)]
+
+    safe, mines = Solver(board.grid).deduce(board.cells, board.bombs)
+    moves = [("reveal", pos) for pos in sorted(safe)]
+    moves += [("flag", pos) for pos in sorted(mines) if not board.board[pos[0]][pos[1]].flagged]
+    if moves:
+        return moves
+    return random_policy(board, rng)
+
+POLICIES = {
+    "random": random_policy,
+    "solver": solver_policy,
+}
+
+def play(grid, bombs, policy, seed, deterministic=False):
+    """
+    Plays a single game, returns (won, clicks)
+    """
+    random.seed(seed)
+    board = Board()
+    board.new_board(grid, bombs, deterministic)
+
+    # Seeded from the board stream, a generator seeded with the same value would replay the bomb positions
+    rng = random.Random(random.getrandbits(64))
+
+    clicks = 0
+    height = grid[1]
+    while not (board.game_over or board.won):
+        for action, pos in policy(board, rng):
+            if board.cells[pos[0] * height + pos[1]] & REVEALED:
+                continue
+            if action == "reveal":
+                board.reveal_square(pos)
+            else:
+                board.flag_square(pos)
+            clicks += 1
+            if board.game_over:
+                break
+        board.check_win()
+    return board.won, clicks
+
+def play_game(args):
+    """
+    Pool entry point for play(), takes the policy by name so it can be pickled
+    """
+    grid, bombs, policy, seed, deterministic = args
+    return play(grid, bombs, POLICIES[policy], seed, deterministic)
+
+def run_batch(grid, bombs, games, policy="random", processes=None, seed=0, deterministic=False):
+    """
+    Plays a number of games across a process pool and returns a summary of the results
+    """
+    tasks = [(grid, bombs, policy, seed + i, deterministic) for i in range(games)]
+
+    start = time.perf_counter()
+    if processes == 1:
+        results = [play_game(task) for task in tasks]
+    else:
+        with Pool(processes) as pool:
+            results = pool.map(play_game, tasks, chunksize=max(1, games // 64))
+    elapsed = time.perf_counter() - start
+
+    wins = sum(1 for won, _ in results if won)
+    clicks = sum(clicks for _, clicks in results)
+    return {
+        "grid": list(grid),
+        "bombs": bombs,
+        "policy": policy,
+        "games": games,
+        "wins": wins,
+        "win_rate": wins / games if games else 0.0,
+        "clicks": clicks,
+        "seconds": elapsed,
+        "clicks_per_second": clicks / elapsed if elapsed else 0.0,
+        "games_per_second": games / elapsed if elapsed else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays Minesweeper games headlessly and reports the results")
+    parser.add_argument("--mode", default="Beginner", choices=list(gamemode))
+    parser.add_argument("--grid", type=int, nargs=2, help="custom grid size, overrides --mode")
+    parser.add_argument("--bombs", type=int, help="custom number of bombs, overrides --mode")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--policy", default="random", choices=list(POLICIES))
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--deterministic", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    grid = args.grid or gamemode[args.mode]["grid"]
+    bombs = args.bombs if args.bombs is not None else gamemode[args.mode]["bombs"]
+
+    summary = run_batch(grid, bombs, args.games, args.policy, args.processes, args.seed, args.deterministic)
+    for key, value in summary.items():
+        print(key + ": " + str(value))
+
+if __name__ == "__main__":
+    main()
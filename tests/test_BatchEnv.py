@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from src.BatchEnv import BatchEnv, REVEAL_ACTION, FLAG_ACTION, OBS_UNREVEALED, OBS_FLAG
+from src.Board import Board
+from src.cells import *
+
+def board_like(env, row):
+    """
+    Returns a Board with the bombs of one board of the batch
+    """
+    board = Board()
+    board.check_counters = True
+    board.create_board = lambda grid, bombs, seed: bytearray(env.state[row].tobytes())
+    board.new_board(env.grid, env.bombs, seed=0)
+    return board
+
+def observation(board):
+    state = board.state
+    return np.where((state & REVEALED) != 0, state & VALUE,
+                    np.where((state & FLAGGED) != 0, OBS_FLAG, OBS_UNREVEALED)).astype(np.uint8)
+
+@pytest.mark.parametrize("grid, bombs", [([9, 9], 10), ([16, 16], 40), ([30, 16], 99)])
+def test_steps_match_board(grid, bombs):
+    env = BatchEnv(16, grid, bombs, seed=grid[0])
+    boards = [board_like(env, row) for row in range(env.batch)]
+    rng = np.random.default_rng(grid[0])
+    for _ in range(300):
+        # Reveals and flags of unrevealed squares, mostly flags on bombs but also some on safe
+        # squares, which stop floods through the openings they are in
+        actions = []
+        for board in boards:
+            state = np.frombuffer(board.cells, dtype=np.uint8)
+            hidden = np.flatnonzero((state & REVEALED) == 0)
+            k = int(rng.choice(hidden))
+            roll = rng.random()
+            kind = FLAG_ACTION if roll < (0.8 if state[k] & BOMB else 0.15) else REVEAL_ACTION
+            actions.append((kind, k // grid[1], k % grid[1]))
+
+        expected = []
+        for board, (kind, x, y) in zip(boards, actions):
+            before = board.revealed_safe
+            if kind == REVEAL_ACTION:
+                board.reveal_square((x, y))
+            else:
+                board.flag_square((x, y))
+            board.check_win()
+            reward = -1.0 if board.game_over else (board.revealed_safe - before) / board.safe_squares
+            expected.append((observation(board), reward, board.game_over or board.won, board.flags))
+
+        obs, reward, done = env.step(np.array(actions))
+        for row, (board_obs, board_reward, board_done, board_flags) in enumerate(expected):
+            assert reward[row] == pytest.approx(board_reward)
+            assert done[row] == board_done
+            if board_done:
+                boards[row] = board_like(env, row)
+            else:
+                assert (obs[row] == board_obs).all()
+                assert env.revealed_safe[row] == boards[row].revealed_safe
+                assert env.flags[row] == board_flags
@@ -0,0 +1,282 @@
+import random
+import numpy as np
+import pytest
+import src.Board
+from src.Board import Board, SAVE_HEADER, SAVE_HEADERS, place_mines
+from src.cells import *
+
+GRIDS = [([9, 9], 10), ([16, 16], 40), ([30, 16], 99), ([60, 40], 300)]
+
+def checked_board(grid, bombs, seed):
+    """
+    Returns a new board comparing its counters against a full scan on every check_win
+    """
+    board = Board()
+    board.check_counters = True
+    board.new_board(grid, bombs, seed=seed)
+    return board
+
+def random_move(board, rng):
+    """
+    Reveals or flags a random square
+    """
+    pos = (rng.randrange(board.grid[0]), rng.randrange(board.grid[1]))
+    if rng.random() < 0.6:
+        board.reveal_square(pos)
+    else:
+        board.flag_square(pos)
+    board.check_win()
+
+def assert_counters(board):
+    assert board.count_squares() == (board.revealed_safe, board.flags, board.correct_flags)
+
+@pytest.mark.parametrize("grid, bombs", GRIDS + [([7, 3], 20), ([1, 1], 0), ([40, 25], 999)])
+def test_numbers_match_a_loop_over_the_bombs(grid, bombs):
+    board = Board()
+    board.new_board(grid, bombs, seed=grid[0] * bombs)
+    width, height = grid
+    expected = [0] * (width * height)
+    mines = [k for k, cell in enumerate(board.cells) if cell & BOMB]
+    assert len(mines) == bombs
+    for k in mines:
+        x, y = divmod(k, height)
+        for i in range(max(x - 1, 0), min(x + 2, width)):
+            for j in range(max(y - 1, 0), min(y + 2, height)):
+                expected[i * height + j] += 1
+    for k, cell in enumerate(board.cells):
+        if not cell & BOMB:
+            assert cell == expected[k]
+
+def test_same_seed_places_the_same_bombs():
+    assert (place_mines(10000, 1500, 3) == place_mines(10000, 1500, 3)).all()
+    assert (place_mines(10000, 1500, 3) != place_mines(10000, 1500, 4)).any()
+    assert place_mines(10000, 9990, 3).sum() == 9990
+
+@pytest.mark.parametrize("grid, bombs", GRIDS)
+def test_counters_follow_random_games(grid, bombs):
+    rng = random.Random(grid[0])
+    for seed in range(20):
+        board = checked_board(grid, bombs, seed)
+        while not (board.game_over or board.won) and len(board.moves) < 200:
+            random_move(board, rng)
+        assert_counters(board)
+        assert board.won == (board.revealed_safe == board.safe_squares)
+
+def test_won_when_every_safe_square_is_revealed():
+    board = checked_board([16, 16], 40, 3)
+    for k, cell in enumerate(board.cells):
+        if not cell & BOMB:
+            board.reveal_square(divmod(k, 16))
+    board.check_win()
+    assert board.won and not board.game_over
+    assert board.revealed_safe == board.safe_squares == 16 * 16 - 40
+
+def test_bulk_operations_keep_counters():
+    board = checked_board([30, 16], 99, 7)
+    rng = random.Random(7)
+    for _ in range(20):
+        random_move(board, rng)
+        if board.game_over:
+            break
+    for operation in (board.flag_all, board.reveal_all, board.unreveal_all, board.unflag_all):
+        operation()
+        board.check_win()
+        assert_counters(board)
+    assert (board.revealed_safe, board.flags, board.correct_flags) == (0, 0, 0)
+
+def test_load_board_restores_counters():
+    board = checked_board([16, 16], 40, 11)
+    rng = random.Random(11)
+    board.flag_square((0, 0))
+    board.save_board()
+    saved = (board.revealed_safe, board.flags, board.correct_flags, bytes(board.cells))
+    for _ in range(30):
+        random_move(board, rng)
+        if board.game_over:
+            break
+    board.reveal_all()
+    board.load_board()
+    board.check_win()
+    assert (board.revealed_safe, board.flags, board.correct_flags, bytes(board.cells)) == saved
+
+def test_changes_grow_whenever_the_cells_change():
+    board = checked_board([16, 16], 40, 5)
+    rng = random.Random(5)
+    board.save_board()
+    moves = [lambda: random_move(board, rng)] * 60
+    for operation in moves + [board.flag_all, board.reveal_all, board.unreveal_all, board.unflag_all, board.load_board]:
+        cells, changes = bytes(board.cells), board.changes
+        operation()
+        if bytes(board.cells) != cells:
+            assert board.changes > changes
+
+def test_check_counters_catches_drift():
+    board = checked_board([9, 9], 10, 5)
+    board.flags += 1
+    with pytest.raises(AssertionError):
+        board.check_win()
+
+def game_state(board):
+    return (bytes(board.cells), board.grid, board.bombs, board.revealed_safe, board.flags, board.correct_flags,
+            board.game_over, board.won, board.playing, board.start_pos, board.start_time, board.end_time)
+
+def test_snapshots_nest_and_undo_bulk_operations():
+    board = checked_board([30, 16], 99, 13)
+    rng = random.Random(13)
+    states = []
+    for _ in range(4):
+        board.save_board()
+        states.append((game_state(board), len(board.moves)))
+        for _ in range(10):
+            random_move(board, rng)
+        board.flag_all()
+        board.reveal_all()
+    board.new_board([16, 16], 40, seed=2)
+    while states:
+        board.load_board()
+        assert_counters(board)
+        state, moves = states.pop()
+        assert game_state(board) == state
+        assert len(board.moves) == moves
+    assert not board.saved_boards and len(board.journal) == 0
+
+@pytest.mark.parametrize("grid, bombs", GRIDS + [([1000, 1000], 150000)])
+def test_save_round_trip(grid, bombs, tmp_path):
+    board = checked_board(grid, bombs, 17)
+    rng = random.Random(17)
+    for _ in range(40):
+        random_move(board, rng)
+        if board.game_over:
+            break
+    expected = game_state(board)
+
+    copy = Board()
+    copy.from_bytes(board.to_bytes())
+    assert game_state(copy) == expected
+
+    path = str(tmp_path / "board.msb")
+    board.save_file(path)
+    for mmap in (False, True):
+        copy = Board()
+        copy.check_counters = True
+        copy.load_file(path, mmap)
+        copy.check_win()
+        assert game_state(copy) == expected
+
+def test_save_format_is_four_bitplanes():
+    board = Board()
+    board.new_board([1000, 1000], 150000, seed=1)
+    assert len(board.to_bytes()) == SAVE_HEADER.size + 4 * 1000 * 1000 // 8
+
+def test_from_bytes_rejects_other_data():
+    with pytest.raises(ValueError):
+        Board().from_bytes(bytes(100))
+
+@pytest.mark.parametrize("grid, bombs", GRIDS + [([7, 3], 20), ([1, 1], 0)])
+def test_load_decodes_in_blocks(monkeypatch, grid, bombs, tmp_path):
+    board = checked_board(grid, bombs, 23)
+    rng = random.Random(23)
+    for _ in range(40):
+        random_move(board, rng)
+    path = str(tmp_path / "board.msb")
+    board.save_file(path)
+    # Blocks of a single row or a few rows, which do not start on a byte of the planes
+    for block in (1, 3 * grid[1], 5 * grid[1]):
+        monkeypatch.setattr(src.Board, "LOAD_BLOCK_SQUARES", block)
+        for mmap in (False, True):
+            copy = Board()
+            copy.load_file(path, mmap)
+            assert game_state(copy) == game_state(board)
+
+def test_save_keeps_float_clocks_and_loads_version_1():
+    board = Board(clock=lambda: 12.75)
+    board.new_board([16, 16], 40, seed=3)
+    board.reveal_square((0, 0))
+    copy = Board()
+    copy.from_bytes(board.to_bytes())
+    assert copy.start_time == 12.75
+
+    # Version 1 stored integer times
+    board = Board(clock=lambda: 1234)
+    board.new_board([16, 16], 40, seed=3)
+    board.reveal_square((0, 0))
+    data = board.to_bytes()
+    fields = list(SAVE_HEADER.unpack(data[:SAVE_HEADER.size]))
+    fields[1] = 1
+    fields[-2:] = [-1 if time is None else time for time in (board.start_time, board.end_time)]
+    copy = Board()
+    copy.from_bytes(SAVE_HEADERS[1].pack(*fields) + data[SAVE_HEADER.size:])
+    assert game_state(copy) == game_state(board)
+
+def test_neighbour_counts_and_satisfiable_queue():
+    rng = random.Random(19)
+    for seed in range(30):
+        grid, bombs = GRIDS[seed % len(GRIDS)]
+        board = checked_board(grid, bombs, seed)
+        queue = board.subscribe()
+        for step in range(60):
+            action = rng.random()
+            if action < 0.04:
+                board.save_board()
+            elif action < 0.07:
+                board.load_board()
+            elif action < 0.08:
+                board.from_bytes(board.to_bytes())
+            else:
+                random_move(board, rng)
+            # check_win compared the counts against count_adjacent(), every satisfiable square is queued
+            board.check_win()
+            queued = set(queue)
+            assert all(k in queued for k in range(len(board.cells)) if board.satisfiable(k))
+            queue.clear()
+            queue.extend(k for k in queued if board.satisfiable(k))
+            if board.game_over or board.won:
+                break
+        board.unsubscribe(queue)
+        assert not board.subscribers
+
+def chord_board():
+    """
+    Returns a 3x3 board with one bomb in the corner and the middle revealed
+    """
+    board = Board()
+    board.new_board([3, 3], 1, seed=0)
+    cells = bytearray(9)
+    cells[0] = BOMB
+    for k in (1, 3, 4):
+        cells[k] = 1
+    board.cells = cells
+    board.recount()
+    board.reveal_square((1, 1))
+    return board
+
+def test_chording_needs_as_many_flags_as_the_number():
+    board = chord_board()
+    assert board.reveal_square((1, 1)) == []
+    board.flag_square((0, 0))
+    assert len(board.reveal_square((1, 1))) == 7
+    board.check_win()
+    assert board.won
+
+def test_chording_with_a_wrong_flag_loses():
+    board = chord_board()
+    board.flag_square((2, 2))
+    assert (0, 0) in board.reveal_square((1, 1))
+    assert board.game_over
+
+def test_load_board_undoes_a_batched_chord():
+    board = Board()
+    board.create_board = lambda grid, bombs, seed: bytearray([BOMB, 1, 0, 1, 1, 0, 0, 0, 0])
+    board.new_board([3, 3], 1, seed=0)
+    board.reveal_square((1, 1))
+    board.flag_square((0, 0))
+    board.save_board()
+    saved = bytes(board.cells)
+
+    # The chord on (1, 1) as Replay batches it
+    around = np.array([1, 2, 3, 5, 6, 7, 8])
+    board.apply_moves(np.array([4 << 2]), around, np.array([4]), np.array([], dtype=np.int64))
+    assert board.cells[4] & REVEALED_ADJACENT
+    board.load_board()
+    assert bytes(board.cells) == saved
+    assert board.reveal_square((1, 1))
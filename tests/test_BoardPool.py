@@ -0,0 +1,60 @@
+import threading
+import time
+import src.BoardPool
+from src.Board import Board
+from src.BoardPool import BoardPool
+from src.Solver import Solver
+
+GRID = [9, 9]
+BOMBS = 10
+
+def wait_for(condition, timeout=30):
+    """
+    Polls condition until it holds, returns whether it did before the timeout
+    """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def test_pooled_boards_are_recreated_from_seed_and_start_pos():
+    pool = BoardPool([(GRID, BOMBS)], size=3)
+    try:
+        assert wait_for(lambda: len(pool.ready[(tuple(GRID), BOMBS)]) == 3)
+        for _ in range(3):
+            board = Board()
+            pool.new_board(board, GRID, BOMBS, True)
+            assert board.isdeterministic and board.start_pos is not None
+            assert board.cells[board.start_pos[0] * GRID[1] + board.start_pos[1]] == 0
+            assert Solver(GRID).solve(board.cells, board.start_pos)
+
+            recreated = Board()
+            recreated.new_board(GRID, BOMBS, True, board.seed, board.start_pos)
+            assert (recreated.seed, recreated.start_pos) == (board.seed, board.start_pos)
+            assert recreated.cells == board.cells
+    finally:
+        pool.close()
+
+def test_close_does_not_wait_for_searches(monkeypatch):
+    release = threading.Event()
+    started = threading.Event()
+    def slow_search(grid, bombs, seed):
+        started.set()
+        release.wait()
+        return seed, (0, 0)
+    monkeypatch.setattr(src.BoardPool, "generate", slow_search)
+
+    pool = BoardPool([(GRID, BOMBS), ([16, 16], 40)], size=2)
+    assert started.wait(10)
+    start = time.perf_counter()
+    pool.close()
+    assert time.perf_counter() - start < 1
+    assert pool.take(GRID, BOMBS) is None
+
+    # The queued searches were cancelled, the running one finishes without starting others
+    release.set()
+    assert wait_for(lambda: sum(pool.pending.values()) == 0)
+    pool.executor.shutdown(wait=True)
+    assert sum(len(ready) for ready in pool.ready.values()) == 1
@@ -0,0 +1,68 @@
+import random
+import pytest
+from src.Board import Board
+from src.ChunkedBoard import ChunkedBoard
+from src.cells import *
+
+def mirrored(chunked):
+    """
+    Returns a Board with the bombs of a chunked board
+    """
+    width, height = chunked.grid
+    cells = bytearray(chunked.get((x, y)) for x in range(width) for y in range(height))
+    board = Board()
+    board.create_board = lambda grid, bombs, seed: bytearray(cells)
+    board.new_board(chunked.grid, chunked.bombs, seed=chunked.seed)
+    return board
+
+def game_state(board):
+    return board.revealed_safe, board.flags, board.correct_flags, board.game_over, board.won
+
+@pytest.mark.parametrize("density, seed", [(0.05, 1), (0.15, 2), (0.2, 3)])
+def test_plays_like_a_board_with_the_same_bombs(tmp_path, density, seed):
+    chunked = ChunkedBoard(45, 30, density=density, seed=seed, chunk_size=8, max_chunks=3, path=str(tmp_path),
+                           max_flood=40)
+    board = mirrored(chunked)
+    assert board.bombs == chunked.bombs
+
+    # Every chunk load checks that no more than max_chunks are held, floods included
+    load = chunked.chunk
+    def chunk(cx, cy):
+        cells = load(cx, cy)
+        assert len(chunked.chunks) <= chunked.max_chunks
+        return cells
+    chunked.chunk = chunk
+
+    # Mostly right guesses, with a few wrong flags and clicks on revealed squares that chord
+    rng = random.Random(seed)
+    for _ in range(1500):
+        if chunked.game_over or chunked.won:
+            break
+        pos = (rng.randrange(45), rng.randrange(30))
+        bomb = board.cells[pos[0] * 30 + pos[1]] & BOMB
+        if (bomb and rng.random() < 0.995) or rng.random() < 0.05:
+            chunked.flag_square(pos)
+            board.flag_square(pos)
+        else:
+            revealed = chunked.reveal_square(pos)
+            while chunked.frontier:
+                revealed += chunked.continue_flood()
+            assert sorted(revealed) == sorted(board.reveal_square(pos))
+        chunked.check_win()
+        board.check_win()
+        assert game_state(chunked) == game_state(board)
+
+    cells = bytes(chunked.get((x, y)) for x in range(45) for y in range(30))
+    assert cells == bytes(board.cells)
+    chunked.close()
+
+def test_floods_stop_after_max_flood_squares(tmp_path):
+    # Below a density of about 0.09 the empty squares of an endless board connect
+    board = ChunkedBoard(10**9, 10**9, density=0.02, seed=5, max_chunks=8, path=str(tmp_path), max_flood=5000)
+    pos = next((x, y) for x in range(10**6) for y in range(10) if board.get((x, y)) == 0)
+    revealed = board.reveal_square(pos)
+    assert 5000 <= len(revealed) < 5000 + 8 and board.frontier
+    more = board.continue_flood()
+    assert 5000 <= len(more) < 5000 + 8 and not set(more) & set(revealed)
+    assert board.revealed_safe == len(revealed) + len(more)
+    board.close()
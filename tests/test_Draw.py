@@ -0,0 +1,73 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+import pytest
+from src.Board import Board
+from src.Draw import Draw, HINT, HINT_LEVELS
+from src.FontCache import FontCache
+from src.gamemode import gamemode
+from src.cells import *
+
+@pytest.fixture(autouse=True)
+def display():
+    pygame.display.init()
+    pygame.font.init()
+    yield
+    pygame.quit()
+
+def render(mode, board, draw=None):
+    """
+    Draws a board on a new surface, returns (surface, dirty rects)
+    """
+    screen = pygame.Surface(gamemode[mode]["size"])
+    draw = draw or Draw(FontCache(None))
+    return screen, draw.draw(screen, board, {"mode": mode, "deterministic": False, "autoplay": False})
+
+@pytest.mark.parametrize("mode", list(gamemode))
+def test_only_changed_squares_are_redrawn(mode):
+    # A clock that stands still keeps the timer from changing between frames
+    board = Board(clock=lambda: 0)
+    board.new_board(gamemode[mode]["grid"], gamemode[mode]["bombs"], seed=1)
+    settings = {"mode": mode, "deterministic": False, "autoplay": False}
+    draw = Draw(FontCache(None))
+    screen, rects = render(mode, board, draw)
+    assert rects == [screen.get_rect()]
+    assert draw.draw(screen, board, settings) == []
+
+    # One flag and one number change exactly two squares
+    number = next(k for k, cell in enumerate(board.cells) if not cell & BOMB and cell & VALUE)
+    board.flag_square((0, 0) if number else (0, 1))
+    board.reveal_square(divmod(number, board.grid[1]))
+    rects = draw.draw(screen, board, settings)
+    assert len(rects) == 2
+
+    # What is on screen is what a fresh renderer draws
+    fresh, _ = render(mode, board)
+    assert pygame.image.tobytes(screen, "RGB") == pygame.image.tobytes(fresh, "RGB")
+
+def test_hints_redraw_only_when_the_board_changes():
+    board = Board(clock=lambda: 0)
+    board.new_board(gamemode["Expert"]["grid"], gamemode["Expert"]["bombs"], seed=1)
+    board.reveal_square(divmod(next(k for k, cell in enumerate(board.cells) if cell == 0), board.grid[1]))
+    settings = {"mode": "Expert", "deterministic": False, "autoplay": False, "hints": False}
+    draw = Draw(FontCache(None))
+    screen, _ = render("Expert", board, draw)
+
+    settings["hints"] = True
+    assert draw.draw(screen, board, settings)
+    assert (draw.shown >= HINT).any()
+    assert draw.draw(screen, board, settings) == []
+
+    # Every unrevealed square shows one of the hint levels
+    levels = draw.shown[draw.shown >= HINT] - HINT
+    assert set(levels.tolist()) <= set(range(HINT_LEVELS))
+
+    # The probabilities are computed again after a move only
+    computed = []
+    compute = draw.probability.compute
+    draw.probability.compute = lambda *args: computed.append(args) or compute(*args)
+    draw.draw(screen, board, settings)
+    board.reveal_square(divmod(next(k for k, cell in enumerate(board.cells) if not cell & (BOMB | REVEALED)), board.grid[1]))
+    draw.draw(screen, board, settings)
+    draw.draw(screen, board, settings)
+    assert len(computed) == 1
@@ -0,0 +1,77 @@
+import random
+from itertools import combinations
+import numpy as np
+import pytest
+from src.AutoPlayer import AutoPlayer
+from src.Board import Board
+from src.Probability import Probability
+from src.cells import *
+
+def opened_board(grid, bombs, seed):
+    """
+    Returns a board with one empty square revealed
+    """
+    board = Board()
+    board.new_board(grid, bombs, seed=seed)
+    empty = [k for k, cell in enumerate(board.cells) if cell == 0]
+    if empty:
+        board.reveal_square(divmod(empty[0], grid[1]))
+    return board
+
+def brute_force(board):
+    """
+    Returns the bomb probabilities by trying every placement of the bombs that agrees with the revealed numbers
+    """
+    width, height = board.grid
+    revealed = [k for k, cell in enumerate(board.cells) if cell & REVEALED]
+    unknown = [k for k, cell in enumerate(board.cells) if not cell & REVEALED]
+    counts = np.zeros(len(board.cells))
+    total = 0
+    for placement in combinations(unknown, board.bombs):
+        mines = np.zeros(len(board.cells), dtype=bool)
+        mines[list(placement)] = True
+        mines = mines.reshape(width, height)
+        padded = np.pad(mines, 1)
+        around = sum(padded[1 + dx:1 + dx + width, 1 + dy:1 + dy + height].astype(int)
+                     for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy).ravel()
+        if all(around[k] == board.cells[k] & VALUE for k in revealed):
+            counts[list(placement)] += 1
+            total += 1
+    probabilities = np.full(len(board.cells), np.nan)
+    probabilities[unknown] = counts[unknown] / total
+    return probabilities.reshape(width, height)
+
+def expert_positions(games):
+    """
+    Returns the cells after every move of games played by the auto player
+    """
+    positions = []
+    for seed in range(games):
+        board = opened_board([30, 16], 99, seed)
+        player = AutoPlayer(board, random.Random(seed))
+        while not (board.game_over or board.won) and player.step():
+            positions.append(bytearray(board.cells))
+    return positions
+
+@pytest.mark.parametrize("seed", range(6))
+def test_matches_brute_force(seed):
+    board = opened_board([6, 4], 4, seed)
+    rng = random.Random(seed)
+    safe = [k for k, cell in enumerate(board.cells) if not cell & BOMB]
+    for k in rng.sample(safe, 3):
+        board.reveal_square(divmod(k, 4))
+    # A flag is a guess, it does not change the probabilities
+    board.flag_square(divmod(next(k for k, cell in enumerate(board.cells) if not cell & REVEALED), 4))
+
+    expected = brute_force(board)
+    got = Probability(board.grid).compute(board.cells, board.bombs)
+    assert np.allclose(got, expected, equal_nan=True)
+
+def test_cut_components_keep_the_expected_bombs():
+    positions = expert_positions(3)
+    probability = Probability([30, 16], max_component=8)
+    for cells in positions[::5]:
+        probabilities = probability.compute(cells, 99)
+        unknown = ~np.isnan(probabilities)
+        assert ((probabilities[unknown] >= 0) & (probabilities[unknown] <= 1)).all()
+        assert probabilities[unknown].sum() == pytest.approx(99)
@@ -0,0 +1,61 @@
+import random
+import pytest
+import src.Replay
+from src.Board import Board
+from src.Replay import Replay
+from src.cells import *
+
+def record(grid, bombs, seed, moves):
+    """
+    Plays random clicks, chords, flags and the odd bulk operation, returns the board and its state after every move
+    """
+    rng = random.Random(seed)
+    board = Board()
+    board.new_board(grid, bombs, seed=seed)
+    shown = []
+    states = {}
+    while len(board.moves) < moves:
+        roll = rng.random()
+        if roll < 0.002:
+            rng.choice([board.reveal_all, board.unreveal_all, board.flag_all, board.unflag_all])()
+        elif roll < 0.2 and shown:
+            board.reveal_square(rng.choice(shown))
+        elif roll < 0.4:
+            x, y = rng.choice(shown) if shown else (0, 0)
+            board.flag_square((min(grid[0] - 1, max(0, x + rng.randint(-1, 1))),
+                               min(grid[1] - 1, max(0, y + rng.randint(-1, 1)))))
+        else:
+            k = rng.randrange(grid[0] * grid[1])
+            if board.cells[k] & BOMB and rng.random() < 0.9:
+                board.flag_square(divmod(k, grid[1]))
+            else:
+                shown.extend(board.reveal_square(divmod(k, grid[1]))[:3])
+        states[len(board.moves)] = game_state(board)
+    return board, states
+
+def game_state(board):
+    return (bytes(board.cells), board.revealed_safe, board.flags, board.correct_flags, board.game_over)
+
+@pytest.mark.parametrize("batched", [True, False])
+@pytest.mark.parametrize("grid, bombs, seed", [([30, 16], 99, 1), ([200, 150], 4500, 2), ([200, 150], 3000, 3)])
+def test_seeks_match_the_recorded_game(monkeypatch, batched, grid, bombs, seed):
+    if batched:
+        monkeypatch.setattr(src.Replay, "MIN_BATCH_SQUARES", 0)
+    else:
+        monkeypatch.setattr(src.Replay, "MIN_BATCH", 1 << 30)
+    board, states = record(grid, bombs, seed, 3000)
+    replay = Replay.from_bytes(Replay.from_board(board).to_bytes(), interval=500)
+    assert game_state(replay.seek(len(replay))) == game_state(board)
+
+    rng = random.Random(seed)
+    replay.board.check_counters = True
+    for position in rng.sample(sorted(states), 40):
+        assert game_state(replay.seek(position)) == states[position]
+        replay.board.check_win()
+
+def test_batched_replay_keeps_the_neighbour_counts(monkeypatch):
+    monkeypatch.setattr(src.Replay, "MIN_BATCH_SQUARES", 0)
+    board, _ = record([100, 100], 1200, 4, 2000)
+    replayed = Replay.from_board(board).seek(len(board.moves))
+    assert replayed.adjacent == replayed.count_adjacent()
+    assert replayed.adjacent == board.adjacent
@@ -0,0 +1,72 @@
+import asyncio
+from src.Server import GameServer, HELLO, MOVE, MOVE_BODY, MESSAGE, REVEAL_MOVE, message
+from src.Client import GameClient
+
+def run(test):
+    """
+    Runs a coroutine test against a fresh server on a free port
+    """
+    async def main():
+        server = GameServer([16, 16], 40, restart=False)
+        port = await server.start()
+        try:
+            await test(server, port)
+        finally:
+            await server.stop()
+    asyncio.run(main())
+
+async def closed_by_server(port, data):
+    """
+    Joins with a valid HELLO, sends data and returns True if the server then closes the connection
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(message(HELLO, b"player"))
+    writer.write(data)
+    await writer.drain()
+    try:
+        while await asyncio.wait_for(reader.read(65536), 5):
+            pass
+        return True
+    finally:
+        writer.close()
+
+def test_malformed_messages_drop_only_their_connection():
+    async def test(server, port):
+        client = GameClient("good")
+        await client.connect("127.0.0.1", port)
+
+        assert await closed_by_server(port, message(MOVE, b"\x01\x02"))
+        assert await closed_by_server(port, message(MOVE, MOVE_BODY.pack(0, REVEAL_MOVE, 16, 0)))
+        assert await closed_by_server(port, message(MOVE, MOVE_BODY.pack(0, 7, 0, 0)))
+        assert await closed_by_server(port, MESSAGE.pack(MOVE, 1 << 30))
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(message(HELLO, b"\xff\xfe"))
+        assert await asyncio.wait_for(reader.read(), 5) == b""
+        writer.close()
+
+        # The server still serves the player that behaved
+        await asyncio.wait_for(client.move(REVEAL_MOVE, (0, 0)), 5)
+        assert client.cells[0] & 0x20
+        await client.close()
+    run(test)
+
+def test_players_not_reading_are_dropped():
+    async def test(server, port):
+        # The slow player never reads, its updates pile up until the server gives up on it
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(message(HELLO, b"slow"))
+        await writer.drain()
+
+        client = GameClient("fast")
+        await client.connect("127.0.0.1", port)
+        for _ in range(100):
+            if server.players["slow"] not in server.writers:
+                break
+            server.broadcast(message(255, bytes(1 << 20)))
+            await asyncio.sleep(0.01)
+        assert server.players["slow"] not in server.writers
+        assert server.players["fast"] in server.writers
+        writer.close()
+        await client.close()
+    run(test)
@@ -0,0 +1,76 @@
+import random
+from itertools import product
+import pytest
+from src.Board import Board
+from src.Solver import Solver, enumerate_component
+from src.cells import *
+
+def known_squares(board):
+    """
+    Returns the (safe, mines) positions of the unrevealed squares of a board
+    """
+    height = board.grid[1]
+    safe, mines = set(), set()
+    for k, cell in enumerate(board.cells):
+        if not cell & REVEALED:
+            (mines if cell & BOMB else safe).add(divmod(k, height))
+    return safe, mines
+
+def brute_force(variables, constraints):
+    """
+    Counts the bomb assignments satisfying the constraints by trying all of them, like enumerate_component
+    """
+    results = {}
+    for values in product((0, 1), repeat=len(variables)):
+        assignment = dict(zip(variables, values))
+        if all(sum(assignment[square] for square in squares) == bombs for squares, bombs in constraints):
+            solutions, counts = results.setdefault(sum(values), (0, [0] * len(variables)))
+            results[sum(values)] = (solutions + 1, [count + value for count, value in zip(counts, values)])
+    return results
+
+@pytest.mark.parametrize("grid, bombs", [([9, 9], 10), ([16, 16], 40), ([30, 16], 99), ([20, 20], 100)])
+def test_deductions_agree_with_the_bombs(grid, bombs):
+    solver = Solver(grid)
+    for seed in range(15):
+        rng = random.Random(seed)
+        board = Board()
+        board.new_board(grid, bombs, seed=seed)
+        safe = [k for k, cell in enumerate(board.cells) if not cell & BOMB]
+        for k in rng.sample(safe, rng.randint(1, 8)):
+            board.reveal_square(divmod(k, grid[1]))
+        # A flag is the player's guess, the solver must not trust it
+        board.flag_square(divmod(rng.choice(safe), grid[1]))
+
+        truly_safe, truly_mines = known_squares(board)
+        for count in (None, bombs):
+            deduced_safe, deduced_mines = solver.deduce(board.cells, count)
+            assert deduced_safe <= truly_safe
+            assert deduced_mines <= truly_mines
+
+@pytest.mark.parametrize("grid, bombs", [([9, 9], 10), ([16, 16], 40), ([30, 16], 99)])
+def test_deterministic_boards_clear_by_deduction(grid, bombs):
+    solver = Solver(grid)
+    for seed in range(4):
+        board = Board()
+        board.new_board(grid, bombs, True, seed)
+        board.reveal_square(board.start_pos)
+        while not board.won:
+            safe, mines = solver.deduce(board.cells, bombs)
+            assert safe, "A guess was needed"
+            for pos in safe:
+                board.reveal_square(pos)
+            board.check_win()
+            assert not board.game_over
+
+@pytest.mark.parametrize("seed", range(40))
+def test_enumerate_component_matches_brute_force(seed):
+    rng = random.Random(seed)
+    variables = rng.sample(range(100), rng.randint(1, 12))
+    mines = {square: rng.random() < 0.4 for square in variables}
+    constraints = []
+    for _ in range(rng.randint(1, 8)):
+        squares = rng.sample(variables, rng.randint(1, min(8, len(variables))))
+        constraints.append((squares, sum(mines[square] for square in squares)))
+
+    got = enumerate_component(variables, constraints)
+    assert got == brute_force(variables, constraints)
@@ -0,0 +1,60 @@
+from collections import deque
+import numpy as np
+import pytest
+from src.Board import Board
+from src.analytics import metrics, seeded_cells
+from src.cells import *
+
+def groups(squares, width, height):
+    """
+    Returns the 8-connected groups of a set of (x, y) squares, found with a breadth-first flood fill
+    """
+    left = set(squares)
+    found = []
+    while left:
+        group = {left.pop()}
+        queue = deque(group)
+        while queue:
+            x, y = queue.popleft()
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    n = (x + dx, y + dy)
+                    if n in left:
+                        left.remove(n)
+                        group.add(n)
+                        queue.append(n)
+        found.append(group)
+    return found
+
+def naive_metrics(cells):
+    """
+    Returns the metrics of one board of cells, clicking every opening and then every number left over
+    """
+    width, height = cells.shape
+    squares = [(x, y) for x in range(width) for y in range(height)]
+    empty = [pos for pos in squares if cells[pos] == 0]
+    openings = groups(empty, width, height)
+
+    # An opening reveals its squares and every square around them
+    revealed = set()
+    for group in openings:
+        for x, y in group:
+            revealed.update((x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+    isolated = [pos for pos in squares if not cells[pos] & BOMB and pos not in revealed]
+    return {
+        "3bv": len(openings) + len(isolated),
+        "openings": len(openings),
+        "isolated": len(isolated),
+        "islands": len(groups(isolated, width, height)),
+    }
+
+@pytest.mark.parametrize("grid, bombs", [([9, 9], 10), ([16, 16], 40), ([30, 16], 99), ([40, 25], 120)])
+def test_metrics_match_a_flood_fill(grid, bombs):
+    seeds = list(range(12))
+    cells = seeded_cells(grid, bombs, seeds)
+    got = metrics(cells)
+    for i, seed in enumerate(seeds):
+        board = Board()
+        board.new_board(grid, bombs, seed=seed)
+        assert np.array_equal(cells[i], board.state)
+        assert {name: int(values[i]) for name, values in got.items()} == naive_metrics(board.state)
@@ -0,0 +1,91 @@
+import json
+import os
+import random
+import numpy as np
+import pytest
+from src.AutoPlayer import AutoPlayer
+from src.Board import Board
+from src.Replay import Replay
+from src.export import ShardReader, ShardWriter, INDEX_FILE, export, export_replays
+
+GRID = [9, 9]
+BOMBS = 10
+
+class Interrupted(Exception):
+    pass
+
+def interrupt_after_first_index(monkeypatch):
+    """
+    Makes the next export stop right after its first index update, as if it was killed: nothing else is written
+    """
+    write_index = ShardWriter.write_index
+    def write_and_stop(self):
+        write_index(self)
+        raise Interrupted
+    monkeypatch.setattr(ShardWriter, "write_index", write_and_stop)
+    monkeypatch.setattr(ShardWriter, "close", lambda self: None)
+
+def saved_replays(directory, games):
+    """
+    Plays games with the auto player and returns the paths of their replays
+    """
+    paths = []
+    for seed in range(games):
+        board = Board()
+        board.new_board(GRID, BOMBS, seed=seed)
+        AutoPlayer(board, random.Random(seed)).play()
+        path = os.path.join(directory, "game_" + str(seed) + ".msr")
+        Replay.from_board(board).save_file(path)
+        paths.append(path)
+    return paths
+
+def contents(path):
+    """
+    Returns the index and every record of an export
+    """
+    with open(os.path.join(path, INDEX_FILE)) as file:
+        index = json.load(file)
+    reader = ShardReader(path)
+    return index, [reader[i].tobytes() for i in range(len(reader))]
+
+def test_seeded_export_resumes_where_it_was_interrupted(tmp_path, monkeypatch):
+    whole = str(tmp_path / "whole")
+    samples = export(whole, GRID, BOMBS, 12, shard_size=32, processes=1)
+    assert samples == len(ShardReader(whole)) > 64
+    assert export(whole, GRID, BOMBS, 12, shard_size=32, processes=1) == 0
+
+    resumed = str(tmp_path / "resumed")
+    interrupt_after_first_index(monkeypatch)
+    with pytest.raises(Interrupted):
+        export(resumed, GRID, BOMBS, 12, shard_size=32, processes=1)
+    monkeypatch.undo()
+    assert 0 < len(ShardReader(resumed)) < samples
+    export(resumed, GRID, BOMBS, 12, shard_size=32, processes=1)
+    assert contents(resumed) == contents(whole)
+
+    reader = ShardReader(whole)
+    seeds = [int(reader[i]["seed"]) for i in range(len(reader))]
+    assert seeds == sorted(seeds) and set(seeds) == set(range(12))
+
+def test_replay_export_skips_exported_replays(tmp_path, monkeypatch):
+    paths = saved_replays(str(tmp_path), 12)
+    whole = str(tmp_path / "whole")
+    samples = export_replays(whole, paths, shard_size=32)
+    assert samples == len(ShardReader(whole)) > 64
+    assert export_replays(whole, paths, shard_size=32) == 0
+    assert len(ShardReader(whole)) == samples
+
+    resumed = str(tmp_path / "resumed")
+    interrupt_after_first_index(monkeypatch)
+    with pytest.raises(Interrupted):
+        export_replays(resumed, paths, shard_size=32)
+    monkeypatch.undo()
+    assert 0 < len(ShardReader(resumed)) < samples
+    export_replays(resumed, paths, shard_size=32)
+    assert contents(resumed) == contents(whole)
+
+    # Every position of a replay is exported once, in the order of the files
+    reader = ShardReader(whole)
+    steps = [(int(reader[i]["seed"]), int(reader[i]["step"])) for i in range(len(reader))]
+    assert len(set(steps)) == len(steps)
+    assert np.array_equal(reader[0]["obs"], np.full(GRID, 9))